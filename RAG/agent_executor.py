@@ -0,0 +1,147 @@
+import os
+import queue
+import asyncio
+import weakref
+import threading
+
+import weather
+from resources import lazy_resource
+from sunny_agent import astream_sunny, get_agent
+
+
+# Tours d'agent exécutés en même temps (au-delà, ils attendent leur tour)
+MAX_CONCURRENT_TURNS = int(os.getenv("SUNNY_MAX_CONCURRENT_TURNS", "8"))
+# Tours en attente acceptés : au-delà, la demande est refusée tout de suite
+MAX_QUEUED_TURNS = int(os.getenv("SUNNY_MAX_QUEUED_TURNS", "32"))
+
+
+class TurnQueueFull(RuntimeError):
+    """Trop de tours en attente : la demande est refusée plutôt que de patienter sans fin"""
+
+
+class AgentExecutor:
+    """
+    Exécute les tours de l'agent sur une boucle asyncio de fond partagée,
+    hors du thread qui les demande (ex: script Streamlit) :
+    - au plus max_concurrent tours en cours, les autres en file d'attente ;
+    - file bornée (max_queued), au-delà TurnQueueFull ;
+    - une seule exécution à la fois par conversation (thread_id).
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_TURNS, max_queued=MAX_QUEUED_TURNS):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="sunny-agent", daemon=True).start()
+
+        # Compteurs modifiés uniquement depuis la boucle de fond
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._thread_locks = weakref.WeakValueDictionary()
+        self.stats = {"running": 0, "waiting": 0, "completed": 0, "failed": 0, "rejected": 0}
+
+    async def _run(self, user_input, config, context, use_cache, emit):
+        """Un tour de l'agent : attente de sa place, puis événements passés à emit()"""
+        if self.stats["waiting"] >= self.max_queued:
+            self.stats["rejected"] += 1
+            raise TurnQueueFull(f"{self.stats['waiting']} demandes déjà en attente")
+
+        thread_id = config["configurable"]["thread_id"]
+        lock = self._thread_locks.get(thread_id)
+        if lock is None:
+            lock = self._thread_locks[thread_id] = asyncio.Lock()
+
+        self.stats["waiting"] += 1
+        waiting = True
+        try:
+            if self._semaphore.locked() or lock.locked():
+                emit(("queued", self.stats["waiting"]))
+            async with lock, self._semaphore:
+                self.stats["waiting"] -= 1
+                waiting = False
+                self.stats["running"] += 1
+                try:
+                    async for event in astream_sunny(user_input, config, context, use_cache=use_cache):
+                        emit(event)
+                    self.stats["completed"] += 1
+                except Exception:
+                    self.stats["failed"] += 1
+                    raise
+                finally:
+                    self.stats["running"] -= 1
+        finally:
+            if waiting:
+                self.stats["waiting"] -= 1
+
+    def stream(self, user_input, config, context=None, use_cache=True):
+        """
+        Version synchrone : mêmes événements que stream_sunny, plus
+        ("queued", position) si le tour doit attendre. Si l'appelant arrête
+        de lire (ex: rerun Streamlit), le tour est annulé.
+        """
+        events = queue.Queue()
+        done = object()
+
+        async def job():
+            try:
+                await self._run(user_input, config, context, use_cache, events.put)
+            except BaseException as e:
+                events.put(e)
+                raise
+            finally:
+                events.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(job(), self.loop)
+        try:
+            while (event := events.get()) is not done:
+                if isinstance(event, BaseException):
+                    raise event
+                yield event
+        finally:
+            future.cancel()
+
+    def close(self):
+        """Ferme le client HTTP de la boucle de fond puis l'arrête (fin du processus)"""
+        asyncio.run_coroutine_threadsafe(weather.aclose(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def astream(self, user_input, config, context=None, use_cache=True):
+        """Version asynchrone, utilisable depuis n'importe quelle autre boucle"""
+        caller_loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        done = object()
+
+        def emit(event):
+            caller_loop.call_soon_threadsafe(events.put_nowait, event)
+
+        async def job():
+            try:
+                await self._run(user_input, config, context, use_cache, emit)
+            except BaseException as e:
+                emit(e)
+                raise
+            finally:
+                emit(done)
+
+        future = asyncio.run_coroutine_threadsafe(job(), self.loop)
+        try:
+            while (event := await events.get()) is not done:
+                if isinstance(event, BaseException):
+                    raise event
+                yield event
+        finally:
+            future.cancel()
+
+
+@lazy_resource
+def get_executor():
+    """Exécuteur partagé par toutes les sessions du processus"""
+    return AgentExecutor()
+
+
+def warm_up():
+    """Charge l'agent, le modèle d'embedding, Chroma et l'index BM25 (appel bloquant)"""
+    from rag import search_chunks
+
+    get_agent()
+    get_executor()
+    search_chunks(["chauffe"], n_results=1)
@@ -0,0 +1,206 @@
+import re
+import time
+import hashlib
+import operator
+import threading
+
+import numpy as np
+
+from resources import get_db_client, lazy_resource
+from rag import embed_query, normalize_query
+from metrics import instrument, register_stats
+from snapshot import SNAPSHOT_MODE, SNAPSHOT_PATH
+
+
+# Cache sémantique des réponses de Sunny (collection Chroma séparée)
+ANSWER_CACHE_COLLECTION = "sunny_answer_cache"
+# Similarité cosinus minimum pour réutiliser une réponse
+SIMILARITY_THRESHOLD = 0.95
+# Les réponses météo ne valent que pour la même question (au mot près ou presque)
+WEATHER_SIMILARITY_THRESHOLD = 0.99
+# Durées de vie : connaissances (spots, équipements) et météo
+KNOWLEDGE_TTL = 7 * 24 * 3600
+WEATHER_TTL = 15 * 60
+# Nombre maximum de réponses gardées (les plus anciennes sont supprimées)
+MAX_ENTRIES = 2000
+# Nettoyage (expirées + surplus) toutes les N écritures
+EVICT_EVERY = 50
+
+# Pronoms qui renvoient à l'historique de la conversation : la question
+# n'a pas de sens seule, on ne la met pas en cache. Pas les déterminants
+# ("ce week-end", "ce matin" se comprennent seuls)...
+CONTEXT_WORDS = {
+    "ça", "cela", "là", "là-bas", "celui", "celle", "ceux", "celles",
+    "celui-ci", "celle-ci", "celui-là", "celle-là", "lui", "eux",
+}
+# ... sauf devant un lieu : "cette plage", "ce spot"
+CONTEXT_PLACES = re.compile(r"\b(ce|cet|cette|ces) (spots?|plages?|endroits?|coins?|lieux?|vagues?)\b")
+MIN_WORDS = 3
+
+stats = {"hits": 0, "misses": 0, "stores": 0, "evicted": 0}
+_lock = threading.Lock()
+_writes = 0
+
+
+# Comparaisons des filtres `where` de ce module (sur expires_at)
+OPERATORS = {"$gt": operator.gt, "$lte": operator.le}
+
+
+class MemoryCollection:
+    """
+    Cache de réponses en mémoire du processus, pour les nœuds démarrés sur
+    un snapshot mappé (SUNNY_SNAPSHOT_MODE=memmap) : ils n'ouvrent pas de
+    base Chroma. Expose la partie de l'API des collections utilisée ici
+    (distance cosinus, filtre `where` sur une métadonnée).
+    """
+
+    def __init__(self):
+        self.entries = {}  # id -> (embedding normalisé, métadonnées)
+        self.lock = threading.Lock()
+
+    def _ids(self, where):
+        if where is None:
+            return list(self.entries)
+        (key, condition), = where.items()
+        (op, value), = condition.items()
+        return [i for i, (_, metadata) in self.entries.items() if OPERATORS[op](metadata[key], value)]
+
+    def count(self):
+        return len(self.entries)
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        with self.lock:
+            for i, embedding, metadata in zip(ids, embeddings, metadatas):
+                vector = np.asarray(embedding, dtype=np.float32)
+                self.entries[i] = (vector / max(np.linalg.norm(vector), 1e-9), dict(metadata))
+
+    def query(self, query_embeddings, n_results=1, where=None):
+        with self.lock:
+            ids = self._ids(where)
+            vectors = np.stack([self.entries[i][0] for i in ids]) if ids else np.empty((0, 0))
+            metadatas = [self.entries[i][1] for i in ids]
+        results = {"ids": [], "metadatas": [], "distances": []}
+        for query in np.asarray(query_embeddings, dtype=np.float32):
+            similarities = vectors @ (query / max(np.linalg.norm(query), 1e-9)) if ids else np.empty(0)
+            top = np.argsort(-similarities)[:n_results]
+            results["ids"].append([ids[n] for n in top])
+            results["metadatas"].append([metadatas[n] for n in top])
+            results["distances"].append([1.0 - float(similarities[n]) for n in top])
+        return results
+
+    def get(self, where=None, include=("metadatas",)):
+        with self.lock:
+            ids = self._ids(where)
+            result = {"ids": ids}
+            if "metadatas" in include:
+                result["metadatas"] = [self.entries[i][1] for i in ids]
+        return result
+
+    def delete(self, ids):
+        with self.lock:
+            for i in ids:
+                self.entries.pop(i, None)
+
+
+@lazy_resource
+def get_cache_collection():
+    """
+    Collection Chroma du cache de réponses (distance cosinus) ; en mémoire
+    du processus sur un nœud démarré sur un snapshot mappé (voir snapshot.py)
+    """
+    if SNAPSHOT_PATH is not None and SNAPSHOT_MODE == "memmap":
+        return MemoryCollection()
+    return get_db_client().get_or_create_collection(
+        name=ANSWER_CACHE_COLLECTION,
+        metadata={"hnsw:space": "cosine"},
+    )
+
+
+def is_cacheable(query):
+    """Une question est cacheable si elle se comprend sans l'historique"""
+    words = re.findall(r"[\w'-]+", normalize_query(query))
+    return (
+        len(words) >= MIN_WORDS
+        and words[0] != "et"  # "et pour demain ?"
+        and not CONTEXT_WORDS.intersection(words)
+        and not CONTEXT_PLACES.search(" ".join(words))
+    )
+
+
+def _count(name, n=1):
+    with _lock:
+        stats[name] += n
+
+
+def cache_stats():
+    with _lock:
+        return dict(stats)
+
+
+@instrument("answer_cache_lookup")
+def lookup(query):
+    """Réponse déjà donnée à une question équivalente, ou None"""
+    if not is_cacheable(query):
+        return None
+
+    results = get_cache_collection().query(
+        query_embeddings=[embed_query(normalize_query(query)).tolist()],
+        n_results=1,
+        where={"expires_at": {"$gt": time.time()}},
+    )
+    metadatas = results.get("metadatas", [[]])[0]
+    if metadatas:
+        similarity = 1.0 - results["distances"][0][0]
+        threshold = WEATHER_SIMILARITY_THRESHOLD if metadatas[0]["weather"] else SIMILARITY_THRESHOLD
+        if similarity >= threshold:
+            _count("hits")
+            return metadatas[0]["answer"]
+
+    _count("misses")
+    return None
+
+
+def store(query, answer, weather=False):
+    """Mémorise la réponse ; durée de vie courte si elle dépend de la météo (outil météo utilisé)"""
+    if not is_cacheable(query) or not answer:
+        return
+
+    now = time.time()
+    normalized = normalize_query(query)
+    get_cache_collection().upsert(
+        ids=[hashlib.sha1(normalized.encode("utf-8")).hexdigest()],
+        documents=[normalized],
+        embeddings=[embed_query(normalized).tolist()],
+        metadatas=[{
+            "answer": answer,
+            "weather": weather,
+            "created_at": now,
+            "expires_at": now + (WEATHER_TTL if weather else KNOWLEDGE_TTL),
+        }],
+    )
+    _count("stores")
+
+    global _writes
+    with _lock:
+        _writes += 1
+        evict = _writes % EVICT_EVERY == 0
+    if evict:
+        evict_entries()
+
+
+register_stats("answer_cache", cache_stats)
+
+
+def evict_entries():
+    """Supprime les réponses expirées puis les plus anciennes au-delà de MAX_ENTRIES"""
+    collection = get_cache_collection()
+    expired = collection.get(where={"expires_at": {"$lte": time.time()}}, include=[])["ids"]
+    if expired:
+        collection.delete(ids=expired)
+
+    surplus = collection.count() - MAX_ENTRIES
+    if surplus > 0:
+        entries = collection.get(include=["metadatas"])
+        by_age = sorted(zip(entries["metadatas"], entries["ids"]), key=lambda e: e[0]["created_at"])
+        collection.delete(ids=[i for _, i in by_age[:surplus]])
+    _count("evicted", len(expired) + max(surplus, 0))
@@ -1,6 +1,8 @@
 import streamlit as st
-from sunny_agent import agent, Context
+import metrics
 import time
+import threading
+import uuid
 import random
 
 # Liste de ses punchlines de conclusion
@@ -16,6 +18,36 @@ goodbyes = [
     "Allez, ouste. Et ne dis à personne que c'est moi qui t'ai donné les infos."
 ]
 
+# Ce qu'on affiche pendant que Sunny utilise ses outils
+TOOL_LABELS = {
+    "get_surf_conditions": "🌊 Je regarde les conditions en direct...",
+    "get_surf_forecast": "📈 Je consulte les prévisions...",
+    "compare_surf_spots": "⚖️ Je compare les spots...",
+    "search_surf_knowledge": "📚 Je fouille dans mes guides...",
+}
+# Intervalle minimum entre deux rafraîchissements du texte (en secondes)
+RENDER_INTERVAL = 0.05
+
+
+def _warm_up():
+    # Imports lourds (LangChain, torch, Chroma) faits ici, hors du script
+    import agent_executor
+    agent_executor.warm_up()
+
+
+@st.cache_resource(show_spinner=False)
+def start_background_services():
+    """
+    Une seule fois par processus (pas à chaque rerun du script) : métriques
+    Prometheus sur SUNNY_METRICS_PORT (si défini) et chargement de l'agent,
+    du modèle d'embedding et de Chroma en fond, pendant que la page s'affiche.
+    """
+    metrics.start_metrics_server()
+    threading.Thread(target=_warm_up, name="sunny-warm-up", daemon=True).start()
+
+
+start_background_services()
+
 # Configuration de la page
 st.set_page_config(
     page_title="🏄 Sunny - Surf Assistant",
@@ -119,7 +151,8 @@ st.markdown('<p class="subtitle">Ton assistant surf (parfois un peu grognon 😅
 # Initialisation de l'historique de chat
 if "messages" not in st.session_state:
     st.session_state.messages = []
-    st.session_state.thread_id = "thread_1"  # ID unique pour la conversation
+    # ID unique pour la conversation (propre à chaque session du navigateur)
+    st.session_state.thread_id = uuid.uuid4().hex
 
 # Affichage de l'historique
 for message in st.session_state.messages:
@@ -142,10 +175,6 @@ if prompt := st.chat_input("Pose ta question sur le surf..."):
         
     else:
         # Réponse de l'assistant avec streaming (seulement si pas "quitter")
-        with st.chat_message("assistant"):
-            message_placeholder = st.empty()
-            full_response = ""
-        
         # Configuration pour l'agent
         config = {
             "configurable": {
@@ -154,30 +183,55 @@ if prompt := st.chat_input("Pose ta question sur le surf..."):
             }
         }
         
-        try:
-            # Récupération de la réponse complète
-            result = agent.invoke(
-                {"messages": [{"role": "user", "content": prompt}]},
-                config=config
-            )
-            
-            # Extraction du message final
-            full_response = result['messages'][-1].content
-            
-            # Affichage caractère par caractère pour simuler le streaming
-            displayed_text = ""
-            for char in full_response:
-                displayed_text += char
-                message_placeholder.markdown(displayed_text + "▌")
-                time.sleep(0.02)  # Ajuste cette valeur (0.01-0.05) pour la vitesse
-            
-            # Affichage final sans le curseur
-            message_placeholder.markdown(full_response)
+        # Attend au besoin la fin du chargement de fond (import déjà en cours)
+        from agent_executor import TurnQueueFull, get_executor
+
+        with st.chat_message("assistant"):
+            status_placeholder = st.empty()
+            message_placeholder = st.empty()
+            full_response = ""
             
-        except Exception as e:
-            error_msg = f"Erreur : {str(e)}"
-            message_placeholder.markdown(error_msg)
-            full_response = error_msg
+            try:
+                # Affichage des jetons au fur et à mesure que le LLM les produit.
+                # Le tour s'exécute sur l'exécuteur partagé, hors du thread du script
+                parts = []
+                last_render = 0.0
+                queued = False
+                for event in get_executor().stream(prompt, config):
+                    if event[0] == "queued":
+                        queued = True
+                        status_placeholder.markdown(f"_⏳ Y'a du monde à l'eau... ({event[1]} en attente)_")
+                    elif event[0] == "token":
+                        if queued:
+                            status_placeholder.empty()
+                            queued = False
+                        parts.append(event[1])
+                        now = time.monotonic()
+                        if now - last_render >= RENDER_INTERVAL:
+                            message_placeholder.markdown("".join(parts) + "▌")
+                            last_render = now
+                    elif event[0] == "tool_start":
+                        # Le texte reçu avant un appel d'outil n'est pas la réponse finale
+                        parts = []
+                        message_placeholder.empty()
+                        status_placeholder.markdown(f"_{TOOL_LABELS.get(event[1], '🔧 Je réfléchis...')}_")
+                    elif event[0] == "tool_end":
+                        status_placeholder.empty()
+                    elif event[0] == "trace":
+                        st.session_state.last_trace = event[1]
+                
+                # Affichage final sans le curseur
+                full_response = "".join(parts)
+                message_placeholder.markdown(full_response)
+                
+            except TurnQueueFull:
+                full_response = "Trop de monde sur le spot, réessaie dans un instant."
+                message_placeholder.markdown(full_response)
+            except Exception as e:
+                error_msg = f"Erreur : {str(e)}"
+                message_placeholder.markdown(error_msg)
+                full_response = error_msg
+            status_placeholder.empty()
         
         # Sauvegarde de la réponse
         st.session_state.messages.append({"role": "assistant", "content": full_response})
@@ -195,7 +249,7 @@ with st.sidebar:
     
     if st.button("🔄 Nouvelle conversation"):
         st.session_state.messages = []
-        st.session_state.thread_id = f"thread_{len(st.session_state.get('thread_id', '')) + 1}"
+        st.session_state.thread_id = uuid.uuid4().hex
         st.rerun()
         
     if st.button("👋 Quitter la session"):        
@@ -203,4 +257,26 @@ with st.sidebar:
         st.session_state.messages.append({"role": "assistant", "content": goodbye_msg})
         st.rerun()
     
-    st.markdown("---")
\ No newline at end of file
+    st.markdown("---")
+
+    # Panneau de debug : où le dernier tour a passé son temps
+    if st.checkbox("🔧 Debug"):
+        trace = st.session_state.get("last_trace")
+        if trace:
+            st.markdown("**Dernier tour**")
+            st.table([
+                {"étape": stage, "appels": entry["calls"], "ms": entry["ms"], "erreurs": entry["errors"]}
+                for stage, entry in sorted(trace.items(), key=lambda e: -e[1]["ms"])
+            ])
+            context = trace.get("context")
+            if context and "retrieved_tokens" in context:
+                st.caption(
+                    f"Contexte : {context['sent_tokens']} jetons envoyés sur {context['retrieved_tokens']} "
+                    f"récupérés ({context['saved_tokens']} économisés)"
+                )
+        counters, _ = metrics.snapshot()
+        st.markdown("**Compteurs**")
+        st.table([
+            {"métrique": name + "".join(f" {k}={v}" for k, v in labels), "valeur": value}
+            for (name, labels), value in sorted(counters.items())
+        ])
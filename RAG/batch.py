@@ -0,0 +1,289 @@
+"""
+Passage d'un lot de questions dans Sunny (évaluation de nuit, réponses de
+FAQ préparées à l'avance), depuis un fichier JSONL comme requests.jsonl.
+
+- Entrée : une ligne JSON par question, champ "query" (ou "question",
+  "title", "body" : le premier présent), identifiant "id" ou "request_id"
+  (sinon numéro de ligne).
+- Questions traitées en parallèle, chacune dans sa propre conversation.
+- Quotas respectés par des seaux à jetons : requêtes et jetons par minute
+  de Groq (attendus avant chaque appel au LLM, corrigés sur la
+  consommation réelle), requêtes par minute de StormGlass (avant chaque
+  appel HTTP : les réponses en cache ne comptent pas).
+- Sortie : une ligne JSON par question dès qu'elle est finie (réponse,
+  outils, latence, attente due aux quotas, jetons, erreur). Ce fichier sert
+  de point de reprise : relancé après un arrêt, le lot saute les questions
+  déjà réussies (--retry-failed : refait aussi celles en erreur ; la
+  dernière ligne d'un id fait foi).
+
+Usage : python batch.py questions.jsonl [--output batch_results.jsonl] [--concurrency 4]
+        [--groq-rpm 30] [--groq-tpm 12000] [--stormglass-rpm 10] [--use-cache] [--retry-failed]
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import threading
+import contextvars
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages.utils import count_tokens_approximately
+
+from metrics import latency_stats, llm_usage
+
+
+# Quotas par minute (0 = pas de limite) ; valeurs du palier gratuit de Groq pour le modèle de l'agent
+GROQ_RPM = int(os.getenv("SUNNY_GROQ_RPM", "30"))
+GROQ_TPM = int(os.getenv("SUNNY_GROQ_TPM", "12000"))
+STORMGLASS_RPM = int(os.getenv("SUNNY_STORMGLASS_RPM", "10"))
+# Questions traitées en même temps
+BATCH_CONCURRENCY = 4
+# Jetons de réponse comptés d'avance pour un appel au LLM (corrigé à la fin de l'appel)
+COMPLETION_ESTIMATE = 300
+# Champs lus dans chaque ligne du fichier d'entrée (le premier présent)
+QUERY_FIELDS = ("query", "question", "title", "body")
+ID_FIELDS = ("id", "request_id")
+DEFAULT_OUTPUT = "batch_results.jsonl"
+
+# Compteurs de la question en cours (attente des quotas, appels et jetons du LLM)
+_item_stats = contextvars.ContextVar("sunny_batch_item", default=None)
+
+
+class TokenBucket:
+    """
+    Seau à jetons : `per_minute` jetons rendus par minute, au plus une
+    minute d'avance. 0 = pas de limite.
+    Chaque demande prend ses jetons tout de suite (le solde peut devenir
+    négatif) puis attend le temps de les rembourser : servi dans l'ordre
+    d'arrivée, sans verrou asyncio, donc utilisable depuis n'importe quelle
+    boucle (boucle du lot ou boucle HTTP de weather.run_sync).
+    """
+
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.per_minute, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, n=1):
+        """Attend que `n` jetons soient disponibles et les prend"""
+        if not self.per_minute:
+            return
+        with self.lock:
+            self._refill()
+            # Une demande plus grosse que le seau passe quand il est plein (solde négatif ensuite)
+            needed = min(n, self.per_minute)
+            wait = max(0.0, (needed - self.tokens) / self.rate)
+            self.tokens -= n
+        if wait:
+            await asyncio.sleep(wait)
+        stats = _item_stats.get()
+        if stats is not None:
+            stats["rate_wait_s"] += wait
+
+    def adjust(self, n):
+        """Rend (n > 0) ou reprend (n < 0) des jetons après coup"""
+        if self.per_minute:
+            with self.lock:
+                self._refill()
+                self.tokens = min(self.per_minute, self.tokens + n)
+
+
+class GroqRateLimiter(AsyncCallbackHandler):
+    """
+    Callback LangChain : avant chaque appel au LLM, attend une requête et
+    les jetons estimés du prompt (+ COMPLETION_ESTIMATE) ; à la fin, corrige
+    le seau de jetons avec la consommation réelle.
+    """
+
+    def __init__(self, requests, tokens):
+        self.requests = requests
+        self.tokens = tokens
+        self.reserved = {}  # run_id -> jetons comptés d'avance
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        estimate = count_tokens_approximately(messages[0]) + COMPLETION_ESTIMATE
+        self.reserved[run_id] = estimate
+        await self.requests.acquire()
+        await self.tokens.acquire(estimate)
+
+    async def on_llm_end(self, response, *, run_id, **kwargs):
+        estimate = self.reserved.pop(run_id, 0)
+        usage = llm_usage(response)
+        if usage:
+            used = usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+        else:
+            # Modèle sans compteur de jetons : prompt estimé + réponse estimée
+            messages = [g.message for gs in response.generations for g in gs if hasattr(g, "message")]
+            used = estimate - COMPLETION_ESTIMATE + count_tokens_approximately(messages)
+        self.tokens.adjust(estimate - used)
+        stats = _item_stats.get()
+        if stats is not None:
+            stats["llm_calls"] += 1
+            stats["llm_tokens"] += used
+
+    async def on_llm_error(self, error, *, run_id, **kwargs):
+        # Les jetons réservés restent comptés : une requête refusée compte aussi chez Groq
+        self.reserved.pop(run_id, None)
+
+
+def read_items(path):
+    """Questions du fichier d'entrée : liste de {"id", "question"} (ids en double ignorés)"""
+    items, seen = [], set()
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            question = next((record[k] for k in QUERY_FIELDS if record.get(k)), None)
+            item_id = next((str(record[k]) for k in ID_FIELDS if record.get(k) is not None), str(n))
+            if question and item_id not in seen:
+                seen.add(item_id)
+                items.append({"id": item_id, "question": " ".join(str(question).split())})
+    return items
+
+
+def load_done(path, retry_failed=False):
+    """
+    Ids déjà traités d'après le fichier de sortie. Une dernière ligne
+    incomplète (arrêt brutal pendant l'écriture) est supprimée.
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+
+    status = {}
+    for line in data[:end].splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        status[record["id"]] = record.get("error") is None
+    return {item_id for item_id, ok in status.items() if ok or not retry_failed}
+
+
+async def run_item(item, limiter, use_cache):
+    """Une question dans sa propre conversation : ligne de résultat"""
+    from sunny_agent import Context, astream_sunny
+
+    stats = {"rate_wait_s": 0.0, "llm_calls": 0, "llm_tokens": 0}
+    _item_stats.set(stats)
+    thread_id = f"batch-{item['id']}-{uuid.uuid4().hex[:8]}"
+    config = {"configurable": {"thread_id": thread_id}, "callbacks": [limiter]}
+
+    parts, tools, error = [], [], None
+    start = time.perf_counter()
+    try:
+        async for event in astream_sunny(item["question"], config, Context(user_id="batch"), use_cache=use_cache):
+            # Texte de la réponse finale seulement (pas celui d'avant un appel d'outil)
+            if event[0] == "token":
+                parts.append(event[1])
+            elif event[0] == "tool_start":
+                parts.clear()
+                tools.append(event[1])
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    latency = time.perf_counter() - start
+
+    return {
+        "id": item["id"],
+        "question": item["question"],
+        "answer": "".join(parts) if error is None else None,
+        "tools": tools,
+        "latency_ms": round(latency * 1000, 1),
+        "rate_wait_ms": round(stats["rate_wait_s"] * 1000, 1),
+        "llm_calls": stats["llm_calls"],
+        "llm_tokens": stats["llm_tokens"],
+        "thread_id": thread_id,
+        "error": error,
+        "finished_at": time.time(),
+    }
+
+
+async def run_batch(items, output, concurrency=BATCH_CONCURRENCY, groq_rpm=GROQ_RPM, groq_tpm=GROQ_TPM,
+                    stormglass_rpm=STORMGLASS_RPM, use_cache=False):
+    """Traite les questions, chaque résultat ajouté à `output` dès qu'il est prêt ; renvoie les résultats"""
+    import weather
+
+    limiter = GroqRateLimiter(TokenBucket(groq_rpm), TokenBucket(groq_tpm))
+    stormglass = TokenBucket(stormglass_rpm)
+    pending = asyncio.Queue()
+    for item in items:
+        pending.put_nowait(item)
+    results = []
+
+    with open(output, "a", encoding="utf-8") as f:
+        async def worker():
+            while not pending.empty():
+                result = await run_item(pending.get_nowait(), limiter, use_cache)
+                # Ligne écrite et synchronisée sur le disque avant de passer à la suite : point de reprise
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+                results.append(result)
+                status = "ok" if result["error"] is None else result["error"]
+                print(f"[{len(results)}/{len(items)}] {result['id']} : {result['latency_ms'] / 1000:.1f} s "
+                      f"(quotas {result['rate_wait_ms'] / 1000:.1f} s) {status}")
+
+        # Quota StormGlass pour les requêtes de ce lot seulement (tâches lancées ici)
+        try:
+            with weather.request_limiters({weather.STORMGLASS_URL: stormglass.acquire}):
+                await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        finally:
+            await weather.aclose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lot de questions passé dans Sunny (JSONL)")
+    parser.add_argument("input", help="fichier JSONL de questions")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="résultats JSONL (et point de reprise)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--groq-rpm", type=int, default=GROQ_RPM, help="requêtes Groq par minute (0 = sans limite)")
+    parser.add_argument("--groq-tpm", type=int, default=GROQ_TPM, help="jetons Groq par minute (0 = sans limite)")
+    parser.add_argument("--stormglass-rpm", type=int, default=STORMGLASS_RPM,
+                        help="requêtes StormGlass par minute (0 = sans limite)")
+    parser.add_argument("--use-cache", action="store_true", help="servir et remplir le cache de réponses")
+    parser.add_argument("--retry-failed", action="store_true", help="refaire aussi les questions en erreur")
+    args = parser.parse_args()
+
+    items = read_items(args.input)
+    done = load_done(args.output, args.retry_failed)
+    todo = [item for item in items if item["id"] not in done]
+    print(f"{len(items)} questions, {len(items) - len(todo)} déjà traitées, {len(todo)} à faire")
+
+    start = time.perf_counter()
+    try:
+        results = asyncio.run(run_batch(
+            todo, args.output, args.concurrency, args.groq_rpm, args.groq_tpm, args.stormglass_rpm, args.use_cache,
+        ))
+    except KeyboardInterrupt:
+        print(f"Interrompu : relance la même commande pour reprendre ({args.output})")
+        return
+    if not results:
+        return
+
+    failed = sum(result["error"] is not None for result in results)
+    latency = latency_stats([result["latency_ms"] / 1000 for result in results])
+    print(
+        f"\n{len(results) - failed} réussies, {failed} en erreur en {time.perf_counter() - start:.1f} s ; "
+        f"latence p50 {latency['p50_ms'] / 1000:.1f} s, p95 {latency['p95_ms'] / 1000:.1f} s ; "
+        f"{sum(result['llm_tokens'] for result in results)} jetons LLM, "
+        f"attente des quotas {sum(result['rate_wait_ms'] for result in results) / 1000:.1f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+"""
+Benchmarks et outils hors ligne de Sunny : scripts bench_*.py et
+benchmark.py, faux LLM (fake_llm.py) et serveur de bouchons des API météo
+(stub_apis.py), aussi utilisés par les tests.
+
+À lancer depuis RAG/ : python -m bench.benchmark, python -m bench.bench_load...
+"""
@@ -0,0 +1,68 @@
+"""
+Comparaison de plusieurs spots : un appel à compare_surf_spots (prévisions
+téléchargées en parallèle, classement vectorisé) contre un appel à
+get_surf_conditions par spot, l'un après l'autre, comme le faisait l'agent.
+Faux StormGlass local avec une latence réseau simulée ; le stockage des
+prévisions et le cache StormGlass sont vidés avant chaque mesure.
+
+Usage : python -m bench.bench_compare [--latency 0.3] [--spots 5]
+"""
+import argparse
+import asyncio
+import shutil
+import tempfile
+import time
+
+from bench.benchmark import prepare_environment
+
+
+SPOTS = ["La Torche", "La Palue", "Le Petit Minou", "Dossen", "Penhors", "Quiberon", "Pors Carn", "Kerloc'h"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.3, help="latence simulée de StormGlass (s)")
+    parser.add_argument("--spots", type=int, default=5)
+    args = parser.parse_args()
+    spots = SPOTS[:args.spots]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_environment(tmp, api_latency=args.latency)
+        import forecast
+        import sunny_agent
+        import weather
+
+        # Le serveur de bouchons sert Nominatim et StormGlass sur le même hôte :
+        # sans ceci, la limite de Nominatim (1 requête à la fois) s'appliquerait
+        # aussi à StormGlass. Les spots du banc sont tous dans le gazetteer.
+        weather.HOST_CONCURRENCY.clear()
+
+        def reset():
+            # Ni table en mémoire ni fichier : chaque mesure retélécharge tout
+            with forecast._tables_lock:
+                forecast._tables.clear()
+            shutil.rmtree(forecast.FORECAST_DIR, ignore_errors=True)
+            with weather._marine_lock:
+                weather._marine_cache.clear()
+
+        async def sequential():
+            return [await sunny_agent.aget_surf_conditions(spot) for spot in spots]
+
+        reset()
+        start = time.perf_counter()
+        asyncio.run(sequential())
+        one_by_one = time.perf_counter() - start
+
+        reset()
+        start = time.perf_counter()
+        table = asyncio.run(sunny_agent.acompare_surf_spots(spots, day_offset=1))
+        compared = time.perf_counter() - start
+
+        print(table, "\n")
+        print(f"{len(spots)} spots, latence StormGlass {args.latency * 1000:.0f} ms")
+        print(f"  get_surf_conditions x{len(spots)} (à la suite) : {one_by_one * 1000:>6.0f} ms, {len(spots)} étapes LLM")
+        print(f"  compare_surf_spots (un appel)       : {compared * 1000:>6.0f} ms, 1 étape LLM")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Assemblage du contexte (context.py) sur les questions étiquetées
+d'eval_retrieval : jetons envoyés au LLM, jetons économisés, durée ajoutée
+et part des questions dont le texte attendu reste dans le contexte, pour
+les chunks joints tels quels et plusieurs budgets. Chaque question est
+aussi posée avec une reformulation (deux requêtes, comme le fait l'agent) :
+c'est là que les doublons abondent.
+
+Usage : python -m bench.bench_context [--n-results 3] [--budgets 0 500 300]
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+from bench.benchmark import prepare_environment
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n-results", type=int, default=3)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[0, 500, 300], help="0 = pas de limite")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_environment(tmp)
+        import context
+        import rag
+        from eval_retrieval import LABELLED_QUERIES
+
+        cases = []
+        for query, expected in LABELLED_QUERIES:
+            for queries in ([query], [query, f"infos {query}"]):
+                documents = rag.merge_documents(rag.search_chunks(queries, args.n_results))
+                cases.append((queries, documents, expected.lower()))
+        # Chauffe : embeddings des phrases en cache, comme en production après quelques questions
+        for queries, documents, _ in cases:
+            context.build_context(queries, documents)
+
+        print(f"{len(cases)} recherches ({len(LABELLED_QUERIES)} questions, seules et avec reformulation)\n")
+        print(f"{'contexte':<18} {'jetons moy.':>11} {'économisés':>11} {'ms moy.':>8} {'attendu gardé':>14}")
+        for label, enabled, budget in [("chunks bruts", False, 0)] + [
+            (f"budget {budget or 'aucun'}", True, budget) for budget in args.budgets
+        ]:
+            context.CONTEXT_ENABLED = enabled
+            tokens, saved, timings, kept = [], [], [], 0
+            for queries, documents, expected in cases:
+                start = time.perf_counter()
+                text, stats = context.build_context(queries, documents, budget=budget)
+                timings.append(time.perf_counter() - start)
+                tokens.append(stats["sent_tokens"])
+                saved.append(stats["saved_tokens"])
+                kept += expected in text.lower()
+            print(
+                f"{label:<18} {statistics.mean(tokens):>11.0f} "
+                f"{statistics.mean(saved) / statistics.mean([t + s for t, s in zip(tokens, saved)]):>10.0%} "
+                f"{statistics.mean(timings) * 1000:>8.1f} {kept / len(cases):>14.0%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Comparaison des backends d'embedding (torch, onnx, onnx-int8) sur le corpus :
+débit d'encodage des chunks, latence d'une question seule, débit de
+questions simultanées avec et sans regroupement (QueryBatcher), et qualité
+par rapport au modèle PyTorch d'origine (cosinus moyen entre les deux
+embeddings d'un même texte, hit@k des questions étiquetées d'eval_retrieval
+en recherche vectorielle exacte sur le corpus).
+
+Usage : python -m bench.bench_embeddings [--backends torch onnx onnx-int8] [--threads 4] [--k 1 3 5]
+"""
+import argparse
+import statistics
+import threading
+import time
+
+import numpy as np
+
+import rag
+from embeddings import QueryBatcher
+from eval_retrieval import LABELLED_QUERIES
+from resources import EMBEDDING_BACKENDS, load_embedding_model
+
+
+QUERIES = [query for query, _ in LABELLED_QUERIES]
+
+
+def encode(model, texts):
+    return model.encode(texts, batch_size=rag.BATCH_SIZE, convert_to_numpy=True, normalize_embeddings=True)
+
+
+def documents_per_s(model, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encode(model, texts)
+        best = min(best, time.perf_counter() - start)
+    return len(texts) / best
+
+
+def single_query_ms(model):
+    timings = []
+    for query in QUERIES:
+        start = time.perf_counter()
+        encode(model, [query])
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def concurrent_queries_per_s(encoder, users, per_user):
+    """`users` threads qui encodent chacun `per_user` questions, une à la fois"""
+    def user(n):
+        for i in range(per_user):
+            encoder.encode([QUERIES[(n + i) % len(QUERIES)]])
+
+    workers = [threading.Thread(target=user, args=(n,)) for n in range(users)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return users * per_user / (time.perf_counter() - start)
+
+
+class Direct:
+    """Même interface que QueryBatcher, sans regroupement"""
+
+    def __init__(self, model):
+        self.model = model
+
+    def encode(self, sentences):
+        return encode(self.model, sentences)
+
+
+def hit_rates(document_vectors, documents, query_vectors, ks):
+    """hit@k en recherche vectorielle exacte (produit scalaire des vecteurs normalisés)"""
+    ranking = np.argsort(-(query_vectors @ document_vectors.T), axis=1)
+    hits = {k: 0 for k in ks}
+    for (_, expected), ranked in zip(LABELLED_QUERIES, ranking):
+        expected = expected.lower()
+        for k in ks:
+            if any(expected in documents[i].lower() for i in ranked[:k]):
+                hits[k] += 1
+    return {k: hits[k] / len(LABELLED_QUERIES) for k in ks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--threads", type=int, default=0, help="threads CPU (0 = défaut)")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--users", type=int, default=8, help="questions simultanées")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    documents = [chunk for path in rag.list_sources() for chunk, _ in rag.iter_source_chunks(path)]
+    print(f"{len(documents)} chunks, {len(QUERIES)} questions, threads={args.threads or 'défaut'}\n")
+
+    reference = None
+    header = " ".join(f"{'hit@' + str(k):>7}" for k in args.k)
+    print(f"{'backend':<10} {'chunks/s':>9} {'1 question (ms)':>16} {'q/s direct':>11} "
+          f"{'q/s regroupé':>13} {'cosinus':>8} {header}")
+    for backend in args.backends:
+        model = load_embedding_model(backend, args.threads)
+        encode(model, documents[:8])  # chauffe
+
+        throughput = documents_per_s(model, documents, args.repeat)
+        latency = single_query_ms(model)
+        direct = concurrent_queries_per_s(Direct(model), args.users, 2 * len(QUERIES))
+        batched = concurrent_queries_per_s(QueryBatcher(model), args.users, 2 * len(QUERIES))
+
+        vectors = encode(model, documents)
+        query_vectors = encode(model, QUERIES)
+        if reference is None:
+            # Premier backend de la liste (torch par défaut) : référence de qualité
+            reference = vectors
+        cosine = float(np.mean(np.sum(vectors * reference, axis=1)))
+        rates = hit_rates(vectors, documents, query_vectors, args.k)
+
+        print(f"{backend:<10} {throughput:>9.1f} {latency:>16.1f} {direct:>11.1f} {batched:>13.1f} "
+              f"{cosine:>8.4f} " + " ".join(f"{rates[k]:>7.2f}" for k in args.k))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Géocodage local (gazetteer.py) contre Nominatim : durée d'une recherche
+exacte, approchée et d'un lieu inconnu, des "spots les plus proches", et
+d'un géocodage complet par weather.ageocode (gazetteer, sinon Nominatim
+via le serveur de bouchons local, cache vidé).
+
+Usage : python -m bench.bench_gazetteer [--n 10000]
+"""
+import argparse
+import tempfile
+import time
+
+from bench.benchmark import prepare_environment
+
+
+NAMES = {
+    "exact": ["La Torche", "Le Petit Minou", "Baie des Trépassés", "Quiberon"],
+    "approché": ["plage de la torche, Finistère", "Le Petit Minoux", "Baie des Trepasses", "Kerloch"],
+    "inconnu": ["Brest", "Rennes", "Saint-Malo", "Vannes"],
+}
+
+
+def per_call_us(fn, args, n):
+    start = time.perf_counter()
+    for i in range(n):
+        fn(args[i % len(args)])
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_environment(tmp)
+        import weather
+        from gazetteer import get_gazetteer
+
+        gazetteer = get_gazetteer()
+        print(f"{len(gazetteer.spots)} spots, {len(gazetteer.aliases)} noms et alias\n")
+        for kind, names in NAMES.items():
+            found = [(name, (gazetteer.lookup(name) or {}).get("name")) for name in names]
+            print(f"lookup {kind:<9} {per_call_us(gazetteer.lookup, names, args.n):>8.1f} µs   "
+                  + ", ".join(f"{name} -> {spot}" for name, spot in found))
+        print(f"nearest (k=5)    {per_call_us(lambda p: gazetteer.nearest(*p), [(48.2, -4.4)], args.n):>8.1f} µs")
+
+        # Géocodage complet : spots du gazetteer, puis lieux inconnus (Nominatim, sans cache)
+        for kind in ("exact", "inconnu"):
+            timings = []
+            for name in NAMES[kind]:
+                weather._geocode_cache.clear()
+                start = time.perf_counter()
+                weather.geocode(name)
+                timings.append(time.perf_counter() - start)
+            print(f"ageocode {kind:<7} {sum(timings) / len(timings) * 1e6:>8.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
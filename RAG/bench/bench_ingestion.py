@@ -0,0 +1,111 @@
+"""
+Benchmark de l'ingestion : ancien chemin (load_pdf + chunk_text sur tout
+le texte) contre le pipeline en flux (pages en parallèle -> paragraphes -> chunks).
+
+Usage : python -m bench.bench_ingestion [--pdf Brittany-Surf-Guide.pdf] [--repeat 5] [--embed]
+"""
+import argparse
+import time
+import tracemalloc
+from pathlib import Path
+
+from pypdf import PdfReader
+
+from rag import BATCH_SIZE, iter_source_chunks
+
+
+def legacy_load_pdf(file_path):
+    """Ancienne version de load_pdf (concaténation de tout le texte)"""
+    reader = PdfReader(file_path)
+    text = ""
+    for page in reader.pages:
+        content = page.extract_text()
+        if content:
+            text += content + "\n"
+    return text
+
+
+def legacy_chunk_text(text, chunk_size=800, chunk_overlap=100):
+    """Ancienne version de chunk_text"""
+    text = text.replace("\r", "").replace("\n\n", " [SPLIT] ").replace("\n", " ")
+    paragraphs = text.split(" [SPLIT] ")
+    chunks = []
+    current_chunk = ""
+    for para in paragraphs:
+        if len(current_chunk) + len(para) <= chunk_size:
+            current_chunk += para + " "
+        else:
+            if current_chunk:
+                chunks.append(current_chunk.strip())
+            current_chunk = para[-chunk_overlap:] if len(para) > chunk_overlap else ""
+            current_chunk += para + " "
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return chunks
+
+
+def embed_all(chunks):
+    """
+    Embeddings par lots de BATCH_SIZE (même découpage que initialize_rag),
+    consommés au fil de l'itérable ; renvoie le nombre de chunks
+    """
+    from resources import get_embedding_model
+
+    model = get_embedding_model()
+    batch, n_chunks = [], 0
+    for chunk in chunks:
+        batch.append(chunk)
+        n_chunks += 1
+        if len(batch) == BATCH_SIZE:
+            model.encode(batch, convert_to_numpy=True, normalize_embeddings=True)
+            batch = []
+    if batch:
+        model.encode(batch, convert_to_numpy=True, normalize_embeddings=True)
+    return n_chunks
+
+
+def run_legacy(pdf_path, embed):
+    chunks = legacy_chunk_text(legacy_load_pdf(pdf_path))
+    if embed:
+        embed_all(chunks)
+    return len(chunks)
+
+
+def run_streaming(pdf_path, embed):
+    chunks = (chunk for chunk, _ in iter_source_chunks(Path(pdf_path)))
+    # Lots encodés au fil du générateur, sans matérialiser tous les chunks
+    return embed_all(chunks) if embed else sum(1 for _ in chunks)
+
+
+def measure(fn, pdf_path, embed, repeat):
+    """Temps médian et pic mémoire (tracemalloc, processus courant uniquement)"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        n_chunks = fn(pdf_path, embed)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn(pdf_path, embed)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    return n_chunks, timings[len(timings) // 2], peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pdf", default="Brittany-Surf-Guide.pdf")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--embed", action="store_true", help="inclure le calcul des embeddings")
+    args = parser.parse_args()
+
+    print(f"{'chemin':<12} {'chunks':>7} {'temps (ms)':>11} {'pic mémoire (Ko)':>17}")
+    for name, fn in [("ancien", run_legacy), ("flux", run_streaming)]:
+        n_chunks, median, peak = measure(fn, args.pdf, args.embed, args.repeat)
+        print(f"{name:<12} {n_chunks:>7} {median * 1000:>11.1f} {peak / 1024:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Test de charge : N utilisateurs simulés qui discutent en même temps avec
+Sunny (faux LLM, latence proportionnelle au prompt). Mesure le débit (tours/s),
+la latence par tour et le délai avant le premier jeton, pour plusieurs
+limites de concurrence de l'exécuteur partagé. Vérifie aussi que chaque
+utilisateur garde sa propre conversation.
+
+Usage : python -m bench.bench_load [--users 16] [--turns 5] [--limits 1 4 16] [--tools]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+
+from checkpointer import SQLiteCheckpointer
+from bench.fake_llm import FakeChatModel
+import sunny_agent
+from agent_executor import AgentExecutor, TurnQueueFull
+
+
+QUESTIONS = [
+    "Quels spots pour débuter dans le Finistère ?",
+    "Quelle combinaison pour une eau à 12 degrés ?",
+    "La Torche c'est à quelle marée ?",
+    "Quelle planche pour progresser après le longboard ?",
+    "Le Petit Minou est dangereux ?",
+]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def simulate_user(user, executor, turns, results):
+    """Un utilisateur : `turns` questions à la suite dans sa propre conversation"""
+    thread_id = uuid.uuid4().hex
+    config = {"configurable": {"thread_id": thread_id}}
+    for turn in range(turns):
+        question = f"{QUESTIONS[(user + turn) % len(QUESTIONS)]} (utilisateur {user})"
+        start = time.perf_counter()
+        first_token = None
+        try:
+            for event in executor.stream(question, config, use_cache=False):
+                if event[0] == "token" and first_token is None:
+                    first_token = time.perf_counter() - start
+        except TurnQueueFull:
+            results["rejected"] += 1
+            continue
+        results["latencies"].append(time.perf_counter() - start)
+        results["first_tokens"].append(first_token or 0.0)
+    results["threads"].append(thread_id)
+
+
+def run(users, turns, limit, queue_size):
+    executor = AgentExecutor(max_concurrent=limit, max_queued=queue_size)
+    results = {"latencies": [], "first_tokens": [], "rejected": 0, "threads": []}
+    workers = [
+        threading.Thread(target=simulate_user, args=(user, executor, turns, results))
+        for user in range(users)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    executor.loop.call_soon_threadsafe(executor.loop.stop)
+    return results, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--limits", type=int, nargs="+", default=[1, 4, 16],
+                        help="nombres de tours simultanés à comparer")
+    parser.add_argument("--queue", type=int, default=1000, help="taille de la file d'attente")
+    parser.add_argument("--tools", action="store_true",
+                        help="le faux LLM appelle aussi les outils (RAG, météo)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpointer = SQLiteCheckpointer(os.path.join(tmp, "memory.db"))
+        sunny_agent.agent = sunny_agent.build_agent(
+            model=FakeChatModel(use_tools=args.tools), checkpointer=checkpointer
+        )
+
+        print(f"{args.users} utilisateurs x {args.turns} tours")
+        print(f"{'limite':>7} {'tours/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'1er jeton p50':>14} {'refusés':>8}")
+        for limit in args.limits:
+            results, elapsed = run(args.users, args.turns, limit, args.queue)
+            latencies = results["latencies"]
+            print(
+                f"{limit:>7} {len(latencies) / elapsed:>8.1f} "
+                f"{percentile(latencies, 0.5) * 1000:>9.0f} {percentile(latencies, 0.95) * 1000:>9.0f} "
+                f"{statistics.median(results['first_tokens']) * 1000:>14.0f} {results['rejected']:>8}"
+            )
+
+            # Isolation : chaque conversation ne contient que les questions de son utilisateur
+            for thread_id in results["threads"]:
+                state = sunny_agent.agent.get_state({"configurable": {"thread_id": thread_id}})
+                users = {m.text.rsplit("(", 1)[-1] for m in state.values.get("messages", []) if m.type == "human"}
+                assert len(users) <= 1, f"conversation {thread_id} partagée : {users}"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark de la mémoire des conversations : latence par tour sur de longues
+conversations (50 tours), avec un faux LLM dont la latence est proportionnelle
+à la taille du prompt. Compare l'historique complet en RAM (ancien
+InMemorySaver) et la mémoire SQLite bornée avec résumé de l'historique.
+
+Usage : python -m bench.bench_memory [--turns 50] [--conversations 3] [--budget 3000]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from checkpointer import SQLiteCheckpointer
+from bench.fake_llm import FakeChatModel
+from sunny_agent import Context, HISTORY_TOKEN_BUDGET, build_agent
+
+
+QUESTIONS = [
+    "Quels spots pour débuter dans le Finistère ?",
+    "Et pour un surfeur confirmé, tu conseilles quoi ?",
+    "Quelle combinaison pour une eau à 12 degrés ?",
+    "La Torche c'est à quelle marée ?",
+    "Il me faut des chaussons en hiver ?",
+    "Quelle planche pour progresser après le longboard ?",
+    "Le Petit Minou est dangereux ?",
+    "Où surfer par vent d'est ?",
+]
+REPORTED_TURNS = (1, 10, 25, 50)
+
+
+def run_conversations(agent, model, turns, conversations):
+    """Latence (s) et taille du prompt (jetons) par tour, moyennées sur les conversations"""
+    latencies = [[] for _ in range(turns)]
+    tokens = [[] for _ in range(turns)]
+    for c in range(conversations):
+        config = {"configurable": {"thread_id": f"bench-{c}"}}
+        for turn in range(turns):
+            question = f"{QUESTIONS[turn % len(QUESTIONS)]} (question {turn + 1})"
+            model.prompt_tokens.clear()
+            start = time.perf_counter()
+            agent.invoke(
+                {"messages": [{"role": "user", "content": question}]},
+                config=config,
+                context=Context(user_id=str(c)),
+            )
+            latencies[turn].append(time.perf_counter() - start)
+            # Dernier appel = réponse de l'agent (les précédents peuvent être des résumés)
+            tokens[turn].append(model.prompt_tokens[-1])
+    return [statistics.mean(t) for t in latencies], [statistics.mean(t) for t in tokens]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--conversations", type=int, default=3)
+    parser.add_argument("--budget", type=int, default=HISTORY_TOKEN_BUDGET,
+                        help="budget de jetons d'historique avant résumé")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "memory.db")
+        configs = [
+            ("RAM, historique complet", InMemorySaver(), None),
+            ("SQLite + résumé", SQLiteCheckpointer(db_path), args.budget),
+        ]
+
+        turns = [t for t in REPORTED_TURNS if t <= args.turns]
+        header = " ".join(f"{'tour ' + str(t):>9}" for t in turns)
+        print(f"{'config':<24} {'':>8} {header} {'moy':>9}")
+        for name, checkpointer, budget in configs:
+            model = FakeChatModel()
+            agent = build_agent(model=model, checkpointer=checkpointer, history_budget=budget)
+            latencies, tokens = run_conversations(agent, model, args.turns, args.conversations)
+
+            print(f"{name:<24} {'ms':>8} " + " ".join(f"{latencies[t - 1] * 1000:>9.0f}" for t in turns)
+                  + f" {statistics.mean(latencies) * 1000:>9.0f}")
+            print(f"{'':<24} {'jetons':>8} " + " ".join(f"{tokens[t - 1]:>9.0f}" for t in turns)
+                  + f" {statistics.mean(tokens):>9.0f}")
+
+        sqlite_saver = configs[1][1]
+        print(f"\nSQLite : {sqlite_saver.stats()}, {os.path.getsize(db_path) / 1024:.0f} Ko sur disque")
+
+
+if __name__ == "__main__":
+    main()
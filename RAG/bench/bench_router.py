@@ -0,0 +1,95 @@
+"""
+Effet du pré-routage local (router.py) sur un tour de l'agent, hors ligne
+(faux LLM, faux Nominatim / StormGlass) : latence du tour, nombre d'appels
+au LLM et jetons de prompt envoyés, avec et sans routeur. Vérifie aussi
+les outils choisis sur un jeu de questions étiquetées.
+
+Les jetons sont comptés sur les messages seulement : le schéma des outils,
+renvoyé par Groq à chaque appel, augmente encore l'économie réelle.
+
+Usage : python -m bench.bench_router [--repeat 3]
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+from bench.benchmark import prepare_environment
+
+
+# Question -> outils attendus (ensemble vide : le LLM doit choisir lui-même)
+LABELLED_QUESTIONS = [
+    ("Conditions à La Torche en ce moment ?", {"get_surf_conditions"}),
+    ("Quelle est la houle à Dossen ?", {"get_surf_conditions"}),
+    ("Ça donne quoi maintenant au Petit Minou ?", {"get_surf_conditions"}),
+    ("Prévisions pour demain à La Palue", {"get_surf_forecast"}),
+    ("Meilleure heure pour surfer à Quiberon aujourd'hui ?", {"get_surf_forecast"}),
+    ("Ça marche ce week-end à Penhors ?", {"get_surf_forecast"}),
+    ("Quelle combinaison pour une eau à 12 degrés ?", {"search_surf_knowledge"}),
+    ("Quelle planche pour débuter ?", {"search_surf_knowledge"}),
+    ("Le Petit Minou c'est pour quel niveau ?", {"search_surf_knowledge"}),
+    ("Beach break à marée basse dans le Morbihan", {"search_surf_knowledge"}),
+    ("Faut-il des chaussons et des gants en hiver ?", {"search_surf_knowledge"}),
+    ("Quelle combi pour La Torche maintenant ?", {"get_surf_conditions", "search_surf_knowledge"}),
+    ("Où surfer ce week-end entre La Torche, La Palue et Le Petit Minou ?", {"compare_surf_spots"}),
+    ("Et là-bas demain ?", set()),
+    ("Salut Sunny, ça va ?", set()),
+]
+
+
+def run_turns(sunny_agent, model, questions, repeat, tag):
+    """Tours de l'agent : (durées en s, appels au LLM, jetons de prompt)"""
+    latencies = []
+    calls_before = len(model.prompt_tokens)
+    for r in range(repeat):
+        for n, question in enumerate(questions):
+            config = {"configurable": {"thread_id": f"{tag}-{r}-{n}"}}
+            start = time.perf_counter()
+            for _ in sunny_agent.stream_sunny(question, config, use_cache=False):
+                pass
+            latencies.append(time.perf_counter() - start)
+    prompts = model.prompt_tokens[calls_before:]
+    return latencies, len(prompts), sum(prompts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_environment(tmp)
+        import router
+        import sunny_agent
+        from bench.fake_llm import FakeChatModel
+
+        print("Outils choisis par le routeur :")
+        correct = 0
+        for question, expected in LABELLED_QUESTIONS:
+            chosen = {call["name"] for call in router.route(question)}
+            correct += chosen == expected
+            mark = "ok" if chosen == expected else "!!"
+            print(f"  {mark} {question:<55} {', '.join(sorted(chosen)) or '(LLM)'}")
+        print(f"  {correct}/{len(LABELLED_QUESTIONS)} conformes\n")
+
+        model = FakeChatModel(use_tools=True, prompt_tokens=[])
+        sunny_agent.agent = sunny_agent.build_agent(model=model)
+        questions = [question for question, _ in LABELLED_QUESTIONS]
+        # Chauffe : index, modèle d'embedding, questions types du routeur
+        run_turns(sunny_agent, model, questions[:2], 1, "chauffe")
+
+        turns = len(questions) * args.repeat
+        print(f"{'routeur':<8} {'p50 (ms)':>9} {'moy (ms)':>9} {'LLM/tour':>9} {'jetons/tour':>12}")
+        for enabled in (False, True):
+            router.ROUTER_ENABLED = enabled
+            latencies, llm_calls, tokens = run_turns(
+                sunny_agent, model, questions, args.repeat, "on" if enabled else "off"
+            )
+            print(
+                f"{'oui' if enabled else 'non':<8} {statistics.median(latencies) * 1000:>9.0f} "
+                f"{statistics.mean(latencies) * 1000:>9.0f} {llm_calls / turns:>9.2f} {tokens / turns:>12.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Démarrage à froid d'un nœud (processus neuf, base Chroma vide) : sans
+snapshot (initialize_rag découpe et embedde tout le corpus), avec un
+snapshot mappé en mémoire (recherche NumPy) et avec un snapshot chargé en
+bloc dans Chroma (premier démarrage, puis redémarrage).
+
+Pour chaque cas : import de rag, préparation de l'index (ensure_index),
+première recherche (chargement du modèle de requêtes compris), et si
+chromadb a été importé (après une consultation du cache de réponses,
+comme à chaque tour de l'agent).
+
+Usage : python -m bench.bench_snapshot [--runs 3]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from bench.benchmark import prepare_environment
+
+
+COLD_START = """
+import json, sys, time
+start = time.perf_counter()
+import rag
+imported = time.perf_counter()
+rag.ensure_index()
+ready = time.perf_counter()
+rag.search_chunks(["surfer à La Torche"])
+searched = time.perf_counter()
+# Comme un tour de l'agent : le cache de réponses est aussi consulté
+import answer_cache
+answer_cache.lookup("surfer à La Torche demain matin")
+print(json.dumps({
+    "import": imported - start, "index": ready - imported, "search": searched - ready,
+    "chromadb": "chromadb" in sys.modules,
+}))
+"""
+
+
+def cold_start(env):
+    result = subprocess.run([sys.executable, "-c", COLD_START], env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_environment(tmp)
+        path = os.path.join(tmp, "sunny_index.snapshot")
+        subprocess.run([sys.executable, "snapshot.py", "build", "--output", path], check=True)
+        subprocess.run([sys.executable, "snapshot.py", "info", path], check=True)
+
+        cases = {
+            "sans snapshot": {},
+            "memmap": {"SUNNY_SNAPSHOT": path, "SUNNY_SNAPSHOT_MODE": "memmap"},
+            "chroma (1er)": {"SUNNY_SNAPSHOT": path, "SUNNY_SNAPSHOT_MODE": "chroma"},
+            "chroma (2e)": {"SUNNY_SNAPSHOT": path, "SUNNY_SNAPSHOT_MODE": "chroma"},
+        }
+        print(f"\n{'démarrage':<15} {'import (ms)':>12} {'index (ms)':>11} {'1re recherche (ms)':>19} {'chromadb':>9}")
+        for label, overrides in cases.items():
+            runs = []
+            for n in range(args.runs):
+                # Base neuve à chaque essai, sauf "chroma (2e)" qui reprend celle du 1er démarrage
+                db = os.path.join(tmp, f"node_{label.split()[0]}_{n}")
+                env = dict(os.environ, SUNNY_CHROMA_PATH=db, **overrides)
+                runs.append(cold_start(env))
+            median = {key: statistics.median(run[key] for run in runs) * 1000 for key in ("import", "index", "search")}
+            print(
+                f"{label:<15} {median['import']:>12.0f} {median['index']:>11.0f} "
+                f"{median['search']:>19.0f} {'oui' if runs[0]['chromadb'] else 'non':>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
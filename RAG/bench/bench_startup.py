@@ -0,0 +1,89 @@
+"""
+Temps de démarrage : import à froid des modules de Sunny (chacun dans un
+processus neuf, avec `python -X importtime`), paquets qui coûtent le plus
+et dépendances lourdes chargées dès l'import (torch, sentence_transformers,
+chromadb...). Pour l'app Streamlit : premier passage du script et reruns
+(ce que paie chaque interaction), via streamlit.testing.
+
+Usage : python -m bench.bench_startup [--modules sunny_agent agent_executor server rag] [--top 10] [--reruns 5]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+
+# Dépendances qui ne devraient être importées qu'au premier usage
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "chromadb", "onnxruntime")
+
+
+def import_profile(module):
+    """Import de `module` dans un processus neuf : (durée totale en s, self-time par paquet en s, lourds chargés)"""
+    code = f"import sys, {module}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True,
+    )
+    wall = time.perf_counter() - start
+
+    # Lignes "import time: self [us] | cumulative | module"
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_us) / 1e6
+    heavy = [m for m in result.stdout.strip().split(",") if m]
+    return wall, packages, heavy
+
+
+def app_reruns(reruns):
+    """Premier passage de app.py puis médiane des reruns (en s), chargement de fond terminé"""
+    from streamlit.testing.v1 import AppTest
+
+    # Chemin relatif au fichier appelant (bench/) : l'app est dans le dossier parent
+    app = AppTest.from_file("../app.py", default_timeout=60)
+    start = time.perf_counter()
+    app.run()
+    first = time.perf_counter() - start
+
+    # Le chargement de l'agent en fond ne doit pas fausser la mesure des reruns
+    for thread in threading.enumerate():
+        if thread.name == "sunny-warm-up":
+            thread.join()
+
+    timings = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - start)
+    return first, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=["sunny_agent", "agent_executor", "server", "rag"])
+    parser.add_argument("--top", type=int, default=10, help="paquets les plus coûteux affichés")
+    parser.add_argument("--reruns", type=int, default=5)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        wall, packages, heavy = import_profile(module)
+        print(f"import {module} : {wall * 1000:.0f} ms (processus compris), "
+              f"lourds chargés : {', '.join(heavy) or 'aucun'}")
+        for package, seconds in sorted(packages.items(), key=lambda p: -p[1])[:args.top]:
+            print(f"    {package:<28} {seconds * 1000:>8.1f} ms")
+
+    try:
+        first, rerun = app_reruns(args.reruns)
+    except ImportError:
+        print("\nstreamlit.testing indisponible : app.py non mesurée")
+        return
+    print(f"\napp.py : premier passage {first * 1000:.0f} ms, rerun (médiane) {rerun * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
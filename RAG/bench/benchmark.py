@@ -0,0 +1,198 @@
+"""
+Benchmark hors ligne de tout le pipeline, sans Groq ni API météo :
+faux LLM déterministe (fake_llm.py) et faux Nominatim / StormGlass
+(stub_apis.py), base Chroma et mémoire dans un dossier temporaire.
+
+Mesures : ingestion (temps, chunks/s), débit d'embedding, latence de la
+recherche RAG et d'un tour complet de l'agent (p50/p95/p99). Le rapport
+JSON peut être comparé d'un commit à l'autre.
+
+Usage : python -m bench.benchmark [--output bench_report.json] [--queries questions.jsonl] [--repeat 3]
+Format de --queries : une ligne JSON par question, champ "query" (ou "question",
+"title", "body" : le premier présent).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from batch import read_items
+from metrics import latency_stats
+
+
+DEFAULT_QUERIES = [
+    "Quels spots pour débuter dans le Finistère ?",
+    "Conditions à La Torche en ce moment ?",
+    "Quelle combinaison pour une eau à 12 degrés ?",
+    "Prévisions pour demain à La Palue",
+    "Le Petit Minou c'est pour quel niveau ?",
+    "Quelle planche pour débuter ?",
+    "Beach break à marée basse dans le Morbihan",
+    "Faut-il des chaussons et des gants en hiver ?",
+    "Quelle est la houle à Dossen ?",
+    "Spots de reef pour surfeurs confirmés",
+]
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_environment(tmp, api_latency=0.0):
+    """
+    Tout dans un dossier temporaire et les API météo sur le serveur local
+    (api_latency : délai ajouté à chaque réponse, en secondes).
+    Doit être appelé avant d'importer les modules de Sunny (configuration lue à l'import).
+    """
+    from bench.stub_apis import start_in_thread
+
+    base_url = start_in_thread(latency=api_latency)
+    os.environ.update({
+        "SUNNY_CHROMA_PATH": os.path.join(tmp, "chroma_db"),
+        "SUNNY_MEMORY_DB": os.path.join(tmp, "memory.db"),
+        "SUNNY_FORECAST_DIR": os.path.join(tmp, "forecast_store"),
+        "SUNNY_GEOCODE_CACHE": os.path.join(tmp, "geocode_cache.json"),
+        "SUNNY_NOMINATIM_URL": f"{base_url}/search",
+        "SUNNY_STORMGLASS_URL": f"{base_url}/v2/weather/point",
+        "STORMGLASS_API_KEY": "offline",
+    })
+
+
+def bench_ingestion():
+    import rag
+    from resources import get_collection
+
+    start = time.perf_counter()
+    rag.initialize_rag()
+    cold = time.perf_counter() - start
+    n_chunks = get_collection().count()
+
+    start = time.perf_counter()
+    rag.initialize_rag()
+    warm = time.perf_counter() - start
+
+    # Découpage seul (sans embedding) : extraction + chunking en flux
+    start = time.perf_counter()
+    texts = [chunk for path in rag.list_sources() for chunk, _ in rag.iter_source_chunks(path)]
+    chunking = time.perf_counter() - start
+
+    return {
+        "cold_s": round(cold, 3),
+        "incremental_noop_s": round(warm, 4),
+        "chunks": n_chunks,
+        "chunks_per_s": round(n_chunks / cold, 1),
+        "chunking_only_chunks_per_s": round(len(texts) / chunking, 1),
+    }, texts
+
+
+def bench_embedding(texts, repeat):
+    from rag import BATCH_SIZE
+    from resources import get_embedding_model
+
+    model = get_embedding_model()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(0, len(texts), BATCH_SIZE):
+            model.encode(texts[i:i + BATCH_SIZE], convert_to_numpy=True, normalize_embeddings=True)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {"texts": len(texts), "texts_per_s": round(len(texts) / best, 1)}
+
+
+def bench_retrieval(queries, repeat):
+    import rag
+
+    cold, warm = [], []
+    for _ in range(repeat):
+        for query in queries:
+            # Sans le cache des embeddings de questions, puis avec
+            rag._query_cache.clear()
+            start = time.perf_counter()
+            rag.search_chunks([query])
+            cold.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            rag.search_chunks([query])
+            warm.append(time.perf_counter() - start)
+    return {"cold": latency_stats(cold), "cached_embedding": latency_stats(warm)}
+
+
+def bench_agent(queries, repeat):
+    import sunny_agent
+    from bench.fake_llm import FakeChatModel
+
+    model = FakeChatModel(use_tools=True)
+    sunny_agent.agent = sunny_agent.build_agent(model=model)
+
+    turns, first_tokens, tools = [], [], {}
+    for r in range(repeat):
+        for n, query in enumerate(queries):
+            config = {"configurable": {"thread_id": f"bench-{r}-{n}"}}
+            start = time.perf_counter()
+            first = None
+            for event in sunny_agent.stream_sunny(query, config, use_cache=False):
+                if event[0] == "token" and first is None:
+                    first = time.perf_counter() - start
+                elif event[0] == "tool_start":
+                    tools[event[1]] = tools.get(event[1], 0) + 1
+            turns.append(time.perf_counter() - start)
+            first_tokens.append(first or turns[-1])
+
+    return {
+        "turn": latency_stats(turns),
+        "first_token": latency_stats(first_tokens),
+        "tool_calls": tools,
+        "fake_llm": {
+            "base_latency_s": model.base_latency,
+            "seconds_per_prompt_token": model.seconds_per_prompt_token,
+            "seconds_per_output_token": model.seconds_per_output_token,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default="bench_report.json")
+    parser.add_argument("--queries", help="fichier JSONL de questions (sinon jeu par défaut)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    queries = [item["question"] for item in read_items(args.queries)] if args.queries else DEFAULT_QUERIES
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_environment(tmp)
+        report = {
+            "commit": git_commit(),
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "machine": platform.machine(),
+            "queries": len(queries),
+            "repeat": args.repeat,
+        }
+
+        print("Ingestion...")
+        report["ingestion"], texts = bench_ingestion()
+        print("Embeddings...")
+        report["embedding"] = bench_embedding(texts, args.repeat)
+        print("Recherche RAG...")
+        report["retrieval"] = bench_retrieval(queries, args.repeat)
+        print("Tours de l'agent...")
+        report["agent"] = bench_agent(queries, args.repeat)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"\nRapport écrit dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Faux modèle de chat pour les benchmarks : pas d'appel à Groq, mais une
+latence réaliste, proportionnelle à la taille du prompt (préremplissage)
+et au nombre de jetons générés. Peut aussi appeler les outils de Sunny
+selon des mots-clés, pour exercer tout le parcours de l'agent.
+"""
+import re
+import json
+import time
+import asyncio
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+WEATHER_WORDS = re.compile(r"\b(vagues?|houle|météo|conditions|vent|eau)\b", re.IGNORECASE)
+FORECAST_WORDS = re.compile(r"\b(demain|ce soir|prévisions?|meilleure heure)\b", re.IGNORECASE)
+LOCATION = re.compile(r"\b(?:à|au|a) ((?:la |le )?[A-ZÉ][\w'-]+(?: [A-ZÉ][\w'-]+)*)")
+
+
+class FakeChatModel(BaseChatModel):
+    """Modèle factice : latence = base + prompt * coût/jeton + réponse * coût/jeton"""
+
+    base_latency: float = 0.05
+    seconds_per_prompt_token: float = 0.00002
+    seconds_per_output_token: float = 0.002
+    answer_words: int = 60
+    # Appeler les outils de Sunny selon la question (sinon réponse directe)
+    use_tools: bool = False
+    # Taille des prompts reçus (jetons approximatifs), pour les rapports
+    prompt_tokens: list = []
+
+    @property
+    def _llm_type(self):
+        return "fake-sunny"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _reply(self, messages):
+        """Réponse (et latence simulée) pour une liste de messages"""
+        tokens = count_tokens_approximately(messages)
+        self.prompt_tokens.append(tokens)
+
+        last = messages[-1] if messages else None
+        if self.use_tools and isinstance(last, HumanMessage):
+            message = self._tool_call(last.text)
+        else:
+            seen = " ".join(m.text for m in messages[-3:] if isinstance(m, ToolMessage))
+            words = (seen.split() or ["Sunny", "répond", "ici"]) * self.answer_words
+            message = AIMessage(content=" ".join(words[:self.answer_words]))
+
+        output_tokens = count_tokens_approximately([message])
+        latency = self.base_latency + tokens * self.seconds_per_prompt_token
+        return message, latency, output_tokens * self.seconds_per_output_token
+
+    def _tool_call(self, question):
+        match = LOCATION.search(question)
+        location = match.group(1) if match else "La Torche"
+        if FORECAST_WORDS.search(question):
+            name, args = "get_surf_forecast", {"location": location, "day_offset": 1}
+        elif WEATHER_WORDS.search(question):
+            name, args = "get_surf_conditions", {"location": location}
+        else:
+            name, args = "search_surf_knowledge", {"queries": [question]}
+        call_id = f"call_{len(self.prompt_tokens)}"
+        return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id}])
+
+    @staticmethod
+    def _chunks(message):
+        if message.tool_calls:
+            yield AIMessageChunk(content="", tool_call_chunks=[
+                {"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": n}
+                for n, c in enumerate(message.tool_calls)
+            ])
+            return
+        for word in message.content.split(" "):
+            yield AIMessageChunk(content=word + " ")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        message, latency, generation = self._reply(messages)
+        time.sleep(latency + generation)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        message, latency, generation = self._reply(messages)
+        await asyncio.sleep(latency + generation)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        message, latency, generation = self._reply(messages)
+        time.sleep(latency)
+        chunks = list(self._chunks(message))
+        for chunk in chunks:
+            time.sleep(generation / len(chunks))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        message, latency, generation = self._reply(messages)
+        await asyncio.sleep(latency)
+        chunks = list(self._chunks(message))
+        for chunk in chunks:
+            await asyncio.sleep(generation / len(chunks))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
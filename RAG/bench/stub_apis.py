@@ -0,0 +1,135 @@
+"""
+Serveur local qui imite Nominatim et StormGlass (réponses déterministes).
+Sert aux benchmarks et aux essais hors ligne de l'outil météo.
+
+Usage :
+    python -m bench.stub_apis --port 8765 --latency 0.2
+    export SUNNY_NOMINATIM_URL=http://127.0.0.1:8765/search
+    export SUNNY_STORMGLASS_URL=http://127.0.0.1:8765/v2/weather/point
+"""
+import argparse
+import asyncio
+import hashlib
+import math
+import threading
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+
+# Quelques lieux connus ; les autres reçoivent des coordonnées dérivées de leur nom
+KNOWN_PLACES = {
+    "la torche": (47.8375, -4.3497),
+    "la palue": (48.2069, -4.5531),
+    "le petit minou": (48.3369, -4.6136),
+    "dossen": (48.7011, -4.0686),
+}
+UNKNOWN_PLACE = "nulle part"
+FORECAST_HOURS = 240
+
+
+def _coords_for(query):
+    name = " ".join(query.lower().split())
+    if name in KNOWN_PLACES:
+        return KNOWN_PLACES[name]
+    digest = hashlib.sha1(name.encode("utf-8")).digest()
+    # Un point quelconque sur la côte bretonne
+    return 47.3 + digest[0] / 255 * 1.5, -4.8 + digest[1] / 255 * 2.0
+
+
+def _hour_values(lat, lon, hour):
+    """Série horaire synthétique mais réaliste (cycles de houle et de vent)"""
+    phase = (lat + lon) * 10
+    swell = 1.2 + 0.8 * math.sin(hour / 18 + phase)
+    return {
+        "waveHeight": round(swell * 1.1, 2),
+        "swellHeight": round(swell, 2),
+        "swellPeriod": round(10 + 3 * math.sin(hour / 30 + phase), 1),
+        "waterTemperature": round(12 + 0.5 * math.sin(hour / 24), 1),
+        "windSpeed": round(6 + 4 * math.sin(hour / 7 + phase), 1),
+        "gust": round(9 + 5 * math.sin(hour / 7 + phase), 1),
+    }
+
+
+def build_app(latency=0.0, fail_every=0, retry_after=None):
+    """
+    Application aiohttp. `latency` ajoute un délai à chaque réponse ;
+    `fail_every` > 0 renvoie un 503 toutes les N requêtes (test des retries),
+    avec un en-tête Retry-After de `retry_after` secondes s'il est donné.
+    """
+    counter = {"requests": 0}
+
+    async def delay_or_fail():
+        counter["requests"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if fail_every and counter["requests"] % fail_every == 0:
+            headers = {"Retry-After": str(retry_after)} if retry_after is not None else None
+            raise web.HTTPServiceUnavailable(headers=headers)
+
+    async def search(request):
+        await delay_or_fail()
+        query = request.query.get("q", "")
+        if " ".join(query.lower().split()) == UNKNOWN_PLACE:
+            return web.json_response([])
+        lat, lon = _coords_for(query)
+        return web.json_response([{"lat": str(lat), "lon": str(lon), "display_name": query}])
+
+    async def weather_point(request):
+        await delay_or_fail()
+        if not request.headers.get("Authorization"):
+            return web.json_response({"errors": {"key": "API key is invalid"}}, status=403)
+        lat = float(request.query["lat"])
+        lon = float(request.query["lng"])
+        start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        hours = []
+        for h in range(FORECAST_HOURS):
+            values = _hour_values(lat, lon, start.timestamp() / 3600 + h)
+            hour = {"time": (start + timedelta(hours=h)).isoformat()}
+            hour.update({name: {"sg": value, "noaa": value} for name, value in values.items()})
+            hours.append(hour)
+        return web.json_response({"hours": hours, "meta": {"lat": lat, "lng": lon}})
+
+    async def stats(request):
+        return web.json_response(counter)
+
+    app = web.Application()
+    app.router.add_get("/search", search)
+    app.router.add_get("/v2/weather/point", weather_point)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+def start_in_thread(host="127.0.0.1", port=0, **kwargs):
+    """
+    Démarre le serveur dans un thread de fond et renvoie son URL de base
+    (ex: http://127.0.0.1:54321). port=0 choisit un port libre.
+    """
+    ready = threading.Event()
+    result = {}
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        runner = web.AppRunner(build_app(**kwargs))
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, host, port)
+        loop.run_until_complete(site.start())
+        result["url"] = f"http://{host}:{site._server.sockets[0].getsockname()[1]}"
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name="stub-apis", daemon=True).start()
+    ready.wait()
+    return result["url"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bouchons Nominatim / StormGlass")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="délai par réponse (s)")
+    parser.add_argument("--fail-every", type=int, default=0, help="503 toutes les N requêtes")
+    parser.add_argument("--retry-after", type=int, default=None, help="en-tête Retry-After des 503 (s)")
+    args = parser.parse_args()
+    web.run_app(build_app(args.latency, args.fail_every, args.retry_after), host=args.host, port=args.port)
@@ -0,0 +1,278 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+from pathlib import Path
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+
+# Mémoire des conversations sur disque (une base SQLite, survit aux redémarrages)
+CHECKPOINT_DB_PATH = os.getenv("SUNNY_MEMORY_DB", "./sunny_memory.db")
+# Checkpoints gardés par conversation : seul le dernier sert à reprendre,
+# les précédents ne servent qu'à l'historique (get_state_history)
+MAX_CHECKPOINTS_PER_THREAD = 10
+# Conversations gardées : au-delà, les moins récemment utilisées sont supprimées
+MAX_THREADS = 5000
+# Une conversation inactive depuis plus longtemps est supprimée
+THREAD_TTL = 7 * 24 * 3600
+# Nettoyage des conversations toutes les N écritures de checkpoint
+EVICT_EVERY = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS threads_last_used ON threads (last_used);
+"""
+
+
+class SQLiteCheckpointer(BaseCheckpointSaver):
+    """
+    Checkpointer LangGraph persistant et borné :
+    - stockage dans SQLite au lieu de la RAM du processus ;
+    - au plus MAX_CHECKPOINTS_PER_THREAD checkpoints par conversation ;
+    - conversations inactives (THREAD_TTL) ou les moins récemment utilisées
+      au-delà de MAX_THREADS supprimées (LRU).
+    """
+
+    def __init__(
+        self,
+        path=CHECKPOINT_DB_PATH,
+        max_checkpoints=MAX_CHECKPOINTS_PER_THREAD,
+        max_threads=MAX_THREADS,
+        thread_ttl=THREAD_TTL,
+        *,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_checkpoints = max_checkpoints
+        self.max_threads = max_threads
+        self.thread_ttl = thread_ttl
+        # Une connexion partagée, protégée par un verrou (écritures courtes et locales)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self._puts = 0
+
+    def _tuple(self, row, thread_id, checkpoint_ns):
+        checkpoint_id, parent_id, type_, checkpoint, metadata_type, metadata = row
+        writes = self.conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+            }},
+            checkpoint=self.serde.loads_typed((type_, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                {"configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": parent_id,
+                }}
+                if parent_id else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+        )
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = (
+            "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+            "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        params = [thread_id, checkpoint_ns]
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        else:
+            # Les ids de checkpoint croissent avec le temps : le plus grand est le dernier
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+
+        with self.lock:
+            row = self.conn.execute(query, params).fetchone()
+            return self._tuple(row, thread_id, checkpoint_ns) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+            "metadata_type, metadata FROM checkpoints WHERE 1 = 1"
+        )
+        params = []
+        if config:
+            query += " AND thread_id = ?"
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                query += " AND checkpoint_ns = ?"
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            query += " AND checkpoint_id < ?"
+            params.append(before_id)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+            results = []
+            for thread_id, checkpoint_ns, *row in rows:
+                if limit is not None and len(results) >= limit:
+                    break
+                item = self._tuple(row, thread_id, checkpoint_ns)
+                if filter and any(item.metadata.get(k) != v for k, v in filter.items()):
+                    continue
+                results.append(item)
+        yield from results
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, data = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 type_, data, metadata_type, metadata_data),
+            )
+            self.conn.execute("INSERT OR REPLACE INTO threads VALUES (?, ?)", (thread_id, time.time()))
+            self._prune_thread(thread_id, checkpoint_ns)
+            self._puts += 1
+            if self._puts % EVICT_EVERY == 0:
+                self._evict_threads()
+
+        return {"configurable": {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"],
+        }}
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Écritures spéciales (erreur, interruption...) : remplacées ;
+        # les autres ne sont écrites qu'une fois
+        rows = {"REPLACE": [], "IGNORE": []}
+        for n, (channel, value) in enumerate(writes):
+            type_, data = self.serde.dumps_typed(value)
+            rows["REPLACE" if channel in WRITES_IDX_MAP else "IGNORE"].append(
+                (thread_id, checkpoint_ns, checkpoint_id, task_id,
+                 WRITES_IDX_MAP.get(channel, n), channel, type_, data, task_path)
+            )
+        with self.lock, self.conn:
+            for conflict, values in rows.items():
+                self.conn.executemany(
+                    f"INSERT OR {conflict} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", values
+                )
+
+    def delete_thread(self, thread_id):
+        with self.lock, self.conn:
+            self._delete_threads([thread_id])
+
+    # Versions asynchrones : les appels SQLite (écriture synchronisée, nettoyage) se font
+    # dans un thread, pour ne pas bloquer les autres tours de la boucle (connexion sous verrou)
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def _prune_thread(self, thread_id, checkpoint_ns):
+        """Supprime les checkpoints les plus anciens d'une conversation (et leurs écritures)"""
+        old = self.conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.max_checkpoints),
+        ).fetchall()
+        if not old:
+            return
+        params = [(thread_id, checkpoint_ns, checkpoint_id) for checkpoint_id, in old]
+        for table in ("checkpoints", "writes"):
+            self.conn.executemany(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                params,
+            )
+
+    def _evict_threads(self):
+        """Supprime les conversations expirées, puis les moins récentes au-delà de max_threads"""
+        expired = self.conn.execute(
+            "SELECT thread_id FROM threads WHERE last_used < ?", (time.time() - self.thread_ttl,)
+        ).fetchall()
+        surplus = self.conn.execute(
+            "SELECT thread_id FROM threads WHERE last_used >= ? ORDER BY last_used DESC LIMIT -1 OFFSET ?",
+            (time.time() - self.thread_ttl, self.max_threads),
+        ).fetchall()
+        self._delete_threads([thread_id for thread_id, in expired + surplus])
+
+    def _delete_threads(self, thread_ids):
+        params = [(thread_id,) for thread_id in thread_ids]
+        for table in ("checkpoints", "writes", "threads"):
+            self.conn.executemany(f"DELETE FROM {table} WHERE thread_id = ?", params)
+
+    def stats(self):
+        """Nombre de conversations et de checkpoints stockés"""
+        with self.lock:
+            threads, = self.conn.execute("SELECT COUNT(*) FROM threads").fetchone()
+            checkpoints, = self.conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()
+        return {"threads": threads, "checkpoints": checkpoints}
@@ -0,0 +1,202 @@
+"""
+Assemblage du contexte renvoyé au LLM par la recherche (search_surf_knowledge).
+
+Les chunks se recouvrent (chunk_overlap, voir rag.py) et plusieurs
+reformulations ramènent souvent les mêmes passages : joints tels quels,
+ils coûtent des jetons (latence, quota Groq) sans rien apporter.
+build_context :
+1. recolle les chunks qui se suivent dans leur source (recouvrement) ;
+2. découpe en phrases et écarte les doublons (même texte ou embeddings
+   presque identiques) ;
+3. note chaque phrase selon la question la plus proche (similarité des
+   embeddings + part des mots de la question qu'elle contient, comme la
+   recherche hybride) et écarte celles qui sont hors sujet ;
+4. garde les meilleures dans la limite de CONTEXT_TOKEN_BUDGET, dans leur
+   ordre d'origine (la première phrase d'un chunk, qui nomme le spot,
+   accompagne toujours les autres).
+
+Les jetons sont estimés (~4 caractères par jeton). Jetons récupérés,
+envoyés et économisés : compteurs context_* de metrics.py, et étape
+"context" du détail du tour (événement "trace").
+"""
+import os
+import re
+import threading
+
+import numpy as np
+from cachetools import LRUCache
+
+from lexical import tokenize
+from metrics import count, timed, trace_values
+from resources import get_embedding_model
+
+
+# Assemblage actif (SUNNY_CONTEXT=0 : chunks joints tels quels, comme avant)
+CONTEXT_ENABLED = os.getenv("SUNNY_CONTEXT", "1") != "0"
+# Jetons maximum du contexte renvoyé au LLM (0 = pas de limite)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("SUNNY_CONTEXT_BUDGET", "500"))
+# Recouvrement minimal (caractères) pour recoller deux chunks
+MIN_OVERLAP = 30
+# Où chercher le recouvrement dans le chunk suivant : en-tête du spot + chunk_overlap
+OVERLAP_WINDOW = 200
+# Deux phrases plus proches que ceci (cosinus) sont des doublons...
+DUPLICATE_SIMILARITY = 0.92
+# ... si elles sont assez longues : "Suitable for all levels." se répète d'une
+# fiche de spot à l'autre mais n'y dit pas la même chose
+DUPLICATE_MIN_CHARS = 60
+# Poids des mots de la question retrouvés dans la phrase (0-1) dans sa note
+LEXICAL_WEIGHT = 0.5
+# Phrase hors sujet en deçà de cette note
+MIN_RELEVANCE = 0.2
+CHARS_PER_TOKEN = 4
+SEPARATOR = "\n--- DONNÉES EXTRAITES ---\n"
+# Nombre d'embeddings de phrases gardés en mémoire (les chunks reviennent souvent)
+SENTENCE_CACHE_SIZE = 4096
+
+# Fin de phrase suivie d'une majuscule ou d'un chiffre, ou saut de ligne
+SENTENCE_BREAK = re.compile(r"(?<=[.!?…])\s+(?=[\"«(A-ZÀ-Ý0-9])|\s*\n+\s*")
+
+_sentence_cache = LRUCache(maxsize=SENTENCE_CACHE_SIZE)
+_sentence_cache_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    """Nombre approximatif de jetons d'un texte"""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _join(first, second):
+    """`first` suivi de `second` s'ils se recouvrent, sinon None"""
+    probe = first[-MIN_OVERLAP:]
+    if len(probe) < MIN_OVERLAP:
+        return None
+    position = second.find(probe, 0, OVERLAP_WINDOW + MIN_OVERLAP)
+    if position < 0:
+        return None
+    return first + second[position + len(probe):]
+
+
+def merge_overlapping(documents):
+    """Recolle les chunks consécutifs d'une même source (au rang du mieux classé)"""
+    documents = list(documents)
+    merged = True
+    while merged:
+        merged = False
+        for i, j in ((i, j) for i in range(len(documents)) for j in range(len(documents)) if i != j):
+            if documents[j] in documents[i]:
+                joined = documents[i]
+            else:
+                joined = _join(documents[i], documents[j])
+            if joined is not None:
+                documents[min(i, j)] = joined
+                del documents[max(i, j)]
+                merged = True
+                break
+    return documents
+
+
+def split_sentences(text):
+    return [sentence for sentence in SENTENCE_BREAK.split(text.strip()) if sentence]
+
+
+def embed_sentences(sentences):
+    """Embeddings normalisés de phrases (cache LRU, les manquantes encodées en un lot)"""
+    with _sentence_cache_lock:
+        found = {s: _sentence_cache[s] for s in sentences if s in _sentence_cache}
+    missing = list(dict.fromkeys(s for s in sentences if s not in found))
+    if missing:
+        with timed("embed_sentences"):
+            vectors = get_embedding_model().encode(missing, convert_to_numpy=True, normalize_embeddings=True)
+        with _sentence_cache_lock:
+            for sentence, vector in zip(missing, vectors):
+                _sentence_cache[sentence] = vector
+                found[sentence] = vector
+    return np.stack([found[s] for s in sentences])
+
+
+def relevance_scores(queries, texts, similarities):
+    """Note de chaque phrase : cosinus + part des mots de la question présents, meilleure question"""
+    query_words = [set(tokenize(query)) for query in queries]
+    overlap = np.array([
+        [len(words & set(tokenize(text))) / len(words) if words else 0.0 for words in query_words]
+        for text in texts
+    ])
+    return (similarities + LEXICAL_WEIGHT * overlap).max(axis=1)
+
+
+def select_sentences(queries, documents, budget):
+    """
+    Phrases gardées de chaque document : liste (une entrée par document)
+    de listes d'indices de phrases, dans l'ordre du texte.
+    """
+    from rag import embed_queries
+
+    sentences = [split_sentences(document) for document in documents]
+    flat = [(d, s) for d, doc_sentences in enumerate(sentences) for s in range(len(doc_sentences))]
+    if not flat:
+        return sentences, [[] for _ in documents]
+    texts = [sentences[d][s] for d, s in flat]
+    vectors = embed_sentences(texts)
+    relevance = relevance_scores(queries, texts, vectors @ embed_queries(queries).T)
+
+    # Doublons : une phrase déjà vue (texte normalisé ou embedding très proche) est écartée
+    unique, seen = [], set()
+    similarities = vectors @ vectors.T
+    for n, text in enumerate(texts):
+        key = " ".join(text.lower().split())
+        if len(key) >= DUPLICATE_MIN_CHARS and (
+            key in seen or (unique and similarities[n, unique].max() >= DUPLICATE_SIMILARITY)
+        ):
+            continue
+        seen.add(key)
+        unique.append(n)
+
+    # Les plus pertinentes d'abord, tant que le budget le permet
+    chosen, used = set(), 0
+    for n in sorted(unique, key=lambda n: -relevance[n]):
+        if relevance[n] < MIN_RELEVANCE and chosen:
+            break
+        d, s = flat[n]
+        # La première phrase du document (spot, sujet) accompagne les autres
+        header = flat.index((d, 0))
+        added = [n] if n == header or header in chosen or header not in unique else [header, n]
+        cost = sum(estimate_tokens(texts[m]) + 1 for m in added)
+        if budget and used + cost > budget and chosen:
+            continue
+        chosen.update(added)
+        used += cost
+
+    kept = [[] for _ in documents]
+    for n in sorted(chosen):
+        d, s = flat[n]
+        kept[d].append(s)
+    return sentences, kept
+
+
+def build_context(queries, documents, budget=None):
+    """
+    Contexte à renvoyer au LLM pour ces questions et ces chunks (dans
+    l'ordre du classement) : (texte, statistiques en jetons estimés).
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    raw = SEPARATOR.join(documents)
+    if not CONTEXT_ENABLED or not documents:
+        text = raw
+    else:
+        with timed("context"):
+            documents = merge_overlapping(documents)
+            sentences, kept = select_sentences(queries, documents, budget)
+            parts = [" ".join(sentences[d][s] for s in indices) for d, indices in enumerate(kept) if indices]
+            text = SEPARATOR.join(parts)
+
+    stats = {
+        "retrieved_tokens": estimate_tokens(raw),
+        "sent_tokens": estimate_tokens(text),
+    }
+    stats["saved_tokens"] = stats["retrieved_tokens"] - stats["sent_tokens"]
+    count("context_tokens", stats["retrieved_tokens"], kind="retrieved")
+    count("context_tokens", stats["sent_tokens"], kind="sent")
+    count("context_tokens_saved", stats["saved_tokens"])
+    count("context_builds")
+    trace_values("context", **stats)
+    return text, stats
@@ -0,0 +1,196 @@
+"""
+Backends d'embedding pour les machines sans GPU.
+
+- OnnxEmbeddingModel : le même modèle exporté en ONNX et exécuté par ONNX
+  Runtime, en float32 ou quantifié en int8 (quantification dynamique des
+  poids). Même interface encode() que SentenceTransformer.
+- QueryBatcher : regroupe les encodages de questions demandés en même temps
+  (plusieurs conversations) en un seul passage du modèle.
+
+L'export ONNX est fait une seule fois, au premier chargement, dans le dossier
+SUNNY_ONNX_DIR (il demande torch et le paquet onnx, pas l'exécution).
+"""
+import os
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+# onnxruntime n'est importé qu'avec un backend ONNX : QueryBatcher sert aussi au backend torch
+
+
+FP32_FILE = "model.onnx"
+INT8_FILE = "model_int8.onnx"
+CONFIG_FILE = "sunny_onnx.json"
+
+
+def export_onnx(model_name, directory):
+    """
+    Exporte le modèle SentenceTransformer (transformer + mean pooling) en ONNX,
+    puis sa version quantifiée en int8, avec le tokenizer, dans `directory`.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+
+    class MeanPooled(torch.nn.Module):
+        """Transformer + moyenne des tokens (hors padding), comme le Pooling du modèle"""
+
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask):
+            hidden = self.transformer(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+            mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+            return (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+
+    os.makedirs(directory, exist_ok=True)
+    st_model.tokenizer.save_pretrained(directory)
+    sample = st_model.tokenizer(["Quelle combinaison pour une eau à 12 degrés ?"], return_tensors="pt")
+    fp32_path = os.path.join(directory, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            MeanPooled(),
+            (sample["input_ids"], sample["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["sentence_embedding"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "sentence_embedding": {0: "batch"},
+            },
+            opset_version=17,
+            dynamo=False,
+        )
+    quantize_dynamic(fp32_path, os.path.join(directory, INT8_FILE), weight_type=QuantType.QInt8)
+
+    with open(os.path.join(directory, CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump({"model": model_name, "max_seq_length": st_model.max_seq_length}, f)
+
+
+class OnnxEmbeddingModel:
+    """Modèle d'embedding exécuté par ONNX Runtime (CPU)"""
+
+    def __init__(self, directory, quantized=True, threads=0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Un seul passage à la fois par session : le parallélisme est dans les opérateurs
+        options.inter_op_num_threads = 1
+        if threads:
+            options.intra_op_num_threads = threads
+        path = os.path.join(directory, INT8_FILE if quantized else FP32_FILE)
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+        with open(os.path.join(directory, CONFIG_FILE), encoding="utf-8") as f:
+            self.max_seq_length = json.load(f)["max_seq_length"]
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, normalize_embeddings=False, **kwargs):
+        """Embeddings d'un texte ou d'une liste de textes (matrice numpy float32)"""
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        # Textes de longueurs proches dans un même lot : moins de padding
+        order = np.argsort([-len(sentence) for sentence in sentences], kind="stable")
+        parts = []
+        for start in range(0, len(sentences), batch_size):
+            indices = order[start:start + batch_size]
+            tokens = self.tokenizer(
+                [sentences[i] for i in indices], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np",
+            )
+            (vectors,) = self.session.run(None, {
+                "input_ids": tokens["input_ids"].astype(np.int64),
+                "attention_mask": tokens["attention_mask"].astype(np.int64),
+            })
+            parts.append((indices, vectors))
+
+        embeddings = np.empty((len(sentences), parts[0][1].shape[1] if parts else 0), dtype=np.float32)
+        for indices, vectors in parts:
+            embeddings[indices] = vectors
+        if normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings[0] if single else embeddings
+
+
+def load_onnx_model(model_name, directory, quantized=True, threads=0):
+    """Modèle ONNX de `model_name`, exporté dans `directory` s'il n'y est pas encore"""
+    directory = os.path.join(directory, model_name.replace("/", "__"))
+    if not os.path.exists(os.path.join(directory, CONFIG_FILE)):
+        export_onnx(model_name, directory)
+    return OnnxEmbeddingModel(directory, quantized=quantized, threads=threads)
+
+
+class QueryBatcher:
+    """
+    Encode les questions dans un thread dédié : les demandes arrivées pendant
+    le passage précédent du modèle (ou dans les max_wait secondes) partent
+    ensemble dans le suivant, jusqu'à max_batch textes.
+    """
+
+    def __init__(self, model, max_batch=32, max_wait=0.0):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        # Modifiés par le thread d'encodage, lus par l'export des métriques
+        self.stats = {"requests": 0, "texts": 0, "batches": 0}
+        self._stats_lock = threading.Lock()
+        self._queue = queue.Queue()
+        threading.Thread(target=self._loop, name="sunny-embed", daemon=True).start()
+
+    def batch_stats(self):
+        """Copie des compteurs (demandes, textes, passages du modèle)"""
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def encode(self, sentences, **kwargs):
+        """Embeddings normalisés d'une liste de textes (bloquant)"""
+        future = Future()
+        self._queue.put((list(sentences), future))
+        return future.result()
+
+    def _collect(self):
+        """Première demande en attente, plus celles qui la suivent de près"""
+        requests = [self._queue.get()]
+        size = len(requests[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            requests.append(request)
+            size += len(request[0])
+        return requests
+
+    def _loop(self):
+        while True:
+            requests = self._collect()
+            texts = [text for sentences, _ in requests for text in sentences]
+            try:
+                vectors = self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+            except Exception as e:
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+
+            with self._stats_lock:
+                self.stats["requests"] += len(requests)
+                self.stats["texts"] += len(texts)
+                self.stats["batches"] += 1
+            start = 0
+            for sentences, future in requests:
+                future.set_result(vectors[start:start + len(sentences)])
+                start += len(sentences)
@@ -0,0 +1,95 @@
+"""
+Évaluation du RAG sur un petit jeu de questions étiquetées : taux de
+réussite (hit@k) et latence, pour la recherche vectorielle seule, la
+recherche hybride (BM25 + vecteurs), avec ou sans filtres de
+métadonnées, et l'hybride avec reranking.
+
+Usage : python eval_retrieval.py [--k 1 3 5] [--reranker cross-encoder/mmarco-mMiniLMv2-L12-H384-v1]
+"""
+import argparse
+import statistics
+import time
+
+import rag
+import resources
+
+
+# Question -> texte qui doit apparaître dans au moins un des chunks renvoyés
+LABELLED_QUERIES = [
+    ("conditions au Petit Minou", "Petit Minou"),
+    ("La Palue c'est pour quel niveau ?", "La Palue"),
+    ("spot du Dossen marée", "Dossen"),
+    ("infos sur la Baie des Trépassés", "Trépassés"),
+    ("surfer à La Torche", "La Torche"),
+    ("Pors Carn débutants", "Pors Carn"),
+    ("vagues à Quiberon côte sauvage", "Quiberon"),
+    ("Penhors école de surf", "Penhors"),
+    ("spot Kerloc'h presqu'île de Crozon", "Kerloc"),
+    ("Porsmilin près de Brest", "Porsmilin"),
+    ("Boutrouilles Kerlouan bodyboard", "Boutrouilles"),
+    ("Perros-Guirec Trestraou", "Trestraou"),
+    ("Cap Fréhel surf", "Frehel"),
+    ("plage du Ris Douarnenez longboard", "Douarnenez"),
+    ("quelle combi pour une eau à 12 degrés", "4/3"),
+    ("épaisseur de combinaison eau froide", "5/4"),
+    ("quelle planche pour débuter", "Longboard"),
+    ("leash bodyboard poignet", "poignet"),
+    ("chaussons et gants en hiver", "Chaussons"),
+    ("différence shortboard et fish", "Fish"),
+]
+
+
+def evaluate(mode, rerank, filters, ks):
+    """hit@k pour chaque k, latence moyenne et p95 (ms) d'une configuration"""
+    hits = {k: 0 for k in ks}
+    latencies = []
+    for query, expected in LABELLED_QUERIES:
+        start = time.perf_counter()
+        documents = rag.search_chunks([query], n_results=max(ks), mode=mode, rerank=rerank,
+                                       filters=filters)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        expected = expected.lower()
+        for k in ks:
+            if any(expected in document.lower() for document in documents[:k]):
+                hits[k] += 1
+
+    latencies.sort()
+    return (
+        {k: hits[k] / len(LABELLED_QUERIES) for k in ks},
+        statistics.mean(latencies),
+        latencies[int(0.95 * (len(latencies) - 1))],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--reranker", default=resources.RERANKER_MODEL_NAME,
+                        help="modèle cross-encoder (sinon SUNNY_RERANKER)")
+    args = parser.parse_args()
+
+    rag.initialize_rag()
+    # Chauffe : chargement du modèle et des index hors mesure
+    rag.search_chunks(["chauffe"], n_results=1, mode="hybrid", rerank=False)
+
+    configs = [
+        ("dense", "dense", False, True),
+        ("hybride", "hybrid", False, True),
+        ("hybride-filtres", "hybrid", False, False),
+    ]
+    if args.reranker:
+        resources.RERANKER_MODEL_NAME = args.reranker
+        rag.search_chunks(["chauffe"], n_results=1, mode="hybrid", rerank=True)
+        configs.append(("hybride+rerank", "hybrid", True, True))
+
+    header = " ".join(f"{'hit@' + str(k):>7}" for k in args.k)
+    print(f"{'config':<16} {header} {'moy (ms)':>9} {'p95 (ms)':>9}")
+    for name, mode, rerank, filters in configs:
+        hit_rates, mean, p95 = evaluate(mode, rerank, filters, args.k)
+        rates = " ".join(f"{hit_rates[k]:>7.2f}" for k in args.k)
+        print(f"{name:<16} {rates} {mean:>9.1f} {p95:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
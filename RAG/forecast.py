@@ -0,0 +1,240 @@
+import os
+import time
+import threading
+from datetime import datetime, timedelta, time as dt_time
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from cachetools import LRUCache
+
+from resources import atomic_write
+from weather import COORD_PRECISION, afetch_marine_data
+
+
+# Stockage local des prévisions (un fichier .npz par spot)
+FORECAST_DIR = os.getenv("SUNNY_FORECAST_DIR", "./forecast_store")
+# Au-delà de cet âge, la prévision est re-téléchargée
+FORECAST_MAX_AGE = 6 * 3600
+# Nombre de tables gardées en mémoire
+FORECAST_MEMORY_SIZE = 256
+
+# Colonnes de la table (unités StormGlass : m, s, °C, m/s)
+PARAMS = ("waveHeight", "swellHeight", "swellPeriod", "waterTemperature", "windSpeed", "gust")
+# StormGlass renvoie plusieurs sources par paramètre : ordre de préférence
+SOURCES = ("sg", "noaa")
+TIMEZONE = ZoneInfo("Europe/Paris")
+MS_TO_KMH = 3.6
+
+
+class ForecastTable:
+    """
+    Prévision horaire d'un spot, stockée en colonnes :
+    times (secondes epoch, int64), local_hours (heure locale, int8)
+    et values (float32, une ligne par paramètre de PARAMS, NaN si absent).
+    """
+
+    def __init__(self, lat, lon, fetched_at, times, values):
+        self.lat = lat
+        self.lon = lon
+        self.fetched_at = fetched_at
+        self.times = times
+        self.values = values
+        self.local_hours = np.array(
+            [datetime.fromtimestamp(t, TIMEZONE).hour for t in times.tolist()],
+            dtype=np.int8,
+        )
+
+    def __getitem__(self, name):
+        return self.values[PARAMS.index(name)]
+
+    def is_fresh(self, now=None):
+        now = time.time() if now is None else now
+        return (
+            now - self.fetched_at < FORECAST_MAX_AGE
+            and len(self.times) > 0
+            and self.times[0] <= now < self.times[-1] + 3600
+        )
+
+    def at(self, ts):
+        """Valeurs de l'heure contenant `ts` (dict paramètre -> valeur ou None)"""
+        i = int(np.clip(np.searchsorted(self.times, ts, side="right") - 1, 0, len(self.times) - 1))
+        return {name: _scalar(self.values[k, i]) for k, name in enumerate(PARAMS)}
+
+    @staticmethod
+    def day_bounds(day_offset=0, now=None):
+        """Début et fin (epoch) du jour local J+day_offset"""
+        today = datetime.fromtimestamp(time.time() if now is None else now, TIMEZONE).date()
+        day = today + timedelta(days=day_offset)
+        start = datetime.combine(day, dt_time(0), TIMEZONE).timestamp()
+        end = datetime.combine(day + timedelta(days=1), dt_time(0), TIMEZONE).timestamp()
+        return start, end
+
+    def surf_mask(self, start, end, min_wave=0.6, max_wave=2.5, min_period=8.0,
+                  max_wind=25.0, first_hour=7, last_hour=21):
+        """Heures surfables (tableau booléen) entre start et end, vectorisé sur l'axe du temps"""
+        wave = self["waveHeight"]
+        period = self["swellPeriod"]
+        wind = self["windSpeed"] * MS_TO_KMH
+        # Les comparaisons avec NaN valent False : une donnée manquante n'est pas surfable
+        with np.errstate(invalid="ignore"):
+            return (
+                (self.times >= start) & (self.times < end)
+                & (self.local_hours >= first_hour) & (self.local_hours <= last_hour)
+                & (wave >= min_wave) & (wave <= max_wave)
+                & (period >= min_period)
+                & (wind <= max_wind)
+            )
+
+    def scores(self):
+        """Score de surfabilité par heure : vagues longues et vent faible"""
+        with np.errstate(invalid="ignore"):
+            score = self["waveHeight"] * self["swellPeriod"] / (1.0 + self["windSpeed"] * MS_TO_KMH / 10.0)
+        return np.nan_to_num(score, nan=0.0)
+
+    def best_windows(self, start, end, limit=3, **thresholds):
+        """
+        Créneaux consécutifs d'heures surfables entre start et end, classés
+        par score moyen. Renvoie des tuples (début, fin, score, indices).
+        """
+        mask = self.surf_mask(start, end, **thresholds)
+        if not mask.any():
+            return []
+        # Bords des suites de True : +1 = début, -1 = fin
+        edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        stops = np.flatnonzero(edges == -1)
+
+        scores = self.scores()
+        cumulative = np.concatenate(([0.0], np.cumsum(scores)))
+        means = (cumulative[stops] - cumulative[starts]) / (stops - starts)
+        order = np.argsort(-means)[:limit]
+        return [
+            (int(self.times[starts[k]]), int(self.times[stops[k] - 1]) + 3600, float(means[k]), slice(starts[k], stops[k]))
+            for k in order
+        ]
+
+
+def _scalar(value):
+    return None if np.isnan(value) else round(float(value), 2)
+
+
+def parse_hours(hours):
+    """Convertit la liste 'hours' de StormGlass en colonnes (times, values)"""
+    times = np.array(
+        [datetime.fromisoformat(hour["time"]).timestamp() for hour in hours],
+        dtype=np.int64,
+    )
+    values = np.full((len(PARAMS), len(hours)), np.nan, dtype=np.float32)
+    for k, name in enumerate(PARAMS):
+        for i, hour in enumerate(hours):
+            by_source = hour.get(name) or {}
+            for source in SOURCES:
+                if by_source.get(source) is not None:
+                    values[k, i] = by_source[source]
+                    break
+    return times, values
+
+
+def _key(lat, lon):
+    return round(lat, COORD_PRECISION), round(lon, COORD_PRECISION)
+
+
+def _path(key):
+    return Path(FORECAST_DIR) / f"{key[0]:.{COORD_PRECISION}f}_{key[1]:.{COORD_PRECISION}f}.npz"
+
+
+_tables = LRUCache(maxsize=FORECAST_MEMORY_SIZE)
+_tables_lock = threading.Lock()
+
+
+def save_table(table):
+    key = _key(table.lat, table.lon)
+    with atomic_write(_path(key)) as f:
+        np.savez(
+            f,
+            times=table.times,
+            values=table.values,
+            meta=np.array([table.lat, table.lon, table.fetched_at]),
+        )
+    with _tables_lock:
+        _tables[key] = table
+
+
+def load_table(lat, lon):
+    """Table d'un spot depuis la mémoire ou le disque, ou None"""
+    key = _key(lat, lon)
+    with _tables_lock:
+        table = _tables.get(key)
+    if table is not None:
+        return table
+
+    try:
+        with np.load(_path(key)) as data:
+            lat, lon, fetched_at = data["meta"].tolist()
+            table = ForecastTable(lat, lon, fetched_at, data["times"], data["values"])
+    except (FileNotFoundError, OSError, KeyError, ValueError):
+        return None
+
+    with _tables_lock:
+        _tables[key] = table
+    return table
+
+
+async def aget_table(lat, lon, api_key):
+    """
+    Table de prévision d'un point : servie localement tant qu'elle est
+    récente, sinon téléchargée (série horaire complète) puis stockée.
+    Renvoie None si StormGlass ne renvoie pas de données.
+    """
+    lat, lon = _key(lat, lon)
+    table = load_table(lat, lon)
+    if table is not None and table.is_fresh():
+        return table
+
+    data = await afetch_marine_data(lat, lon, api_key)
+    if not data.get("hours"):
+        return None
+    times, values = parse_hours(data["hours"])
+    table = ForecastTable(lat, lon, time.time(), times, values)
+    save_table(table)
+    return table
+
+
+def compare_tables(tables, start, end, **thresholds):
+    """
+    Compare plusieurs spots sur la même journée, en une passe vectorisée :
+    les tables sont alignées sur une grille horaire commune [start, end)
+    (matrice spots x heures). Score d'un spot : somme des scores de ses
+    heures surfables, ramenée au nombre d'heures de la grille (compte à la
+    fois la qualité et la durée des créneaux).
+    Renvoie, pour chaque table dans l'ordre d'entrée, un dict : score,
+    hours (heures surfables), best (epoch de la meilleure heure ou None)
+    et les valeurs de cette heure.
+    """
+    grid = np.arange(int(start), int(end), 3600, dtype=np.int64)
+    n_spots, n_hours = len(tables), len(grid)
+    scores = np.zeros((n_spots, n_hours), dtype=np.float32)
+    masks = np.zeros((n_spots, n_hours), dtype=bool)
+    values = np.full((n_spots, len(PARAMS), n_hours), np.nan, dtype=np.float32)
+
+    for i, table in enumerate(tables):
+        index = np.clip(np.searchsorted(table.times, grid), 0, max(len(table.times) - 1, 0))
+        present = table.times[index] == grid if len(table.times) else np.zeros(n_hours, dtype=bool)
+        scores[i, present] = table.scores()[index[present]]
+        masks[i, present] = table.surf_mask(start, end, **thresholds)[index[present]]
+        values[i][:, present] = table.values[:, index[present]]
+
+    surfable = np.where(masks, scores, 0.0)
+    totals = surfable.sum(axis=1) / max(n_hours, 1)
+    hours = masks.sum(axis=1)
+    best = np.argmax(np.where(masks, scores, -np.inf), axis=1)
+
+    results = []
+    for i in range(n_spots):
+        result = {"score": round(float(totals[i]), 2), "hours": int(hours[i]), "best": None}
+        if hours[i]:
+            result["best"] = int(grid[best[i]])
+            result.update({name: _scalar(values[i, k, best[i]]) for k, name in enumerate(PARAMS)})
+        results.append(result)
+    return results
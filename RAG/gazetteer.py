@@ -0,0 +1,123 @@
+"""
+Gazetteer local des spots de surf bretons : coordonnées sans appel réseau.
+
+Source : spots_bretagne.csv, les noms, alias et coordonnées des spots du
+guide PDF (les mêmes fiches que celles reconnues par spots.py à l'indexation).
+
+- lookup("plage de la torche") : nom ou alias exact (aussi avant une
+  virgule : "La Torche, Finistère"), puis correspondance approchée
+  (fautes de frappe : "Le Petit Minoux"). Jamais un spot cité dans un nom
+  plus long : "Douarnenez" ou "Port Blanc" restent pour Nominatim ;
+- find_in_text(question) / find_all_in_text(question) : spot(s) cité(s)
+  dans une phrase (routeur) ;
+- nearest(lat, lon) / nearest_to("La Torche") : spots les plus proches
+  (KD-tree) ; anearest_spots("Brest") pour n'importe quel lieu.
+
+Les lieux inconnus passent toujours par Nominatim (weather.ageocode, avec cache).
+"""
+import difflib
+
+import numpy as np
+
+from resources import lazy_resource
+from spots import load_catalog, normalize
+
+
+EARTH_RADIUS_KM = 6371.0
+# Ressemblance minimale (0-1) pour une correspondance approchée
+FUZZY_CUTOFF = 0.85
+
+
+def _unit_vectors(lat, lon):
+    """Points (degrés) -> vecteurs unitaires 3D : la distance euclidienne suit la distance au sol"""
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+class Gazetteer:
+    """Index des spots connus : noms normalisés et KD-tree des positions"""
+
+    def __init__(self, spots):
+        from scipy.spatial import cKDTree
+
+        self.spots = spots
+        self.by_alias = {normalize(alias): spot for spot in spots for alias in spot["aliases"]}
+        # Alias les plus longs d'abord : "plage de la palue" avant "palue"
+        self.aliases = sorted(self.by_alias, key=len, reverse=True)
+        self.tree = cKDTree(_unit_vectors([s["lat"] for s in spots], [s["lon"] for s in spots]))
+
+    def find_in_text(self, text):
+        """Premier spot (alias le plus long) cité dans un texte, ou None"""
+        text = f" {normalize(text)} "
+        for alias in self.aliases:
+            if f" {alias} " in text:
+                return self.by_alias[alias]
+        return None
+
+    def find_all_in_text(self, text):
+        """Tous les spots cités dans un texte, dans l'ordre du texte (sans doublon)"""
+        text = f" {normalize(text)} "
+        found = {}
+        for alias in self.aliases:
+            position = text.find(f" {alias} ")
+            while position >= 0:
+                spot = self.by_alias[alias]
+                found.setdefault(spot["name"], (position, spot))
+                # Passage masqué : "le petit minou" ne compte pas aussi comme "petit minou"
+                text = text[:position + 1] + "#" * len(alias) + text[position + 1 + len(alias):]
+                position = text.find(f" {alias} ")
+        return [spot for _, spot in sorted(found.values(), key=lambda item: item[0])]
+
+    def lookup(self, name):
+        """Spot correspondant à un nom de lieu (dict du catalogue), ou None"""
+        key = normalize(name)
+        # "La Torche, Finistère" : le lieu avant la précision de région
+        spot = self.by_alias.get(key) or self.by_alias.get(normalize(name.split(",")[0]))
+        if spot is None:
+            close = difflib.get_close_matches(key, self.aliases, n=1, cutoff=FUZZY_CUTOFF)
+            spot = self.by_alias[close[0]] if close else None
+        return spot
+
+    def coordinates(self, name):
+        """(lat, lon) d'un spot connu, ou None"""
+        spot = self.lookup(name)
+        return None if spot is None else (spot["lat"], spot["lon"])
+
+    def nearest(self, lat, lon, k=5, max_km=None):
+        """Spots les plus proches d'un point : liste de (spot, distance en km)"""
+        k = min(k, len(self.spots))
+        chords, indices = self.tree.query(_unit_vectors([lat], [lon])[0], k=k)
+        results = [
+            (self.spots[i], round(float(km), 1))
+            for i, km in zip(np.atleast_1d(indices), _chord_to_km(np.atleast_1d(chords)))
+        ]
+        if max_km is not None:
+            results = [(spot, km) for spot, km in results if km <= max_km]
+        return results
+
+    def nearest_to(self, name, k=5, max_km=None):
+        """Spots les plus proches d'un spot connu (lui-même exclu), ou None si inconnu"""
+        spot = self.lookup(name)
+        if spot is None:
+            return None
+        return [(s, km) for s, km in self.nearest(spot["lat"], spot["lon"], k + 1, max_km) if s is not spot][:k]
+
+
+@lazy_resource
+def get_gazetteer():
+    """Gazetteer partagé, construit au premier usage"""
+    return Gazetteer(load_catalog())
+
+
+async def anearest_spots(location, k=5, max_km=None):
+    """Spots les plus proches d'un lieu quelconque (géocodé au besoin), ou None si introuvable"""
+    from weather import ageocode
+
+    coords = await ageocode(location)
+    if coords is None:
+        return None
+    return get_gazetteer().nearest(*coords, k=k, max_km=max_km)
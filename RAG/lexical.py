@@ -0,0 +1,157 @@
+import os
+import re
+import json
+import math
+import threading
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+
+from resources import CHROMA_PATH, atomic_write
+
+
+# Index lexical BM25 sur les mêmes chunks que Chroma (stocké avec la base)
+BM25_INDEX_PATH = os.path.join(CHROMA_PATH, "bm25_index.json")
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Mots trop fréquents pour aider à retrouver un spot (FR + EN, sans accents)
+STOPWORDS = set("""
+le la les un une des du de et ou au aux en pour par sur dans avec est sont
+quel quelle quels quelles que qui quoi comment je tu il on nous vous me te se
+the an of to in on at for and or is are with it its by from as be this that
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Mots en minuscules, sans accents ni mots vides ("Trépassés" -> "trepasses")"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in TOKEN_PATTERN.findall(text) if len(t) > 1 and t not in STOPWORDS]
+
+
+class BM25Index:
+    """Index inversé BM25 : pour chaque mot, les chunks qui le contiennent et ses occurrences"""
+
+    def __init__(self, ids, doc_lengths, postings):
+        self.ids = ids
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        self.avg_length = float(self.doc_lengths.mean()) if len(ids) else 0.0
+        self.positions = {doc_id: n for n, doc_id in enumerate(ids)}
+        # mot -> (indices des chunks, fréquences), en tableaux numpy
+        self.postings = {
+            token: (np.asarray(docs, dtype=np.int32), np.asarray(freqs, dtype=np.float32))
+            for token, (docs, freqs) in postings.items()
+        }
+
+    @classmethod
+    def build(cls, ids, texts):
+        postings = {}
+        doc_lengths = []
+        for n, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                docs, freqs = postings.setdefault(token, ([], []))
+                docs.append(n)
+                freqs.append(count)
+        return cls(list(ids), doc_lengths, postings)
+
+    def search(self, query, k=10, allowed=None):
+        """
+        Les k meilleurs chunks pour la question : liste de (id, score).
+        `allowed` (ensemble d'ids) limite la recherche à ces chunks.
+        """
+        n_docs = len(self.ids)
+        if not n_docs:
+            return []
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for token in set(tokenize(query)):
+            if token not in self.postings:
+                continue
+            docs, freqs = self.postings[token]
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[docs] / self.avg_length)
+            scores[docs] += idf * freqs * (BM25_K1 + 1) / (freqs + norm)
+
+        if allowed is not None:
+            mask = np.zeros(n_docs, dtype=bool)
+            mask[[self.positions[i] for i in allowed if i in self.positions]] = True
+            scores[~mask] = 0.0
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+    def to_dict(self):
+        return {
+            "ids": self.ids,
+            "doc_lengths": self.doc_lengths.astype(int).tolist(),
+            "postings": {
+                token: [docs.tolist(), freqs.astype(int).tolist()]
+                for token, (docs, freqs) in self.postings.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["ids"], data["doc_lengths"], data["postings"])
+
+    def save(self, path=BM25_INDEX_PATH):
+        with atomic_write(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path=BM25_INDEX_PATH):
+        return cls.from_dict(json.loads(Path(path).read_text(encoding="utf-8")))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_bm25_index():
+    """Index BM25 chargé depuis le disque au premier usage (None s'il n'existe pas)"""
+    global _index
+    with _index_lock:
+        if _index is None and os.path.exists(BM25_INDEX_PATH):
+            _index = BM25Index.load()
+        return _index
+
+
+def use_bm25_index(index):
+    """Rend actif un index déjà construit (ex: lu dans un snapshot), sans l'écrire sur le disque"""
+    global _index
+    with _index_lock:
+        _index = index
+
+
+def rebuild_bm25_index(ids, texts):
+    """Reconstruit l'index à partir de tous les chunks, le sauvegarde et le rend actif"""
+    global _index
+    index = BM25Index.build(ids, texts)
+    index.save()
+    with _index_lock:
+        _index = index
+    return index
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fusionne plusieurs classements d'ids (Reciprocal Rank Fusion) :
+    score = somme de 1 / (k + rang) sur les classements où l'id apparaît.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
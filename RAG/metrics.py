@@ -0,0 +1,349 @@
+"""
+Instrumentation locale de Sunny : durée de chaque étape (embedding, Chroma,
+géocodage, StormGlass, LLM...), jetons, hits de cache et erreurs.
+
+- Export Prometheus (texte) : render_prometheus(), servi par server.py sur
+  /metrics, ou par un petit serveur dédié si SUNNY_METRICS_PORT est défini.
+- OpenTelemetry (optionnel) : si le paquet est installé et que
+  OTEL_EXPORTER_OTLP_ENDPOINT est défini, chaque étape devient un span
+  envoyé au collecteur local.
+- Détail du tour en cours : start_trace() / end_trace(), affiché dans le
+  panneau de debug de l'interface.
+"""
+import os
+import time
+import inspect
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+
+try:
+    from opentelemetry import trace as otel_trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+except ImportError:  # OpenTelemetry est optionnel
+    otel_trace = None
+
+
+# Bornes des histogrammes de durée (secondes)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Port du serveur /metrics autonome (pour l'app Streamlit) ; vide = pas de serveur
+METRICS_PORT = os.getenv("SUNNY_METRICS_PORT")
+
+_lock = threading.Lock()
+_counters = {}    # (nom, labels) -> valeur
+_histograms = {}  # (nom, labels) -> [compte par borne..., compte, somme]
+_stats_sources = {}  # préfixe -> fonction qui renvoie un dict de compteurs
+_gauges = set()  # valeurs des sources qui ne sont pas des compteurs (exportées en gauge)
+
+# Description des métriques (# HELP) ; les autres sont décrites par leur nom
+HELP = {
+    "errors": "Erreurs par étape et type d'exception",
+    "llm_tokens": "Jetons consommés par le LLM (prompt, completion)",
+    "context_tokens": "Jetons du contexte RAG (récupérés, envoyés)",
+    "context_tokens_saved": "Jetons du contexte RAG économisés par la compression",
+    "cache_hits": "Hits des caches internes",
+    "cache_misses": "Misses des caches internes",
+    "router_turns": "Tours de l'agent selon le routeur d'outils (routé, repli sur le LLM)",
+    "stage_seconds": "Durée de chaque étape d'un tour (secondes)",
+    "weather_marine_entries": "Entrées du cache des données marines",
+}
+
+# Étapes du tour en cours : liste de (étape, durée en s ou None, erreur ou None, valeurs)
+_current_trace = contextvars.ContextVar("sunny_trace", default=None)
+
+
+def _setup_tracer():
+    if otel_trace is None or not os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        return None
+    provider = TracerProvider(resource=Resource.create({"service.name": "sunny"}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    otel_trace.set_tracer_provider(provider)
+    return otel_trace.get_tracer("sunny")
+
+
+_tracer = _setup_tracer()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def count(name, n=1, **labels):
+    """Incrémente un compteur (ex: count("cache_hits", cache="query"))"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+
+def observe(stage, seconds, error=None):
+    """Enregistre la durée d'une étape (histogramme + détail du tour en cours)"""
+    key = _key("stage_seconds", {"stage": stage})
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        for n, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram[n] += 1
+        histogram[-2] += 1
+        histogram[-1] += seconds
+    if error is not None:
+        count("errors", stage=stage, error=type(error).__name__)
+
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.append((stage, seconds, None if error is None else type(error).__name__, {}))
+
+
+@contextmanager
+def timed(stage):
+    """Mesure la durée d'un bloc : `with timed("chroma_query"): ...`"""
+    span = _tracer.start_as_current_span(stage) if _tracer is not None else None
+    if span is not None:
+        span.__enter__()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        observe(stage, time.perf_counter() - start, error)
+        if span is not None:
+            span.__exit__(type(error) if error else None, error, None)
+
+
+def instrument(stage):
+    """Décorateur : mesure chaque appel de la fonction (synchrone ou asynchrone)"""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timed(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def register_stats(prefix, source, gauges=()):
+    """
+    Ajoute à l'export les compteurs d'un module (ex: caches météo) ;
+    `gauges` : noms des valeurs qui ne sont pas des compteurs (ex: taille d'un cache)
+    """
+    _stats_sources[prefix] = source
+    _gauges.update(f"{prefix}_{name}" for name in gauges)
+
+
+def start_trace():
+    """
+    Démarre le détail d'un tour : les étapes suivantes (même contexte) y sont
+    ajoutées. Renvoie (détail, jeton) ; passer le jeton à end_trace à la fin du tour.
+    """
+    trace = []
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    """Termine le détail du tour : le contexte retrouve le détail précédent (ou aucun)"""
+    try:
+        _current_trace.reset(token)
+    except ValueError:  # générateur fermé depuis un autre contexte, qui n'a pas ce détail
+        pass
+
+
+def trace_values(stage, **values):
+    """Ajoute des valeurs (ex: jetons) à une étape du tour en cours, additionnées par summarize_trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.append((stage, None, None, values))
+
+
+def summarize_trace(trace):
+    """Détail d'un tour : durée totale par étape (ms), nombre d'appels, erreurs et valeurs ajoutées"""
+    summary = {}
+    for stage, seconds, error, values in trace:
+        entry = summary.setdefault(stage, {"calls": 0, "ms": 0.0, "errors": 0})
+        if seconds is not None:
+            entry["calls"] += 1
+            entry["ms"] = round(entry["ms"] + seconds * 1000, 1)
+            entry["errors"] += error is not None
+        for name, value in values.items():
+            entry[name] = entry.get(name, 0) + value
+    return summary
+
+
+def latency_stats(seconds):
+    """Percentiles d'une série de durées, en millisecondes (rapports du lot et des benchmarks)"""
+    ms = np.asarray(seconds) * 1000
+    return {
+        "n": len(ms),
+        "mean_ms": round(float(ms.mean()), 2),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+    }
+
+
+def snapshot():
+    """Copie des compteurs et histogrammes (pour le panneau de debug)"""
+    with _lock:
+        counters = {(name, labels): value for (name, labels), value in _counters.items()}
+        histograms = {key: list(values) for key, values in _histograms.items()}
+    for prefix, source in _stats_sources.items():
+        for name, value in source().items():
+            counters[(f"{prefix}_{name}", ())] = value
+    return counters, histograms
+
+
+def _escape(value):
+    """Valeur de label Prometheus : antislash, guillemets et retours à la ligne échappés"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _header(lines, metric, name, kind):
+    """Lignes # HELP et # TYPE d'une métrique"""
+    description = HELP.get(name, name.replace("_", " ")).replace("\\", "\\\\").replace("\n", "\\n")
+    lines.append(f"# HELP {metric} {description}")
+    lines.append(f"# TYPE {metric} {kind}")
+
+
+def render_prometheus():
+    """Toutes les métriques au format texte Prometheus"""
+    counters, histograms = snapshot()
+    lines = []
+    current = None
+    for (name, labels), value in sorted(counters.items()):
+        gauge = name in _gauges
+        # Compteurs suffixés _total, comme le veut la convention Prometheus
+        metric = f"sunny_{name}" if gauge else f"sunny_{name}_total"
+        if metric != current:
+            _header(lines, metric, name, "gauge" if gauge else "counter")
+            current = metric
+        lines.append(f"{metric}{_labels(labels)} {value}")
+
+    for (name, labels), values in sorted(histograms.items()):
+        metric = f"sunny_{name}"
+        if metric != current:
+            _header(lines, metric, name, "histogram")
+            current = metric
+        for bound, n in zip(LATENCY_BUCKETS, values):
+            lines.append(f"{metric}_bucket{_labels(labels, [('le', bound)])} {n}")
+        lines.append(f"{metric}_bucket{_labels(labels, [('le', '+Inf')])} {values[-2]}")
+        lines.append(f"{metric}_count{_labels(labels)} {values[-2]}")
+        lines.append(f"{metric}_sum{_labels(labels)} {values[-1]:.6f}")
+    return "\n".join(lines) + "\n"
+
+
+def llm_usage(response):
+    """Jetons consommés par un appel au LLM (prompt_tokens, completion_tokens), {} si inconnus"""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                usage = {"prompt_tokens": metadata["input_tokens"], "completion_tokens": metadata["output_tokens"]}
+    return usage
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Callback LangChain : durée de chaque appel au LLM et à chaque outil,
+    délai avant le premier jeton, jetons consommés et erreurs.
+    """
+
+    # Appelé directement (pas dans un thread à part) : garde le détail du tour en cours
+    run_inline = True
+
+    def __init__(self):
+        self.starts = {}  # run_id -> (étape, début, premier jeton vu ?)
+
+    def _start(self, run_id, stage):
+        self.starts[run_id] = [stage, time.perf_counter(), False]
+
+    def _end(self, run_id, error=None):
+        started = self.starts.pop(run_id, None)
+        if started is not None:
+            observe(started[0], time.perf_counter() - started[1], error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "llm")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "llm")
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        started = self.starts.get(run_id)
+        if started is not None and not started[2]:
+            started[2] = True
+            observe("llm_first_token", time.perf_counter() - started[1])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = llm_usage(response)
+        if usage:
+            count("llm_tokens", usage.get("prompt_tokens", 0), kind="prompt")
+            count("llm_tokens", usage.get("completion_tokens", 0), kind="completion")
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id, f"tool:{serialized.get('name', 'outil')}")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port=None):
+    """Sert /metrics dans un thread de fond (une seule fois par processus)"""
+    global _metrics_server
+    port = port or METRICS_PORT
+    with _lock:
+        if _metrics_server is None and port:
+            _metrics_server = ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+            threading.Thread(target=_metrics_server.serve_forever, name="sunny-metrics", daemon=True).start()
+    return _metrics_server
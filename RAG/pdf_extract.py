@@ -0,0 +1,71 @@
+import os
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from pypdf import PdfReader
+
+# Module volontairement léger (pypdf uniquement) : il est importé
+# par les processus du pool d'extraction.
+
+# Nombre de pages extraites par tâche
+PAGES_PER_TASK = 4
+# En dessous de ce nombre de pages, extraction dans le processus courant :
+# démarrer un pool coûte plus cher que ce qu'il fait gagner
+MIN_POOL_PAGES = PAGES_PER_TASK * 2
+# Nombre de processus d'extraction au plus (0 = extraction dans le processus courant)
+PDF_WORKERS = int(os.getenv("SUNNY_PDF_WORKERS", os.cpu_count() or 1))
+
+# Lecteur PDF ouvert une seule fois par processus du pool
+_worker_reader = None
+
+
+def _init_worker(file_path):
+    global _worker_reader
+    _worker_reader = PdfReader(file_path)
+
+
+def _extract_pages(start, stop):
+    return [_worker_reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def iter_pdf_pages(file_path, max_workers=None):
+    """
+    Extrait le texte des pages d'un PDF et les renvoie une par une, dans l'ordre.
+    Les pages sont extraites par lots dans un pool de processus ; au plus
+    2 lots par processus sont en attente, la mémoire reste donc bornée.
+    Les processus sont lancés en "spawn" et non en "fork" : l'extraction
+    peut tourner dans un processus multithread (Streamlit, boucles asyncio,
+    threads de torch...) dont les verrous ne doivent pas être copiés.
+    """
+    max_workers = PDF_WORKERS if max_workers is None else max_workers
+    reader = PdfReader(file_path)
+    n_pages = len(reader.pages)
+
+    n_tasks = -(-n_pages // PAGES_PER_TASK)
+    max_workers = min(max_workers, n_tasks)
+
+    # Petit document ou pool désactivé : extraction directe
+    if max_workers <= 1 or n_pages <= MIN_POOL_PAGES:
+        for page in reader.pages:
+            yield page.extract_text() or ""
+        return
+    del reader
+
+    ranges = (
+        (start, min(start + PAGES_PER_TASK, n_pages))
+        for start in range(0, n_pages, PAGES_PER_TASK)
+    )
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(str(file_path),),
+    ) as pool:
+        pending = deque(pool.submit(_extract_pages, *r) for r in islice(ranges, 2 * max_workers))
+        while pending:
+            pages = pending.popleft().result()
+            for r in islice(ranges, 1):
+                pending.append(pool.submit(_extract_pages, *r))
+            yield from pages
@@ -1,37 +1,150 @@
 import os
+import re
+import json
+import hashlib
+import threading
+from itertools import zip_longest
 from pathlib import Path
+import numpy as np
+from cachetools import LRUCache
 from dotenv import load_dotenv
-from groq import Groq
-from pathlib import Path
-from pypdf import PdfReader
-from sentence_transformers import SentenceTransformer
-import chromadb
+from pdf_extract import iter_pdf_pages
+from spots import extract_filters, iter_pdf_sections
+
+# Modèle d'embedding et ChromaDB : chargés une seule fois, au premier usage
+from resources import (
+    CHROMA_PATH, EMBEDDING_BACKEND, RERANKER_MODEL_NAME, atomic_write,
+    get_embedding_model, get_collection, get_query_encoder, get_reranker, lazy_resource,
+)
 
+# Recherche lexicale (BM25) fusionnée avec la recherche vectorielle
+from lexical import get_bm25_index, rebuild_bm25_index, reciprocal_rank_fusion, use_bm25_index
 
+# Index prêt à l'emploi (SUNNY_SNAPSHOT) : ni base à construire ni corpus à embedder
+from snapshot import SNAPSHOT_MODE, SNAPSHOT_PATH, get_snapshot, load_into_chroma
 
-# Modèle d'embedding
-embedding_model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
+# Contexte envoyé au LLM : sans recouvrements, doublons ni phrases hors sujet
+from context import build_context
 
-# ChromaDB
-db_client = chromadb.PersistentClient(path="./chroma_db")
-collection = db_client.get_or_create_collection(name="surf_rag")
+# Durées des étapes et compteurs (voir metrics.py)
+from metrics import count, instrument, timed
 
-# Client Groq pour le RAG
+
+# Configuration lue dans .env (SUNNY_RETRIEVAL...)
 load_dotenv()
-groq_api_key = os.getenv("GROQ_API_KEY")
-llm_client = Groq(api_key=groq_api_key)
 
+# Sources de la base de connaissances
+SOURCE_FILES = ["equipements_surf.txt", "Brittany-Surf-Guide.pdf"]
+# Dossier où déposer de nouveaux guides (PDF ou TXT) à indexer
+DOCUMENTS_DIR = "documents"
+# Manifeste de l'indexation incrémentale (stocké avec la base Chroma)
+MANIFEST_PATH = os.path.join(CHROMA_PATH, "manifest.json")
+# Version du découpage : la changer force la ré-indexation de tous les fichiers
+# (2 : une section par fiche de spot, avec ses métadonnées)
+INDEX_VERSION = 2
+# Taille des lots pour l'embedding et les écritures dans Chroma
+BATCH_SIZE = 256
+# Recherche : "hybrid" (Chroma + BM25, fusion RRF) ou "dense" (Chroma seul)
+RETRIEVAL_MODE = os.getenv("SUNNY_RETRIEVAL", "hybrid")
+# Candidats demandés à chaque moteur avant fusion / reranking
+RETRIEVAL_CANDIDATES = 10
+# Nombre d'embeddings de questions gardés en mémoire
+QUERY_CACHE_SIZE = 1024
+
+_query_cache = LRUCache(maxsize=QUERY_CACHE_SIZE)
+_query_cache_lock = threading.Lock()
+
+
+# Séparateur de paragraphes (ligne vide)
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n")
 
 
 def load_pdf(file_path):
     """Extrait le texte d'un PDF"""
-    reader = PdfReader(file_path)
-    text = ""
-    for page in reader.pages:
-        content = page.extract_text()
-        if content:
-            text += content + "\n"
-    return text
+    return "\n".join(iter_pdf_pages(file_path))
+
+
+def iter_text_blocks(file_path):
+    """Lit un fichier texte paragraphe par paragraphe (sans tout charger)"""
+    with open(file_path, encoding="utf-8") as f:
+        lines = []
+        for line in f:
+            lines.append(line)
+            if not line.strip():
+                yield "".join(lines)
+                lines = []
+        if lines:
+            yield "".join(lines)
+
+
+def iter_paragraphs(pieces, max_chars=800):
+    """
+    Reconstitue les paragraphes à partir d'un flux de morceaux de texte
+    (pages de PDF, blocs de fichier). Un paragraphe peut s'étendre sur
+    plusieurs morceaux ; ceux qui dépassent max_chars sont coupés au
+    dernier espace, pour que la mémoire reste bornée.
+    """
+    current = []  # morceaux du paragraphe en cours
+    size = 0
+
+    for piece in pieces:
+        for n, part in enumerate(PARAGRAPH_BREAK.split(piece.replace("\r", ""))):
+            # Chaque nouvelle partie après la première suit une ligne vide
+            if n and current:
+                yield " ".join(current)
+                current, size = [], 0
+
+            part = " ".join(part.split())
+            if not part:
+                continue
+            current.append(part)
+            size += len(part) + 1
+
+            if size > max_chars:
+                text = " ".join(current)
+                start = 0
+                while len(text) - start > max_chars:
+                    cut = text.rfind(" ", start, start + max_chars + 1)
+                    if cut <= start:
+                        cut = start + max_chars
+                    yield text[start:cut].strip()
+                    start = cut
+                    while start < len(text) and text[start] == " ":
+                        start += 1
+                rest = text[start:]
+                current, size = ([rest], len(rest) + 1) if rest else ([], 0)
+
+    if current:
+        yield " ".join(current)
+
+
+def iter_chunks(paragraphs, chunk_size=800, chunk_overlap=100):
+    """
+    Regroupe les paragraphes en chunks d'environ chunk_size caractères.
+    Chaque chunk reprend la fin du précédent (chunk_overlap caractères,
+    coupés sur un mot) pour garder le contexte.
+    """
+    current = []
+    size = 0
+    has_content = False  # le chunk en cours contient-il autre chose que l'overlap ?
+
+    for para in paragraphs:
+        if has_content and size + len(para) > chunk_size:
+            chunk = " ".join(current)
+            yield chunk
+
+            tail = chunk[-chunk_overlap:] if chunk_overlap else ""
+            if len(chunk) > chunk_overlap and " " in tail:
+                tail = tail[tail.index(" ") + 1:]
+            current, size = ([tail], len(tail) + 1) if tail else ([], 0)
+            has_content = False
+
+        current.append(para)
+        size += len(para) + 1
+        has_content = True
+
+    if has_content:
+        yield " ".join(current)
 
 
 def chunk_text(text, chunk_size=800, chunk_overlap=100):
@@ -39,76 +152,357 @@ def chunk_text(text, chunk_size=800, chunk_overlap=100):
     Version améliorée qui tente de respecter la ponctuation.
     chunk_size ici est en caractères (plus précis pour les modèles d'embedding).
     """
-    # 1. On nettoie un peu les sauts de ligne excessifs
-    text = text.replace("\r", "").replace("\n\n", " [SPLIT] ").replace("\n", " ")
-    
-    # 2. On sépare par notre marqueur de paragraphe
-    paragraphs = text.split(" [SPLIT] ")
-    
-    chunks = []
-    current_chunk = ""
-    
-    for para in paragraphs:
-        # Si le paragraphe seul est plus petit que la limite, on l'ajoute
-        if len(current_chunk) + len(para) <= chunk_size:
-            current_chunk += para + " "
-        else:
-            # Sinon, on stocke le chunk actuel et on recommence
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            
-            # Gestion de l'overlap : on garde la fin du précédent pour le début du suivant
-            current_chunk = para[-chunk_overlap:] if len(para) > chunk_overlap else ""
-            current_chunk += para + " "
-            
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-        
-    return chunks
-
-
-## Remplir la base ChromaDB avec les documents la première fois
+    return list(iter_chunks(iter_paragraphs([text], chunk_size), chunk_size, chunk_overlap))
+
+
+def list_sources():
+    """Liste les fichiers à indexer (sources de base + dossier documents/)"""
+    sources = [Path(name) for name in SOURCE_FILES if os.path.exists(name)]
+    docs_dir = Path(DOCUMENTS_DIR)
+    if docs_dir.is_dir():
+        sources += sorted(
+            path for path in docs_dir.rglob("*")
+            if path.suffix.lower() in (".pdf", ".txt")
+        )
+    return sources
+
+
+def file_hash(path):
+    """Empreinte SHA-256 d'un fichier, lue par blocs"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(source, chunk):
+    """Identifiant stable d'un chunk : hash de sa source et de son contenu"""
+    return hashlib.sha1(f"{source}\0{chunk}".encode("utf-8")).hexdigest()
+
+
+def iter_source_chunks(path, chunk_size=800, chunk_overlap=100):
+    """
+    Découpe un fichier source (PDF ou TXT) en chunks, en flux.
+    Produit des tuples (texte, métadonnées) : dans les guides PDF, chaque
+    fiche de spot est découpée à part et ses chunks portent le spot, le
+    département, le niveau, les marées... (filtrables dans Chroma).
+    """
+    if path.suffix.lower() != ".pdf":
+        pieces = iter_text_blocks(path)
+        for chunk in iter_chunks(iter_paragraphs(pieces, chunk_size), chunk_size, chunk_overlap):
+            yield chunk, {"kind": "document"}
+        return
+
+    for text, metadata in iter_pdf_sections(enumerate(iter_pdf_pages(path), 1)):
+        # Le nom du spot en tête de chaque chunk : un chunk coupé en plein
+        # milieu de fiche reste rattaché à son spot
+        prefix = f"{metadata['spot']} ({metadata['departement']}) : " if metadata["kind"] == "spot" else ""
+        for chunk in iter_chunks(iter_paragraphs([text], chunk_size), chunk_size, chunk_overlap):
+            yield prefix + chunk, metadata
+
+
+def load_manifest():
+    """Charge le manifeste {source: {hash, size, mtime, chunks, version}}"""
+    try:
+        return json.loads(Path(MANIFEST_PATH).read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(manifest):
+    """Écrit le manifeste de façon atomique (pas de fichier à moitié écrit)"""
+    with atomic_write(MANIFEST_PATH, "w") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+
+def delete_chunks(ids):
+    """Supprime des chunks de Chroma par lots"""
+    ids = list(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        get_collection().delete(ids=ids[start:start + BATCH_SIZE])
+
+
+def upsert_batch(source, batch):
+    """Calcule les embeddings d'un lot de (id, chunk, métadonnées) et l'écrit dans Chroma"""
+    texts = [chunk for _, chunk, _ in batch]
+    with timed("embed_documents"):
+        embeddings = get_embedding_model().encode(
+            texts,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+    with timed("chroma_upsert"):
+        get_collection().upsert(
+            documents=texts,
+            embeddings=embeddings.tolist(),
+            metadatas=[dict(metadata, source=source) for _, _, metadata in batch],
+            ids=[i for i, _, _ in batch]
+        )
+
+
+def index_chunks(source, chunks, known_ids):
+    """
+    Calcule les embeddings des seuls chunks absents de `known_ids`,
+    par lots de BATCH_SIZE au fil du flux. Renvoie la liste des ids du fichier.
+    """
+    ids = []
+    seen = set()
+    batch = []
+
+    for chunk, metadata in chunks:
+        i = chunk_id(source, chunk)
+        # Chunks identiques dans un même fichier : un seul exemplaire
+        if i in seen:
+            continue
+        seen.add(i)
+        ids.append(i)
+
+        if i not in known_ids:
+            batch.append((i, chunk, metadata))
+            if len(batch) == BATCH_SIZE:
+                upsert_batch(source, batch)
+                batch = []
+
+    if batch:
+        upsert_batch(source, batch)
+
+    return ids
+
+
+## Synchroniser la base ChromaDB avec les documents
+@instrument("initialize_rag")
 def initialize_rag():
-    """Initialise la base RAG avec le texte fourni"""
-    # Vérifie si déjà initialisé
-    if collection.count() > 0:
-        # print(f"Base déjà initialisée avec {collection.count()} chunks")
+    """
+    Synchronise la base RAG avec les fichiers sources de façon incrémentale.
+    Seuls les fichiers nouveaux ou modifiés sont re-découpés, et seuls
+    leurs chunks nouveaux sont ré-embeddés. Les chunks périmés sont supprimés.
+    """
+    manifest = load_manifest()
+    # Sans manifeste (première version de la base ou manifeste perdu),
+    # tout ce qui n'est pas ré-indexé ici est orphelin (ex: anciens chunk_{i})
+    sweep_orphans = not manifest
+    changed = False
+
+    sources = list_sources()
+    for path in sources:
+        source = path.as_posix()
+        stat = path.stat()
+        entry = manifest.get(source)
+        # Indexé avec un ancien découpage ou un autre backend d'embedding :
+        # tout est à refaire pour ce fichier
+        outdated = entry is not None and (
+            entry.get("version") != INDEX_VERSION
+            or entry.get("embedding", "torch") != EMBEDDING_BACKEND
+        )
+
+        # Raccourci : taille et date inchangées => pas besoin de relire le fichier
+        if entry and not outdated and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            continue
+
+        digest = file_hash(path)
+        if entry and not outdated and entry["hash"] == digest:
+            entry.update(size=stat.st_size, mtime=stat.st_mtime)
+            save_manifest(manifest)
+            continue
+
+        changed = True
+        old_ids = set(entry["chunks"]) if entry else set()
+        ids = index_chunks(source, iter_source_chunks(path), set() if outdated else old_ids)
+        delete_chunks(old_ids.difference(ids))
+
+        manifest[source] = {
+            "hash": digest,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "chunks": ids,
+            "version": INDEX_VERSION,
+            "embedding": EMBEDDING_BACKEND,
+        }
+        # Sauvegarde après chaque fichier : une interruption ne perd rien
+        save_manifest(manifest)
+
+    # Fichiers supprimés du corpus
+    current = {path.as_posix() for path in sources}
+    for source in [s for s in manifest if s not in current]:
+        delete_chunks(manifest.pop(source)["chunks"])
+        save_manifest(manifest)
+        changed = True
+
+    if sweep_orphans:
+        known = {i for entry in manifest.values() for i in entry["chunks"]}
+        existing = get_collection().get(include=[])["ids"]
+        delete_chunks(i for i in existing if i not in known)
+        save_manifest(manifest)
+        changed = True
+
+    # Index BM25 reconstruit sur l'ensemble des chunks dès que la base a bougé
+    if changed or get_bm25_index() is None:
+        chunks = get_collection().get(include=["documents"])
+        rebuild_bm25_index(chunks["ids"], chunks["documents"])
+
+
+def normalize_query(query):
+    """Forme normalisée d'une question (clé des caches)"""
+    return " ".join(query.lower().split())
+
+
+def embed_queries(queries):
+    """
+    Embeddings normalisés de plusieurs questions (matrice numpy, une ligne
+    par question). Les questions déjà vues sont servies par le cache LRU,
+    les autres sont encodées ensemble en une seule passe du modèle.
+    """
+    keys = [normalize_query(query) for query in queries]
+    with _query_cache_lock:
+        found = {key: _query_cache[key] for key in keys if key in _query_cache}
+
+    # Une seule fois chaque question manquante (texte d'origine, espaces nettoyés)
+    missing = {}
+    for key, query in zip(keys, queries):
+        if key not in found and key not in missing:
+            missing[key] = " ".join(query.split())
+
+    count("cache_hits", len(keys) - len(missing), cache="query_embedding")
+    count("cache_misses", len(missing), cache="query_embedding")
+    if missing:
+        with timed("embed_query"):
+            vectors = get_query_encoder().encode(list(missing.values()))
+        with _query_cache_lock:
+            for key, vector in zip(missing, vectors):
+                _query_cache[key] = vector
+                found[key] = vector
+
+    return np.stack([found[key] for key in keys])
+
+
+def embed_query(query):
+    """Embedding normalisé d'une question (partagé par le RAG et le cache de réponses)"""
+    return embed_queries([query])[0]
+
+
+@lazy_resource
+def ensure_index():
+    """
+    Prépare l'index une fois par processus, avant la première recherche :
+    snapshot s'il y en a un (voir snapshot.py), sinon synchronisation de la base.
+    """
+    if SNAPSHOT_PATH is None:
+        initialize_rag()
         return
-    
-    # print("Initialisation de la base RAG...")
-    
-    all_texts = []
-    
-    # 1. Chargement du fichier .txt (Equipements)
-    if os.path.exists("equipements_surf.txt"):
-        all_texts.append(Path("equipements_surf.txt").read_text(encoding="utf-8"))
-        # print("TXT chargé")
-        
-    # 2. Chargement du PDF (Spots Bretagne - Anglais)
-    if os.path.exists("Brittany-Surf-Guide.pdf"):
-        all_texts.append(load_pdf("Brittany-Surf-Guide.pdf"))
-        # print("PDF chargé")
-    
-    # Fusion et Chunking
-    full_content = "\n\n".join(all_texts)
-    chunks = chunk_text(full_content)
-      
-    # Embeddings
-    embeddings = embedding_model.encode(
-        chunks,
-        # show_progress_bar=True,
-        convert_to_numpy=True,
-        normalize_embeddings=True
-    )
-    
-    # Stockage
-    collection.add(
-        documents=chunks,
-        embeddings=embeddings.tolist(),
-        ids=[f"chunk_{i}" for i in range(len(chunks))]
-    )
-    
-    # print(f"{len(chunks)} chunks stockés dans ChromaDB")
+    snapshot = get_snapshot()
+    if SNAPSHOT_MODE == "chroma":
+        load_into_chroma(snapshot)
+    use_bm25_index(snapshot.bm25_index())
+
+
+def get_search_collection():
+    """Collection interrogée : le snapshot mappé en mémoire (mode "memmap") ou Chroma"""
+    if SNAPSHOT_PATH is not None and SNAPSHOT_MODE == "memmap":
+        return get_snapshot()
+    return get_collection()
+
+
+def search_chunks(queries, n_results=3, mode=None, rerank=None, filters=True):
+    """
+    Recherche les chunks les plus pertinents pour chaque question, avec un seul
+    appel à Chroma par filtre. En mode "hybrid", les résultats vectoriels sont
+    fusionnés (RRF) avec ceux de l'index BM25, qui retrouve les noms de spots
+    exacts. Le cross-encoder, s'il est configuré, reclasse les candidats.
+    Si `filters` est vrai, les critères reconnus dans une question
+    ("débutant", "Finistère", "beach break"...) restreignent la recherche
+    aux fiches de spots correspondantes. Renvoie une liste de listes de textes.
+    """
+    ensure_index()
+    mode = mode or RETRIEVAL_MODE
+    rerank = RERANKER_MODEL_NAME is not None if rerank is None else rerank
+    index = get_bm25_index() if mode == "hybrid" else None
+    n_candidates = max(n_results, RETRIEVAL_CANDIDATES) if (index is not None or rerank) else n_results
+    collection = get_search_collection()
+    embeddings = embed_queries(queries)
+
+    # Questions regroupées par filtre : un appel à Chroma par groupe
+    groups = {}
+    for n, query in enumerate(queries):
+        where = extract_filters(query) if filters else None
+        groups.setdefault(json.dumps(where, sort_keys=True), (where, []))[1].append(n)
+
+    rankings = [None] * len(queries)
+    texts = {}
+    for where, positions in groups.values():
+        allowed = None
+        with timed("chroma_query"):
+            if where is not None:
+                allowed = set(collection.get(where=where, include=[])["ids"])
+                # Aucun spot ne correspond : mieux vaut une recherche sans filtre que rien
+                if not allowed:
+                    where, allowed = None, None
+
+            results = collection.query(
+                query_embeddings=embeddings[positions].tolist(),
+                n_results=n_candidates if allowed is None else min(n_candidates, len(allowed)),
+                where=where,
+                include=["documents"]
+            )
+        for n, ids, documents in zip(positions, results["ids"], results["documents"]):
+            texts.update(zip(ids, documents))
+            if index is not None:
+                with timed("bm25"):
+                    lexical = [i for i, _ in index.search(queries[n], n_candidates, allowed=allowed)]
+                ids = reciprocal_rank_fusion([ids, lexical])
+            rankings[n] = ids
+
+    keep = n_candidates if rerank else n_results
+    missing = {i for ranking in rankings for i in ranking[:keep] if i not in texts}
+    if missing:
+        found = collection.get(ids=list(missing), include=["documents"])
+        texts.update(zip(found["ids"], found["documents"]))
+
+    documents = [[texts[i] for i in ranking[:keep] if i in texts] for ranking in rankings]
+    if rerank:
+        documents = rerank_documents(queries, documents, n_results)
+    return documents
+
+
+def rerank_documents(queries, documents_per_query, n_results):
+    """Reclasse les candidats de chaque question avec le cross-encoder (un seul lot)"""
+    pairs = [(query, document) for query, documents in zip(queries, documents_per_query) for document in documents]
+    if not pairs:
+        return documents_per_query
+    with timed("rerank"):
+        scores = iter(get_reranker().predict(pairs))
+
+    reranked = []
+    for documents in documents_per_query:
+        scored = sorted(((next(scores), document) for document in documents), key=lambda e: -e[0])
+        reranked.append([document for _, document in scored[:n_results]])
+    return reranked
+
+
+def merge_documents(documents_per_query):
+    """Fusionne les résultats de plusieurs questions : rang par rang, sans doublons"""
+    merged = []
+    for rank_documents in zip_longest(*documents_per_query):
+        for document in rank_documents:
+            if document is not None and document not in merged:
+                merged.append(document)
+    return merged
+
+
+@instrument("rag")
+def ask_rag_many(queries, n_results=3):
+    """
+    Interroge le RAG avec plusieurs questions (reformulations, sous-questions)
+    en une seule passe d'embedding et une seule requête Chroma.
+    """
+    documents = merge_documents(search_chunks(queries, n_results))
+    if not documents:
+        return "Aucune info trouvée."
+
+    # Chunks recollés, dédoublonnés et réduits aux phrases utiles (voir context.py),
+    # séparés par une petite balise pour aider l'IA à voir la séparation
+    context, _ = build_context(queries, documents)
+    return context
 
 
 # Fonction pour interroger le RAG
@@ -118,25 +512,7 @@ def ask_rag(query, n_results=3):
     Recherche les passages les plus pertinents dans la base de connaissances 
     (PDF spots Bretagne et TXT équipements).
     """
-    # 1. Embedding de la question
-    query_embedding = embedding_model.encode(
-        query,
-        convert_to_numpy=True,
-        normalize_embeddings=True
-    )
-    
-    # 2. Recherche dans ChromaDB
-    results = collection.query(
-        query_embeddings=[query_embedding.tolist()],
-        n_results=n_results
-    )
-    
-    # 3. On extrait les textes trouvés
-    documents = results.get("documents", [[]])[0]
-    
-    # 4. On les fusionne pour l'Agent
-    # On peut ajouter une petite balise pour aider l'IA à voir la séparation
-    return "\n--- DONNÉES EXTRAITES ---\n".join(documents) if documents else "Aucune info trouvée."
+    return ask_rag_many([query], n_results=n_results)
     
     
 #     # 4. Prompt
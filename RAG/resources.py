@@ -0,0 +1,123 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+# sentence_transformers (torch) et chromadb sont lourds à importer :
+# ils ne le sont qu'à la création des ressources qui en ont besoin
+from metrics import register_stats
+
+
+# Configuration des ressources partagées
+EMBEDDING_MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+# Exécution du modèle d'embedding : "torch" (SentenceTransformer), "onnx"
+# (ONNX Runtime, float32) ou "onnx-int8" (ONNX Runtime, poids quantifiés)
+EMBEDDING_BACKEND = os.getenv("SUNNY_EMBEDDING_BACKEND", "torch")
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+# Threads CPU du modèle d'embedding (0 = choix de la bibliothèque)
+EMBEDDING_THREADS = int(os.getenv("SUNNY_EMBEDDING_THREADS", "0"))
+# Dossier des modèles exportés en ONNX (créés au premier chargement)
+ONNX_DIR = os.getenv("SUNNY_ONNX_DIR", "./onnx_models")
+# Attente maximale (ms) pour regrouper les questions encodées en même temps
+QUERY_BATCH_WAIT_MS = float(os.getenv("SUNNY_QUERY_BATCH_WAIT_MS", "0"))
+CHROMA_PATH = os.getenv("SUNNY_CHROMA_PATH", "./chroma_db")
+COLLECTION_NAME = "surf_rag"
+# Cross-encoder optionnel pour reclasser les résultats du RAG
+# (ex: cross-encoder/mmarco-mMiniLMv2-L12-H384-v1) ; vide = pas de reranking
+RERANKER_MODEL_NAME = os.getenv("SUNNY_RERANKER") or None
+
+
+def lazy_resource(factory):
+    """
+    Transforme une fonction de construction en singleton paresseux :
+    l'objet est créé au premier appel, une seule fois par processus,
+    même si plusieurs threads le demandent en même temps.
+    """
+    lock = threading.Lock()
+    instance = []
+
+    @wraps(factory)
+    def getter():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    getter.is_loaded = lambda: bool(instance)
+    return getter
+
+
+@contextmanager
+def atomic_write(path, mode="wb"):
+    """
+    Écrit un fichier de façon atomique : `with atomic_write(path, "w") as f: ...`
+    écrit dans un fichier temporaire du même dossier, qui remplace `path`
+    seulement si le bloc se termine sans erreur (jamais de fichier à moitié écrit).
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with open(fd, mode, encoding=None if "b" in mode else "utf-8") as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_embedding_model(backend=EMBEDDING_BACKEND, threads=EMBEDDING_THREADS):
+    """Nouveau modèle d'embedding avec le backend demandé (voir EMBEDDING_BACKENDS)"""
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Backend d'embedding inconnu : {backend} (choix : {', '.join(EMBEDDING_BACKENDS)})")
+    if backend.startswith("onnx"):
+        from embeddings import load_onnx_model
+        return load_onnx_model(EMBEDDING_MODEL_NAME, ONNX_DIR, quantized=backend == "onnx-int8", threads=threads)
+
+    from sentence_transformers import SentenceTransformer
+
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+
+@lazy_resource
+def get_embedding_model():
+    """Modèle d'embedding partagé par le RAG et l'agent"""
+    return load_embedding_model()
+
+
+@lazy_resource
+def get_query_encoder():
+    """Encodage des questions, regroupé entre les conversations simultanées"""
+    from embeddings import QueryBatcher
+
+    batcher = QueryBatcher(get_embedding_model(), max_wait=QUERY_BATCH_WAIT_MS / 1000)
+    register_stats("query_batcher", batcher.batch_stats)
+    return batcher
+
+
+@lazy_resource
+def get_db_client():
+    """Client ChromaDB persistant partagé"""
+    import chromadb
+
+    return chromadb.PersistentClient(path=CHROMA_PATH)
+
+
+@lazy_resource
+def get_collection():
+    """Collection Chroma de la base de connaissances surf"""
+    return get_db_client().get_or_create_collection(name=COLLECTION_NAME)
+
+
+@lazy_resource
+def get_reranker():
+    """Cross-encoder de reranking (seulement si SUNNY_RERANKER est défini)"""
+    from sentence_transformers import CrossEncoder
+
+    return CrossEncoder(RERANKER_MODEL_NAME)
@@ -0,0 +1,194 @@
+"""
+Pré-routage local des questions, sans appel au LLM.
+
+La plupart des questions désignent clairement leurs outils : un spot et
+"maintenant" -> conditions actuelles, "demain" -> prévisions, "combi" ou
+"planche" -> base de connaissances, plusieurs spots -> comparaison. Dans
+ce cas, les outils sont lancés d'office (en parallèle) et leurs résultats
+ajoutés à la conversation : le LLM répond en un seul appel au lieu de
+deux (choix des outils, puis réponse).
+
+Signaux : mots-clés, spots connus (gazetteer.py), lieux reconnus par
+spaCy (fr_core_news_sm, si installé) et similarité d'embedding avec des
+questions types. Si rien n'est assez sûr, route() renvoie [] et l'agent
+choisit lui-même ses outils, comme avant.
+"""
+import os
+import re
+import uuid
+from datetime import datetime
+
+import metrics
+from forecast import TIMEZONE
+from gazetteer import get_gazetteer
+from resources import lazy_resource
+from spots import normalize
+
+
+# Pré-routage actif (SUNNY_ROUTER=0 pour le couper)
+ROUTER_ENABLED = os.getenv("SUNNY_ROUTER", "1") != "0"
+# Similarité minimale avec une question type, et écart minimal avec le 2e outil
+MIN_SIMILARITY = 0.55
+MIN_MARGIN = 0.05
+
+# Mots-clés, sur le texte normalisé (minuscules, sans accents)
+CONDITIONS_WORDS = re.compile(r"\b(maintenant|en ce moment|actuellement|actuelles?|en direct|tout de suite)\b")
+FORECAST_WORDS = re.compile(
+    r"\b(demain|apres-demain|ce soir|cet apres-midi|week-?end|samedi|dimanche|previsions?|"
+    r"meilleures? heures?|creneaux?)\b"
+)
+WEATHER_WORDS = re.compile(r"\b(conditions?|vagues?|houle|vent|meteo|temperature de l'eau)\b")
+KNOWLEDGE_WORDS = re.compile(
+    r"\b(combis?|combinaisons?|planches?|leash|chaussons|gants|cagoule|equipements?|materiel|"
+    r"shortboard|longboard|fish|bodyboard|niveau|debut\w*|confirmes?|beach ?breaks?|reefs?|"
+    r"point ?breaks?|maree)\b"
+)
+SPOT_WORDS = re.compile(r"\bspots?\b")
+# Choix entre plusieurs spots : un seul appel à compare_surf_spots
+COMPARE_WORDS = re.compile(r"\b(ou surfer|ou aller|quel spot|lequel|laquelle|entre|comparer?|meilleur spot|le mieux)\b")
+# Renvois à l'historique ("là-bas", "ce spot") : le LLM doit d'abord les résoudre
+VAGUE_WORDS = re.compile(r"\b(la-bas|celui-la|celle-la|ce spot|cet endroit|meme endroit|meme spot)\b")
+# Lieu écrit avec une majuscule après "à", "au"... (si spaCy n'est pas disponible)
+LOCATION = re.compile(r"\b(?:à|au|aux|a|vers) ((?:la |le |les )?[A-ZÉÎ][\w'’-]+(?: [A-ZÉÎ][\w'’-]+)*)")
+
+# Questions types de chaque outil (similarité d'embedding)
+PROTOTYPES = {
+    "get_surf_conditions": [
+        "Quelles sont les conditions en ce moment ?",
+        "Ça donne quoi au spot là maintenant ?",
+        "Quelle est la hauteur des vagues actuellement ?",
+        "La température de l'eau aujourd'hui ?",
+    ],
+    "get_surf_forecast": [
+        "Quelles sont les prévisions pour demain ?",
+        "Ça va marcher ce week-end ?",
+        "Quelle est la meilleure heure pour surfer aujourd'hui ?",
+        "Ce soir ça sera comment ?",
+    ],
+    "search_surf_knowledge": [
+        "Quelle combinaison pour une eau froide ?",
+        "Quelle planche pour débuter ?",
+        "Quels spots pour les débutants ?",
+        "La Palue c'est pour quel niveau ?",
+        "Quel équipement acheter pour l'hiver ?",
+    ],
+}
+WEATHER_TOOLS = ("get_surf_conditions", "get_surf_forecast")
+
+
+@lazy_resource
+def get_nlp():
+    """Modèle spaCy français (entités nommées seulement), ou None s'il n'est pas installé"""
+    try:
+        import spacy
+        return spacy.load("fr_core_news_sm", exclude=["morphologizer", "parser", "attribute_ruler", "lemmatizer"])
+    except (ImportError, OSError):
+        return None
+
+
+@lazy_resource
+def _prototype_vectors():
+    """Embeddings des questions types : (noms d'outils, matrice)"""
+    from rag import embed_queries
+
+    names = [name for name, questions in PROTOTYPES.items() for _ in questions]
+    return names, embed_queries([q for questions in PROTOTYPES.values() for q in questions])
+
+
+def find_location(question):
+    """Lieu mentionné dans la question : spot connu (nom officiel), sinon lieu reconnu, sinon None"""
+    spot = get_gazetteer().find_in_text(question)
+    if spot is not None:
+        return spot["name"]
+
+    nlp = get_nlp()
+    if nlp is not None:
+        for entity in nlp(question).ents:
+            if entity.label_ in ("LOC", "GPE"):
+                return entity.text
+    match = LOCATION.search(question)
+    return match.group(1) if match else None
+
+
+def day_offset(text, today=None):
+    """Jour visé par une question normalisée (0 = aujourd'hui)"""
+    if "apres-demain" in text:
+        return 2
+    if "demain" in text:
+        return 1
+    weekday = (today or datetime.now(TIMEZONE)).weekday()
+    if "dimanche" in text:
+        return (6 - weekday) % 7
+    if "samedi" in text:
+        return (5 - weekday) % 7
+    if re.search(r"\bweek-?end\b", text):
+        # Le dimanche, le week-end c'est aujourd'hui
+        return 0 if weekday == 6 else (5 - weekday) % 7
+    return 0
+
+
+def similar_tool(question):
+    """Outil dont les questions types ressemblent le plus, ou None si pas assez net"""
+    from rag import embed_query
+
+    names, vectors = _prototype_vectors()
+    similarities = vectors @ embed_query(question)
+    best = {}
+    for name, similarity in zip(names, similarities):
+        best[name] = max(best.get(name, -1.0), float(similarity))
+    ranked = sorted(best.items(), key=lambda item: -item[1])
+    (name, score), (_, second) = ranked[0], ranked[1]
+    if score >= MIN_SIMILARITY and score - second >= MIN_MARGIN:
+        return name
+    return None
+
+
+def choose_tools(question):
+    """Noms des outils à lancer d'office, lieu visé et spots à comparer (liste vide si pas routable)"""
+    text = normalize(question)
+    if VAGUE_WORDS.search(text):
+        return [], None, []
+    spots = get_gazetteer().find_all_in_text(question)
+    if len(spots) >= 2 and (COMPARE_WORDS.search(text) or FORECAST_WORDS.search(text)
+                            or CONDITIONS_WORDS.search(text) or WEATHER_WORDS.search(text)):
+        return ["compare_surf_spots"], None, [spot["name"] for spot in spots]
+    location = find_location(question)
+
+    tools = []
+    if location and FORECAST_WORDS.search(text):
+        tools.append("get_surf_forecast")
+    elif location and (CONDITIONS_WORDS.search(text) or WEATHER_WORDS.search(text)):
+        tools.append("get_surf_conditions")
+    if KNOWLEDGE_WORDS.search(text) or (not tools and SPOT_WORDS.search(text)):
+        tools.append("search_surf_knowledge")
+
+    if not tools:
+        name = similar_tool(question)
+        # Les outils météo ont besoin d'un lieu
+        if name is not None and (location or name not in WEATHER_TOOLS):
+            tools.append(name)
+    return tools, location, []
+
+
+def route(question):
+    """
+    Appels d'outils à faire d'office pour `question` (format tool_call de
+    LangChain : name, args, id, type), ou [] si le LLM doit choisir lui-même.
+    """
+    with metrics.timed("router"):
+        tools, location, spots = choose_tools(question)
+
+    calls = []
+    for name in tools:
+        if name == "compare_surf_spots":
+            args = {"spots": spots, "day_offset": day_offset(normalize(question))}
+        elif name == "search_surf_knowledge":
+            args = {"queries": [" ".join(question.split())]}
+        elif name == "get_surf_forecast":
+            args = {"location": location, "day_offset": day_offset(normalize(question))}
+        else:
+            args = {"location": location}
+        calls.append({"name": name, "args": args, "id": f"route_{uuid.uuid4().hex[:12]}", "type": "tool_call"})
+
+    metrics.count("router_turns", outcome="routed" if calls else "fallback")
+    return calls
@@ -0,0 +1,172 @@
+"""
+Mode serveur de Sunny (sans interface) : API HTTP asynchrone.
+
+    POST /chat    {"message": "...", "thread_id": "..."}  -> flux Server-Sent Events
+                  événements : queued, token, tool_start, tool_end, trace, done, error
+    GET  /health  200 quand le serveur est prêt, 503 pendant le chargement
+    GET  /metrics métriques au format Prometheus (durées des étapes, jetons, caches)
+
+Le modèle d'embedding, la base Chroma et l'agent sont chargés une fois au
+démarrage (/health reste à 503 d'ici là) puis partagés par toutes les requêtes.
+Plusieurs instances peuvent tourner derrière un proxy : la mémoire des
+conversations (SUNNY_MEMORY_DB) est une base SQLite locale, à ne pas mettre
+sur un disque partagé ou réseau (verrous et WAL n'y sont pas fiables). Le
+proxy doit alors router un même thread_id toujours vers la même instance
+(routage collant), ou la mémoire passer sur un checkpointer adossé à un
+serveur (ex: PostgreSQL).
+
+Usage : python server.py [--host 0.0.0.0] [--port 8000]
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import uuid
+
+from aiohttp import web
+
+import metrics
+
+
+# Délai conseillé au client quand la file d'attente de l'agent est pleine (secondes)
+RETRY_AFTER = 5
+
+
+async def start_warm_up(app):
+    state = app["state"]
+
+    async def run():
+        try:
+            # Import (langchain, agent) et chargement bloquants : hors de la boucle
+            agent_executor = await asyncio.to_thread(importlib.import_module, "agent_executor")
+            await asyncio.to_thread(agent_executor.warm_up)
+            state["status"] = "ready"
+        except Exception as e:
+            state["status"] = f"error: {e}"
+
+    state["warm_up"] = asyncio.create_task(run())
+
+
+async def close_resources(app):
+    """Ferme les clients HTTP (boucle de l'agent, boucle des appels synchrones)"""
+    import weather
+    from agent_executor import get_executor
+
+    if get_executor.is_loaded():
+        await asyncio.to_thread(get_executor().close)
+    await asyncio.to_thread(weather.close)
+
+
+def sse(event, data):
+    """Un événement Server-Sent Events encodé"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def event_payload(event):
+    """Événement de l'agent -> (nom, données JSON)"""
+    kind = event[0]
+    if kind == "token":
+        return kind, {"text": event[1]}
+    if kind == "queued":
+        return kind, {"position": event[1]}
+    if kind == "trace":
+        return kind, event[1]
+    if kind == "tool_start":
+        return kind, {"name": event[1], "args": event[2]}
+    return kind, {"name": event[1], "content": event[2]}
+
+
+async def health(request):
+    status = request.app["state"]["status"]
+    return web.json_response({"status": status}, status=200 if status == "ready" else 503)
+
+
+async def metrics_endpoint(request):
+    return web.Response(text=metrics.render_prometheus(), content_type="text/plain")
+
+
+async def chat(request):
+    if request.app["state"]["status"] != "ready":
+        return web.json_response({"error": "Sunny se réveille, réessaie dans un instant."}, status=503)
+
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        return web.json_response({"error": "Corps JSON invalide."}, status=400)
+    message = body.get("message") if isinstance(body, dict) else None
+    if not isinstance(message, str) or not message.strip():
+        return web.json_response({"error": "Champ 'message' manquant."}, status=400)
+
+    from agent_executor import TurnQueueFull, get_executor
+    from sunny_agent import Context
+
+    thread_id = str(body.get("thread_id") or uuid.uuid4().hex)
+    config = {"configurable": {"thread_id": thread_id}}
+    context = Context(user_id=str(body.get("user_id") or thread_id))
+    events = get_executor().astream(message, config, context)
+
+    # Premier événement attendu avant d'envoyer les en-têtes : une file pleine
+    # donne une vraie réponse 429 plutôt qu'un flux d'erreur
+    try:
+        first = await anext(events, None)
+    except TurnQueueFull:
+        return web.json_response(
+            {"error": "Trop de demandes en cours."}, status=429,
+            headers={"Retry-After": str(RETRY_AFTER)},
+        )
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        # Pas de mise en tampon par un proxy nginx
+        "X-Accel-Buffering": "no",
+        "X-Thread-Id": thread_id,
+    })
+    await response.prepare(request)
+
+    parts = []
+    try:
+        event = first
+        while event is not None:
+            if event[0] == "token":
+                parts.append(event[1])
+            elif event[0] == "tool_start":
+                parts.clear()
+            await response.write(sse(*event_payload(event)))
+            event = await anext(events, None)
+        await response.write(sse("done", {"thread_id": thread_id, "answer": "".join(parts)}))
+    except (ConnectionResetError, asyncio.CancelledError):
+        # Client parti : le tour de l'agent est annulé en fermant le flux
+        await events.aclose()
+        raise
+    except Exception as e:
+        await response.write(sse("error", {"error": str(e)}))
+    await response.write_eof()
+    return response
+
+
+def build_app():
+    app = web.Application()
+    app["state"] = {"status": "starting"}
+    app.on_startup.append(start_warm_up)
+    app.on_cleanup.append(close_resources)
+    app.add_routes([
+        web.post("/chat", chat),
+        web.get("/health", health),
+        web.get("/metrics", metrics_endpoint),
+    ])
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur HTTP de Sunny")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    web.run_app(build_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Snapshot de l'index RAG : un seul fichier versionné, construit une fois,
+copié sur chaque nœud (image Docker, volume partagé...).
+
+Un nœud neuf n'a alors ni base Chroma à construire ni corpus à embedder :
+- SUNNY_SNAPSHOT_MODE=memmap (défaut) : le fichier est mappé en mémoire
+  en lecture seule et les recherches se font par produit scalaire NumPy
+  (les répliques d'une même machine partagent les pages via le cache
+  de l'OS). Le nœud n'ouvre aucune base Chroma : le cache de réponses
+  (answer_cache.py) est alors gardé en mémoire du processus ;
+- SUNNY_SNAPSHOT_MODE=chroma : le contenu est chargé en bloc dans Chroma
+  au premier démarrage (sans recalcul des embeddings).
+
+Format (petit-boutiste) :
+    MAGIC (8 octets) | taille de l'en-tête (uint64) | en-tête JSON
+    | embeddings float16 (count x dim) | fins des textes (uint64 x count)
+    | textes UTF-8 concaténés
+L'en-tête contient la version du format, le modèle d'embedding, les ids,
+les métadonnées, le manifeste du corpus, l'index BM25 et la position de
+chaque section (alignée sur SECTION_ALIGN octets).
+
+Usage : python snapshot.py build [--output sunny_index.snapshot]
+        python snapshot.py info sunny_index.snapshot
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from lexical import BM25Index
+from resources import CHROMA_PATH, EMBEDDING_BACKEND, EMBEDDING_MODEL_NAME, atomic_write, lazy_resource
+
+
+# Snapshot à charger au démarrage (vide : base Chroma construite par initialize_rag, comme avant)
+SNAPSHOT_PATH = os.getenv("SUNNY_SNAPSHOT") or None
+# "memmap" : recherche NumPy sur le fichier mappé ; "chroma" : chargé en bloc dans Chroma
+SNAPSHOT_MODE = os.getenv("SUNNY_SNAPSHOT_MODE", "memmap")
+SNAPSHOT_MODES = ("memmap", "chroma")
+DEFAULT_OUTPUT = "sunny_index.snapshot"
+MAGIC = b"SUNNYIDX"
+# Version du format de fichier (la changer si la disposition des sections change)
+FORMAT_VERSION = 1
+SECTION_ALIGN = 64
+# Lignes de la matrice converties en float32 à la fois pendant une recherche
+SEARCH_BLOCK = 8192
+# Snapshot déjà chargé dans la base Chroma locale (mode "chroma")
+LOADED_MARKER_PATH = os.path.join(CHROMA_PATH, "snapshot.json")
+
+
+def _align(offset):
+    return -(-offset // SECTION_ALIGN) * SECTION_ALIGN
+
+
+def _matches(metadata, where):
+    """Filtre `where` de Chroma ($and, $or, égalités) appliqué à des métadonnées"""
+    if where is None:
+        return True
+    conditions = []
+    for key, value in where.items():
+        if key == "$and":
+            conditions.append(all(_matches(metadata, w) for w in value))
+        elif key == "$or":
+            conditions.append(any(_matches(metadata, w) for w in value))
+        elif isinstance(value, dict):
+            operator, expected = next(iter(value.items()))
+            if operator not in ("$eq", "$ne"):
+                raise ValueError(f"Opérateur non géré par le snapshot : {operator}")
+            conditions.append((metadata.get(key) == expected) == (operator == "$eq"))
+        else:
+            conditions.append(metadata.get(key) == value)
+    return all(conditions)
+
+
+def write_snapshot(path, ids, texts, metadatas, embeddings, manifest=None):
+    """Écrit un snapshot de façon atomique (embeddings normalisés, une ligne par chunk)"""
+    embeddings = np.asarray(embeddings, dtype=np.float16).reshape(len(ids), -1)
+    encoded = [text.encode("utf-8") for text in texts]
+    ends = np.cumsum([len(text) for text in encoded], dtype=np.uint64)
+
+    header = {
+        "format": FORMAT_VERSION,
+        "id": hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()[:16],
+        "created_at": time.time(),
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "embedding_backend": EMBEDDING_BACKEND,
+        "count": len(ids),
+        "dim": int(embeddings.shape[1]),
+        "ids": list(ids),
+        "metadatas": [dict(metadata or {}) for metadata in metadatas],
+        "manifest": manifest or {},
+        "bm25": BM25Index.build(ids, texts).to_dict(),
+    }
+    # Les positions des sections dépendent de la taille de l'en-tête, qui les contient :
+    # on recalcule jusqu'à ce qu'elles ne bougent plus (deux passes en pratique)
+    sections = {}
+    while True:
+        header["sections"] = sections
+        start = len(MAGIC) + 8 + len(json.dumps(header).encode("utf-8"))
+        embeddings_offset = _align(start)
+        ends_offset = _align(embeddings_offset + embeddings.nbytes)
+        texts_offset = ends_offset + ends.nbytes
+        new_sections = {"embeddings": embeddings_offset, "ends": ends_offset, "texts": texts_offset}
+        if new_sections == sections:
+            break
+        sections = new_sections
+    raw_header = json.dumps(header).encode("utf-8")
+
+    with atomic_write(path) as f:
+        f.write(MAGIC + len(raw_header).to_bytes(8, "little") + raw_header)
+        f.write(b"\0" * (sections["embeddings"] - f.tell()))
+        f.write(embeddings.astype("<f2").tobytes())
+        f.write(b"\0" * (sections["ends"] - f.tell()))
+        f.write(ends.astype("<u8").tobytes())
+        for text in encoded:
+            f.write(text)
+    return header
+
+
+def read_header(path):
+    """En-tête JSON d'un snapshot (sans mapper les sections)"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} n'est pas un snapshot Sunny")
+        size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(size))
+    if header["format"] != FORMAT_VERSION:
+        raise ValueError(f"Snapshot au format {header['format']}, ce code lit le format {FORMAT_VERSION}")
+    return header
+
+
+class Snapshot:
+    """
+    Snapshot mappé en mémoire, en lecture seule. Expose la partie de
+    l'API des collections Chroma utilisée par rag.search_chunks
+    (query et get, avec filtres `where`).
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.header = read_header(path)
+        if (self.header["embedding_model"], self.header["embedding_backend"]) != (EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND):
+            raise ValueError(
+                f"Snapshot construit avec {self.header['embedding_model']} ({self.header['embedding_backend']}), "
+                f"incompatible avec {EMBEDDING_MODEL_NAME} ({EMBEDDING_BACKEND})"
+            )
+        self.ids = self.header["ids"]
+        self.metadatas = self.header["metadatas"]
+        self.positions = {chunk_id: n for n, chunk_id in enumerate(self.ids)}
+        count, dim, sections = self.header["count"], self.header["dim"], self.header["sections"]
+        self.embeddings = np.memmap(self.path, dtype="<f2", mode="r", offset=sections["embeddings"], shape=(count, dim))
+        self._ends = np.memmap(self.path, dtype="<u8", mode="r", offset=sections["ends"], shape=(count,))
+        size = int(self._ends[-1]) if count else 0
+        self._texts = np.memmap(self.path, dtype=np.uint8, mode="r", offset=sections["texts"], shape=(size,)) if size else b""
+
+    def count(self):
+        return len(self.ids)
+
+    def text(self, n):
+        start = int(self._ends[n - 1]) if n else 0
+        return bytes(self._texts[start:int(self._ends[n])]).decode("utf-8")
+
+    def bm25_index(self):
+        return BM25Index.from_dict(self.header["bm25"])
+
+    def _mask(self, where):
+        if where is None:
+            return None
+        return np.array([_matches(metadata, where) for metadata in self.metadatas], dtype=bool)
+
+    def _result(self, positions, include):
+        result = {"ids": [self.ids[n] for n in positions]}
+        if "documents" in include:
+            result["documents"] = [self.text(n) for n in positions]
+        if "metadatas" in include:
+            result["metadatas"] = [self.metadatas[n] for n in positions]
+        if "embeddings" in include:
+            result["embeddings"] = np.asarray(self.embeddings[positions], dtype=np.float32)
+        return result
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas")):
+        """Comme Collection.get : chunks par ids et / ou filtre"""
+        if ids is None:
+            positions = range(len(self.ids))
+        else:
+            positions = [self.positions[i] for i in ids if i in self.positions]
+        mask = self._mask(where)
+        if mask is not None:
+            positions = [n for n in positions if mask[n]]
+        return self._result(list(positions), include)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("documents", "metadatas")):
+        """Comme Collection.query : les n_results chunks les plus proches (cosinus) de chaque question"""
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        scores = np.empty((len(queries), len(self.ids)), dtype=np.float32)
+        # float16 -> float32 par blocs : pas de copie complète de la matrice
+        for start in range(0, len(self.ids), SEARCH_BLOCK):
+            block = np.asarray(self.embeddings[start:start + SEARCH_BLOCK], dtype=np.float32)
+            scores[:, start:start + SEARCH_BLOCK] = queries @ block.T
+        mask = self._mask(where)
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+
+        k = min(n_results, len(self.ids) if mask is None else int(mask.sum()))
+        results = {"ids": [], "distances": []}
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k] if k else np.array([], dtype=int)
+            top = top[np.argsort(-row[top])]
+            for key, values in self._result(top.tolist(), include).items():
+                results.setdefault(key, []).append(values)
+            results["distances"].append((1.0 - row[top]).tolist())
+        return results
+
+
+@lazy_resource
+def get_snapshot():
+    """Snapshot désigné par SUNNY_SNAPSHOT, mappé au premier usage"""
+    if SNAPSHOT_MODE not in SNAPSHOT_MODES:
+        raise ValueError(f"Mode de snapshot inconnu : {SNAPSHOT_MODE} (choix : {', '.join(SNAPSHOT_MODES)})")
+    return Snapshot(SNAPSHOT_PATH)
+
+
+def build_snapshot(output=DEFAULT_OUTPUT):
+    """Synchronise la base Chroma avec le corpus, puis l'exporte dans un snapshot"""
+    import rag
+    from resources import get_collection
+
+    rag.initialize_rag()
+    data = get_collection().get(include=["documents", "metadatas", "embeddings"])
+    order = np.argsort(data["ids"])
+    return write_snapshot(
+        output,
+        [data["ids"][n] for n in order],
+        [data["documents"][n] for n in order],
+        [data["metadatas"][n] for n in order],
+        np.asarray(data["embeddings"])[order],
+        manifest=rag.load_manifest(),
+    )
+
+
+def load_into_chroma(snapshot):
+    """
+    Charge un snapshot en bloc dans la base Chroma locale (une seule fois
+    par snapshot) : chunks absents ajoutés, chunks en trop supprimés,
+    manifeste repris du snapshot pour les synchronisations suivantes.
+    """
+    import rag
+    from resources import get_collection
+
+    marker = Path(LOADED_MARKER_PATH)
+    if marker.exists() and json.loads(marker.read_text(encoding="utf-8")).get("id") == snapshot.header["id"]:
+        return False
+
+    collection = get_collection()
+    existing = set(collection.get(include=[])["ids"])
+    missing = [n for n, chunk_id in enumerate(snapshot.ids) if chunk_id not in existing]
+    for start in range(0, len(missing), rag.BATCH_SIZE):
+        positions = missing[start:start + rag.BATCH_SIZE]
+        batch = snapshot._result(positions, ("documents", "metadatas", "embeddings"))
+        collection.upsert(
+            ids=batch["ids"], documents=batch["documents"],
+            metadatas=batch["metadatas"], embeddings=batch["embeddings"].tolist(),
+        )
+    rag.delete_chunks(existing.difference(snapshot.ids))
+    rag.save_manifest(snapshot.header["manifest"])
+    snapshot.bm25_index().save()
+
+    marker.write_text(json.dumps({"id": snapshot.header["id"], "path": snapshot.path}), encoding="utf-8")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot de l'index RAG")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="exporte la base (synchronisée avec le corpus) dans un snapshot")
+    build.add_argument("--output", default=DEFAULT_OUTPUT)
+    info = commands.add_parser("info", help="affiche l'en-tête d'un snapshot")
+    info.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        header = build_snapshot(args.output)
+        print(f"{args.output} : {header['count']} chunks, dim {header['dim']}, "
+              f"{os.path.getsize(args.output) / 1e6:.1f} Mo, {time.perf_counter() - start:.1f} s")
+    else:
+        header = read_header(args.path)
+        created = time.strftime("%Y-%m-%d %H:%M", time.localtime(header["created_at"]))
+        print(f"snapshot {header['id']} (format {header['format']}), créé le {created}")
+        print(f"  {header['count']} chunks, dim {header['dim']}, "
+              f"{header['embedding_model']} ({header['embedding_backend']})")
+        for source, entry in header["manifest"].items():
+            print(f"  {source} : {len(entry['chunks'])} chunks, {entry['hash'][:12]}")
+
+
+if __name__ == "__main__":
+    main()
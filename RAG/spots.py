@@ -0,0 +1,206 @@
+import re
+import csv
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+
+
+# Fiches des spots du guide : coordonnées, département et autres noms.
+# Alias = titres de la fiche dans le guide et autres graphies du nom du spot,
+# jamais la commune ni un lieu voisin : le gazetteer y répond avec les
+# coordonnées du spot. Les coordonnées ne sont pas dans le guide (saisies à la main).
+SPOTS_CSV = Path(__file__).with_name("spots_bretagne.csv")
+
+# Lignes de mise en page du guide (pieds de page, bandeaux) à ignorer
+BOILERPLATE = re.compile(
+    r"^(\d+\s+boardshortz\.nl|THE SURF SPOTS|(IN|NEAR|ON) [A-Z ]+|Spot\s*:.*|All|PART \d/\d|"
+    r"Scan me|and go to the webpage|about Brittany)$"
+)
+WHEN_TO_GO = re.compile(r"W\s?hen to go\s*:", re.IGNORECASE)
+# Au-delà, un bloc sans nouveau titre de spot est envoyé tel quel (mémoire bornée)
+MAX_SECTION_CHARS = 20000
+
+DEPARTEMENTS = {
+    "Finistère": ("finistere", "29"),
+    "Côtes-d'Armor": ("cotes d'armor", "cotes-d'armor", "cotes darmor", "22"),
+    "Morbihan": ("morbihan", "56"),
+}
+DIRECTIONS = {"north": "N", "south": "S", "east": "E", "west": "W"}
+
+
+def normalize(text):
+    """Minuscules, sans accents ni ponctuation superflue ("Kerloc’h" -> "kerloc'h")"""
+    text = unicodedata.normalize("NFKD", text.replace("’", "'").lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w'\- ]", " ", text).split())
+
+
+@lru_cache(maxsize=1)
+def load_catalog():
+    """Spots connus : liste de dicts (name, aliases, departement, lat, lon)"""
+    with open(SPOTS_CSV, encoding="utf-8") as f:
+        spots = []
+        for row in csv.DictReader(f):
+            row["aliases"] = [row["name"]] + [a for a in row["aliases"].split("|") if a]
+            row["lat"] = float(row["lat"])
+            row["lon"] = float(row["lon"])
+            spots.append(row)
+    return spots
+
+
+@lru_cache(maxsize=1)
+def _headings():
+    return {normalize(alias): spot for spot in load_catalog() for alias in spot["aliases"]}
+
+
+def _directions(text, word):
+    """
+    Directions associées à un mot ("swell", "wind") dans le texte :
+    "western swell" -> W, "W-NW swell" -> W-NW, "south eastern winds" -> SE
+    """
+    found = []
+    pattern = (
+        r"\b((?i:(?:north|south)[ -]?(?:east|west)?(?:ern|erly)?|(?:east|west)(?:ern|erly)?)"
+        r"|[NSEW]{1,2}(?:-[NSEW]{1,2})?)\s+(?:\w+\s+)?(?i:" + word + r")\b"
+    )
+    for match in re.finditer(pattern, text):
+        raw = match.group(1)
+        if re.fullmatch(r"[NSEW]{1,2}(-[NSEW]{1,2})?", raw):
+            code = raw
+        else:
+            code = "".join(DIRECTIONS[d] for d in re.findall(r"north|south|east|west", raw.lower()))
+        if code not in found:
+            found.append(code)
+    return ",".join(found)
+
+
+def parse_spot(spot, text):
+    """Métadonnées d'une fiche de spot à partir de son texte"""
+    text = " ".join(text.split())
+    lower = text.lower()
+    when = lower[WHEN_TO_GO.search(text).end():]
+
+    if "beach break" in lower:
+        break_type = "beach"
+    elif "reef" in lower:
+        break_type = "reef"
+    elif "point break" in lower:
+        break_type = "point"
+    else:
+        break_type = "beach"
+
+    all_levels = "all surfers" in when or "all surf levels" in when
+    all_tides = "all tides" in when
+    swell_min = re.search(r"(\d+(?:\.\d+)?)\s?m\s?\+|from (\d+(?:\.\d+)?)\s?m\b", lower)
+
+    metadata = {
+        "kind": "spot",
+        "spot": spot["name"],
+        "departement": spot["departement"],
+        "lat": spot["lat"],
+        "lon": spot["lon"],
+        "break_type": break_type,
+        "level": "tous niveaux" if all_levels else "confirmé",
+        "beginner": all_levels or "beginner" in lower,
+        "tide_low": all_tides or ("low" in when and "not low" not in when),
+        "tide_mid": all_tides or "mid" in when,
+        "tide_high": all_tides or "high" in when,
+        "swell": _directions(text, "swells?"),
+        "wind": _directions(text, "winds?"),
+    }
+    if swell_min:
+        metadata["swell_min"] = float(swell_min.group(1) or swell_min.group(2))
+    return metadata
+
+
+def iter_pdf_sections(pages):
+    """
+    Découpe le texte d'un guide (pages numérotées à partir de 1) en sections :
+    une par fiche de spot reconnue (titre connu + paragraphe "When to go"),
+    avec ses métadonnées, et des sections "guide" pour le reste du texte.
+    Produit des tuples (texte, métadonnées).
+    """
+    headings = _headings()
+    spot, page, lines, size = None, 1, [], 0
+    # Texte hors fiche en attente : regroupé tant qu'il n'y a pas de vraie fiche
+    guide, guide_page = [], 1
+
+    def flush():
+        nonlocal guide, guide_page
+        text = "\n".join(lines).strip()
+        if not text:
+            return
+        if spot is not None and WHEN_TO_GO.search(text):
+            if guide:
+                yield "\n".join(guide), {"kind": "guide", "page": guide_page}
+                guide = []
+            yield text, dict(parse_spot(spot, text), page=page)
+            return
+        if not guide:
+            guide_page = page
+        guide.append(text)
+        if sum(len(t) for t in guide) > MAX_SECTION_CHARS:
+            yield "\n".join(guide), {"kind": "guide", "page": guide_page}
+            guide = []
+
+    for page_number, page_text in pages:
+        for line in page_text.splitlines():
+            line = line.strip()
+            if not line or BOILERPLATE.match(line):
+                continue
+
+            heading = headings.get(normalize(line))
+            if heading is not None or size > MAX_SECTION_CHARS:
+                yield from flush()
+                spot, page, lines, size = heading, page_number, [], 0
+            # Le titre est conservé dans le texte : il aide la recherche
+            lines.append(line)
+            size += len(line) + 1
+
+    yield from flush()
+    if guide:
+        yield "\n".join(guide), {"kind": "guide", "page": guide_page}
+
+
+DEPARTEMENT_PATTERNS = {
+    name: re.compile(r"\b(" + "|".join(re.escape(k) for k in keys) + r")\b")
+    for name, keys in DEPARTEMENTS.items()
+}
+
+
+def extract_filters(query):
+    """
+    Filtre Chroma (`where`) déduit d'une question en langage naturel,
+    ex: "beach break débutant Finistère". None si rien de filtrable.
+    """
+    text = normalize(query)
+    conditions = []
+
+    for name, pattern in DEPARTEMENT_PATTERNS.items():
+        if pattern.search(text):
+            conditions.append({"departement": name})
+            break
+
+    if re.search(r"\b(debutants?|beginners?|initiation|apprendre|premiere fois)\b", text):
+        conditions.append({"beginner": True})
+    elif re.search(r"\b(confirmes?|experts?|avances?|experimentes?)\b", text):
+        conditions.append({"level": "confirmé"})
+
+    if re.search(r"\bbeach ?breaks?\b", text):
+        conditions.append({"break_type": "beach"})
+    elif re.search(r"\breefs?\b|\breef ?breaks?\b|\brecifs?\b", text):
+        conditions.append({"break_type": "reef"})
+    elif re.search(r"\bpoint ?breaks?\b", text):
+        conditions.append({"break_type": "point"})
+
+    if re.search(r"\bmaree basse\b|\blow tide\b", text):
+        conditions.append({"tide_low": True})
+    elif re.search(r"\bmaree haute\b|\bhigh tide\b", text):
+        conditions.append({"tide_high": True})
+    elif re.search(r"\bmi-maree\b|\bmid tide\b", text):
+        conditions.append({"tide_mid": True})
+
+    if not conditions:
+        return None
+    conditions.insert(0, {"kind": "spot"})
+    return {"$and": conditions}
@@ -1,40 +1,69 @@
 import os
+import time
+import asyncio
+import inspect
+import threading
+from datetime import datetime
 from dotenv import load_dotenv
-import chromadb
-from sentence_transformers import SentenceTransformer
-import requests
+import numpy as np
 import random
 from dataclasses import dataclass
 
-# Imports LangChain
-from langchain_groq import ChatGroq
-from langchain.tools import tool
-from langgraph.checkpoint.memory import InMemorySaver
-from langchain.agents import create_agent 
+# Imports LangChain. L'agent (langchain.agents, langchain_groq, qui chargent
+# transformers) n'est importé qu'à sa construction, au premier usage
+from langchain_core.tools import StructuredTool, tool
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
 
-# Import du RAG
-from rag import ask_rag
-from rag import initialize_rag
+# Mémoire des conversations sur disque, bornée
+from checkpointer import SQLiteCheckpointer
 
+# Durées des étapes de chaque tour (LLM, outils, RAG, API...)
+import metrics
 
-# CONFIGURATION & CHARGEMENT
-load_dotenv()
+# Import du RAG (la base est synchronisée à la première recherche)
+from rag import ask_rag_many
+
+# Cache sémantique des réponses
+import answer_cache
+
+# Pré-routage local : outils lancés d'office quand la question est claire
+import router
 
-# Modèle d'embedding
-embedding_model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
+# Accès aux API météo (avec cache)
+from weather import ageocode, run_sync
+from forecast import MS_TO_KMH, TIMEZONE, ForecastTable, aget_table, compare_tables
 
-# Connexion à la base de données Chroma existante
-db_client = chromadb.PersistentClient(path="./chroma_db")
-collection = db_client.get_collection(name="surf_rag")
+# Spots connus (coordonnées, régions, spots voisins)
+from gazetteer import anearest_spots
+from spots import DEPARTEMENT_PATTERNS, load_catalog, normalize
 
 
+# CONFIGURATION & CHARGEMENT
+load_dotenv()
+# Le modèle d'embedding et la base Chroma sont partagés avec le RAG (resources.py)
+
+# Modèle de l'agent et petit modèle (rapide, peu cher) pour résumer l'historique
+AGENT_MODEL = "Llama-3.3-70b-versatile"
+SUMMARY_MODEL = os.getenv("SUNNY_SUMMARY_MODEL", "llama-3.1-8b-instant")
+# Comparaison de spots : nombre maximum de spots, téléchargements simultanés
+# et rayon (km) autour d'un lieu donné comme région
+COMPARE_MAX_SPOTS = 8
+COMPARE_CONCURRENCY = 4
+COMPARE_RADIUS_KM = 30
+# Au-delà de ce nombre de jetons d'historique, les anciens échanges sont résumés
+HISTORY_TOKEN_BUDGET = 3000
+# Derniers messages toujours gardés tels quels
+HISTORY_KEEP_MESSAGES = 10
+
 
 SYSTEM_PROMPT = """Tu es Sunny, un assistant spécialisé dans le surf et la météo marine, blasé mais efficace. 
 Ton job est de fournir des réponses précises en utilisant tes outils.
 
 ### INSTRUCTIONS CRITIQUES :
 1. MÉTÉO ACTUELLE : Appelle 'get_surf_conditions' UNIQUEMENT si l'utilisateur demande explicitement les conditions ACTUELLES (vagues, vent, température de l'eau maintenant).
-2. SPOTS & ÉQUIPEMENTS : Pour toute question sur les spots de surf, les équipements (combi, planches), appelle 'search_surf_knowledge'.
+   PRÉVISIONS : Pour une autre heure ou un autre jour ("demain matin", "ce soir", "meilleure heure aujourd'hui"), appelle 'get_surf_forecast'.
+   COMPARAISON : Pour choisir entre plusieurs spots ("où surfer entre X, Y et Z ?", "quel spot dans le Finistère demain ?"), appelle UNE SEULE FOIS 'compare_surf_spots' avec la liste des spots (ou la région), jamais 'get_surf_conditions' spot par spot.
+2. SPOTS & ÉQUIPEMENTS : Pour toute question sur les spots de surf, les équipements (combi, planches), appelle 'search_surf_knowledge'. Regroupe toutes tes reformulations dans UN SEUL appel (liste 'queries').
 3. NE MÉLANGE PAS : Si l'utilisateur demande juste des infos sur des spots, n'appelle PAS 'get_surf_conditions'. Donne uniquement ce qui est demandé.
 4. GESTION DES DONNÉES BRUTES : L'outil de recherche renvoie des extraits de documents. Si ces extraits sont en anglais, traduis-les fidèlement en français. Synthétise les informations pour ne garder que l'essentiel.
 5. REFORMULATION : Si l'utilisateur utilise des termes vagues comme "ce", "cette" ou "là-bas", remplace-les par les valeurs réelles trouvées dans l'historique avant d'interroger l'outil.
@@ -66,67 +95,275 @@ class Context:
 
 
 # Tools
-@tool
-def get_surf_conditions(location: str):
+def _fmt(value):
+    return "N/A" if value is None else value
+
+
+def _kmh(value):
+    return None if value is None else round(value * MS_TO_KMH, 1)
+
+
+async def _aforecast_table(location):
+    """Table de prévision d'un lieu, ou message d'erreur (str) à renvoyer à l'agent"""
+    # 1. Géolocalisation (cache permanent)
+    coords = await ageocode(location)
+
+    if not coords:
+        return f"Lieu {location} introuvable."
+        
+    lat, lon = coords
+
+
+    # 2. StormGlass pour les données marines (série horaire stockée localement)
+    stormglass_key = os.getenv("STORMGLASS_API_KEY")
+    
+    if not stormglass_key:
+        return "Clé API StormGlass manquante. Ajoute STORMGLASS_API_KEY dans ton fichier .env"
+    
+    table = await aget_table(lat, lon, stormglass_key)
+    
+    # Vérification de la structure de réponse
+    if table is None:
+        return f"Données marines indisponibles pour {location} via StormGlass."
+    return table
+
+
+async def aget_surf_conditions(location: str) -> str:
     """
     Obtient les conditions météo et de surf via StormGlass
     """
     try:
-        # 1. Géolocalisation
-        geo_url = f"https://nominatim.openstreetmap.org/search?q={location}&format=json&limit=1"
-        headers = {'User-Agent': 'MonAgentSurf/1.0'}
-        geo_res = requests.get(geo_url, headers=headers).json()
+        table = await _aforecast_table(location)
+        if isinstance(table, str):
+            return table
 
-        if not geo_res:
-            return f"Lieu {location} introuvable."
-            
-        lat = float(geo_res[0]["lat"])
-        lon = float(geo_res[0]["lon"])
+        # Heure en cours dans la prévision stockée
+        now = table.at(time.time())
+        return (
+            f"CONDITIONS ACTUELLES à {location} :\n"
+            f"- Température eau : {_fmt(now['waterTemperature'])}°C\n"
+            f"- Vagues : {_fmt(now['waveHeight'])}m\n"
+            f"- Houle : {_fmt(now['swellHeight'])}m\n"
+            f"- Période de la houle : {_fmt(now['swellPeriod'])}s\n"
+            f"- Vent moyen : {_fmt(_kmh(now['windSpeed']))} km/h\n (Rafales : {_fmt(_kmh(now['gust']))} km/h)\n"
+        )
 
+    except Exception as e:
+        return f"Erreur API : {str(e)}"
 
-        # 2. StormGlass pour les données marines
-        stormglass_key = os.getenv("STORMGLASS_API_KEY")
-        
-        if not stormglass_key:
-            return "Clé API StormGlass manquante. Ajoute STORMGLASS_API_KEY dans ton fichier .env"
-        
-        storm_url = (
-            f"https://api.stormglass.io/v2/weather/point?"
-            f"lat={lat}&lng={lon}&"
-            f"params=waveHeight,waterTemperature,windSpeed,gust,swellHeight,swellPeriod&"
+
+def _get_surf_conditions_sync(location: str) -> str:
+    # Appel synchrone (agent.invoke) : exécuté sur la boucle HTTP partagée
+    return run_sync(aget_surf_conditions(location))
+
+
+# Outil utilisable en synchrone comme en asynchrone (agent.ainvoke / astream)
+get_surf_conditions = StructuredTool.from_function(
+    func=_get_surf_conditions_sync,
+    coroutine=aget_surf_conditions,
+    name="get_surf_conditions",
+    description=inspect.cleandoc(aget_surf_conditions.__doc__),
+)
+
+
+# Heures locales affichées dans le tableau de prévision
+FORECAST_DISPLAY_HOURS = (6, 9, 12, 15, 18, 21)
+
+
+async def aget_surf_forecast(
+    location: str,
+    day_offset: int = 0,
+    min_wave: float = 0.6,
+    max_wave: float = 2.5,
+    min_period: float = 8.0,
+    max_wind: float = 25.0,
+) -> str:
+    """
+    Prévisions de surf heure par heure pour un jour donné et meilleurs créneaux.
+    À utiliser pour "demain matin ?", "ce soir ?", "meilleure heure aujourd'hui ?".
+
+    Arguments:
+        location: Le spot ou la ville (ex: 'La Torche')
+        day_offset: 0 = aujourd'hui, 1 = demain, 2 = après-demain...
+        min_wave, max_wave: Hauteur de vagues acceptable en mètres
+        min_period: Période de houle minimum en secondes
+        max_wind: Vent moyen maximum en km/h
+    """
+    try:
+        table = await _aforecast_table(location)
+        if isinstance(table, str):
+            return table
+
+        start, end = table.day_bounds(day_offset)
+        rows = np.flatnonzero(
+            (table.times >= start) & (table.times < end)
+            & np.isin(table.local_hours, FORECAST_DISPLAY_HOURS)
         )
-        storm_headers = {'Authorization': stormglass_key}
-        s_res = requests.get(storm_url, headers=storm_headers).json()
-        
-        # Vérification de la structure de réponse
-        if 'hours' not in s_res or len(s_res['hours']) == 0:
-            return f"Données marines indisponibles pour {location} via StormGlass."
-        
-        # Extraction sécurisée avec .get()
-        first_hour = s_res['hours'][0]
-        
-        # StormGlass retourne plusieurs sources, on prend 'meteofrance' ou 'sg' (StormGlass)
-        waves = first_hour.get('waveHeight', {}).get('sg') or first_hour.get('waveHeight', {}).get('noaa') or 'N/A'
-        swell = first_hour.get('swellHeight', {}).get('sg') or first_hour.get('swellHeight', {}).get('noaa') or 'N/A'
-        period = first_hour.get('swellPeriod', {}).get('sg') or first_hour.get('swellPeriod', {}).get('noaa') or 'N/A'
-        water_temp = first_hour.get('waterTemperature', {}).get('sg') or first_hour.get('waterTemperature', {}).get('noaa') or 'N/A'
-        wind_avg = first_hour.get('windSpeed', {}).get('sg') or first_hour.get('windSpeed', {}).get('noaa') or 'N/A'
-        wind_gusts = first_hour.get('gust', {}).get('sg') or first_hour.get('gust', {}).get('noaa') or 'N/A'
-        return (
-            f"CONDITIONS ACTUELLES à {location} :\n"
-            f"- Température eau : {water_temp}°C\n"
-            f"- Vagues : {waves}m\n"
-            f"- Houle : {swell}m\n"
-            f"- Période de la houle : {period}s\n"
-            f"- Vent moyen : {wind_avg} km/h\n (Rafales : {wind_gusts} km/h)\n"
+        if len(rows) == 0:
+            return f"Pas de prévision disponible pour {location} à J+{day_offset}."
+
+        day = datetime.fromtimestamp(start, TIMEZONE).strftime("%d/%m")
+        lines = [
+            f"PRÉVISIONS à {location} le {day} :",
+            "Heure | Vagues | Houle | Période | Vent (rafales) | Eau",
+        ]
+        for i in rows:
+            hour = table.at(int(table.times[i]))
+            lines.append(
+                f"{table.local_hours[i]:02d}h | {_fmt(hour['waveHeight'])}m | {_fmt(hour['swellHeight'])}m | "
+                f"{_fmt(hour['swellPeriod'])}s | {_fmt(_kmh(hour['windSpeed']))} ({_fmt(_kmh(hour['gust']))}) km/h | "
+                f"{_fmt(hour['waterTemperature'])}°C"
+            )
+
+        windows = table.best_windows(
+            start, end,
+            min_wave=min_wave, max_wave=max_wave, min_period=min_period, max_wind=max_wind,
+        )
+        lines.append(
+            f"MEILLEURS CRÉNEAUX (vagues {min_wave}-{max_wave}m, période ≥ {min_period}s, vent ≤ {max_wind} km/h) :"
         )
+        if not windows:
+            lines.append("- Aucun créneau ne remplit ces conditions.")
+        for window_start, window_end, score, _ in windows:
+            lines.append(
+                f"- {datetime.fromtimestamp(window_start, TIMEZONE):%Hh}-"
+                f"{datetime.fromtimestamp(window_end, TIMEZONE):%Hh} (score {score:.1f})"
+            )
+        return "\n".join(lines)
 
     except Exception as e:
         return f"Erreur API : {str(e)}"
-    
-    
+
+
+def _get_surf_forecast_sync(
+    location: str,
+    day_offset: int = 0,
+    min_wave: float = 0.6,
+    max_wave: float = 2.5,
+    min_period: float = 8.0,
+    max_wind: float = 25.0,
+) -> str:
+    return run_sync(aget_surf_forecast(location, day_offset, min_wave, max_wave, min_period, max_wind))
+
+
+get_surf_forecast = StructuredTool.from_function(
+    func=_get_surf_forecast_sync,
+    coroutine=aget_surf_forecast,
+    name="get_surf_forecast",
+    description=inspect.cleandoc(aget_surf_forecast.__doc__),
+)
+
+
+async def _compare_candidates(spots, region):
+    """Spots à comparer : liste donnée, sinon spots d'un département ou autour d'un lieu"""
+    if spots:
+        return list(dict.fromkeys(spots))[:COMPARE_MAX_SPOTS]
+    if not region:
+        return []
+    text = normalize(region)
+    for departement, pattern in DEPARTEMENT_PATTERNS.items():
+        if pattern.search(text):
+            return [s["name"] for s in load_catalog() if s["departement"] == departement][:COMPARE_MAX_SPOTS]
+    nearby = await anearest_spots(region, k=COMPARE_MAX_SPOTS, max_km=COMPARE_RADIUS_KM)
+    return [spot["name"] for spot, _ in nearby or []]
+
+
+async def acompare_surf_spots(
+    spots: list[str] | None = None,
+    region: str | None = None,
+    day_offset: int = 0,
+    min_wave: float = 0.6,
+    max_wave: float = 2.5,
+    min_period: float = 8.0,
+    max_wind: float = 25.0,
+) -> str:
+    """
+    Compare plusieurs spots pour un jour donné et les classe du meilleur au moins bon.
+    À utiliser pour "où surfer entre La Torche, La Palue et le Petit Minou ?" ou
+    "quel spot du Finistère demain ?" : un seul appel pour tous les spots.
+
+    Arguments:
+        spots: Les spots à comparer (ex: ['La Torche', 'La Palue', 'Le Petit Minou'])
+        region: À défaut de liste, un département ('Finistère', 'Morbihan', "Côtes-d'Armor")
+            ou un lieu (les spots à moins de 30 km sont comparés)
+        day_offset: 0 = aujourd'hui, 1 = demain, 2 = après-demain...
+        min_wave, max_wave: Hauteur de vagues acceptable en mètres
+        min_period: Période de houle minimum en secondes
+        max_wind: Vent moyen maximum en km/h
+    """
+    try:
+        names = await _compare_candidates(spots, region)
+        if not names:
+            return "Aucun spot à comparer : donne une liste de spots ou une région."
+
+        # Téléchargements en parallèle, au plus COMPARE_CONCURRENCY à la fois
+        semaphore = asyncio.Semaphore(COMPARE_CONCURRENCY)
+
+        async def fetch(name):
+            async with semaphore:
+                return await _aforecast_table(name)
+
+        results = await asyncio.gather(*(fetch(name) for name in names), return_exceptions=True)
+        found = [(name, table) for name, table in zip(names, results) if not isinstance(table, (str, Exception))]
+        errors = [
+            f"- {name} : {table if isinstance(table, str) else f'erreur ({table})'}"
+            for name, table in zip(names, results) if isinstance(table, (str, Exception))
+        ]
+
+        if not found:
+            return "\n".join(["Aucune prévision disponible pour ces spots :"] + errors)
+
+        start, end = ForecastTable.day_bounds(day_offset)
+        results = compare_tables(
+            [table for _, table in found], start, end,
+            min_wave=min_wave, max_wave=max_wave, min_period=min_period, max_wind=max_wind,
+        )
+        # Tous les spots classés en une fois (score, puis durée surfable)
+        ranking = sorted(zip([name for name, _ in found], results), key=lambda r: (-r[1]["score"], -r[1]["hours"]))
+
+        day = datetime.fromtimestamp(start, TIMEZONE).strftime("%d/%m")
+        lines = [
+            f"COMPARAISON DES SPOTS le {day} (vagues {min_wave}-{max_wave}m, période ≥ {min_period}s, "
+            f"vent ≤ {max_wind} km/h) :",
+            "Rang | Spot | Score | Heures surfables | Meilleure heure : vagues, période, vent",
+        ]
+        for rank, (name, result) in enumerate(ranking, 1):
+            if result["best"] is None:
+                best = "aucune"
+            else:
+                best = (
+                    f"{datetime.fromtimestamp(result['best'], TIMEZONE):%Hh} : {_fmt(result['waveHeight'])}m, "
+                    f"{_fmt(result['swellPeriod'])}s, {_fmt(_kmh(result['windSpeed']))} km/h"
+                )
+            lines.append(f"{rank} | {name} | {result['score']:.1f} | {result['hours']}h | {best}")
+        return "\n".join(lines + errors)
+
+    except Exception as e:
+        return f"Erreur API : {str(e)}"
+
+
+def _compare_surf_spots_sync(
+    spots: list[str] | None = None,
+    region: str | None = None,
+    day_offset: int = 0,
+    min_wave: float = 0.6,
+    max_wave: float = 2.5,
+    min_period: float = 8.0,
+    max_wind: float = 25.0,
+) -> str:
+    return run_sync(acompare_surf_spots(spots, region, day_offset, min_wave, max_wave, min_period, max_wind))
+
+
+compare_surf_spots = StructuredTool.from_function(
+    func=_compare_surf_spots_sync,
+    coroutine=acompare_surf_spots,
+    name="compare_surf_spots",
+    description=inspect.cleandoc(acompare_surf_spots.__doc__),
+)
+
+
 @tool
-def search_surf_knowledge(query: str) -> str:
+def search_surf_knowledge(queries: list[str]) -> str:
     """
     Recherche des informations dans la base de connaissances locale sur :
     1. Les équipements (TXT) : Combinaisons, planches, accessoires, protection, et conseils selon la température.
@@ -136,38 +373,294 @@ def search_surf_knowledge(query: str) -> str:
     l'outil renvoie le texte brut qu'il faut synthétiser et traduire en français.
 
     Arguments:
-        query: La recherche à effectuer (ex: 'meilleurs spots Finistère' ou 'épaisseur combi eau 12 degrés')
+        queries: Une ou plusieurs recherches, traitées en un seul appel : mets-y toutes tes
+            reformulations et sous-questions (ex: ['meilleurs spots Finistère', 'spots débutants Crozon'])
     """
-    # L'outil appelle simplement le moteur ask_rag
-    return ask_rag(query=query)
+    # Toutes les sous-requêtes passent en une seule recherche groupée
+    return ask_rag_many(queries=queries)
     
 
 
 
-# Configuration du modèle
-model = ChatGroq(
-    model="Llama-3.3-70b-versatile",
-    temperature=0.5,
-    max_tokens=2048
-)
+# Outils dont le résultat dépend de l'heure : réponses gardées peu de temps en cache
+WEATHER_TOOLS = [get_surf_conditions, get_surf_forecast, compare_surf_spots]
+TOOLS = [*WEATHER_TOOLS, search_surf_knowledge]
+WEATHER_TOOL_NAMES = {t.name for t in WEATHER_TOOLS}
 
-# Set up memory
-checkpointer = InMemorySaver()
 
-# Création de l'agent
-agent = create_agent(
-    model=model,
-    system_prompt=SYSTEM_PROMPT,
-    tools=[get_surf_conditions, search_surf_knowledge],
-    context_schema=Context,
-    checkpointer=checkpointer,
-)
+def build_agent(model=None, checkpointer=None, summary_model=None, history_budget=HISTORY_TOKEN_BUDGET):
+    """
+    Construit l'agent Sunny. Par défaut : modèles Groq et mémoire SQLite.
+    L'historique envoyé au LLM est borné : quand il dépasse HISTORY_TOKEN_BUDGET
+    jetons, les anciens échanges sont remplacés par un résumé (les
+    HISTORY_KEEP_MESSAGES derniers messages sont gardés tels quels).
+    history_budget=None désactive le résumé (historique complet).
+    """
+    from langchain.agents import create_agent
+    from langchain.agents.middleware import SummarizationMiddleware
+    from langchain_groq import ChatGroq
+
+    if model is None:
+        model = ChatGroq(
+            model=AGENT_MODEL,
+            temperature=0.5,
+            max_tokens=2048
+        )
+    # Résumés faits par le petit modèle Groq (ou par le modèle fourni, ex: faux modèle de bench)
+    if summary_model is None and isinstance(model, ChatGroq):
+        summary_model = ChatGroq(
+            model=SUMMARY_MODEL,
+            temperature=0,
+            max_tokens=512
+        )
+
+    return create_agent(
+        model=model,
+        system_prompt=SYSTEM_PROMPT,
+        tools=TOOLS,
+        context_schema=Context,
+        checkpointer=SQLiteCheckpointer() if checkpointer is None else checkpointer,
+        middleware=[] if history_budget is None else [
+            SummarizationMiddleware(
+                model=summary_model or model,
+                trigger=("tokens", history_budget),
+                keep=("messages", HISTORY_KEEP_MESSAGES),
+            ),
+        ],
+    )
+
+
+_agent_lock = threading.Lock()
+
+
+def get_agent():
+    """
+    Agent partagé, construit au premier usage (pas à l'import du module).
+    Un agent assigné à sunny_agent.agent (ex: faux modèle de bench) le remplace.
+    """
+    agent = globals().get("agent")
+    if agent is None:
+        with _agent_lock:
+            agent = globals().get("agent")
+            if agent is None:
+                agent = globals()["agent"] = build_agent()
+    return agent
+
+
+def __getattr__(name):
+    # sunny_agent.agent : construit à la demande
+    if name == "agent":
+        return get_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _stream_events(mode, chunk):
+    """Traduit un élément de agent.stream en événements simples pour l'interface"""
+    if mode == "messages":
+        message, metadata = chunk
+        # Jetons du LLM (les résultats d'outils passent aussi par ce flux : on les ignore)
+        if isinstance(message, AIMessageChunk) and metadata.get("langgraph_node") == "model" and message.text:
+            yield ("token", message.text)
+        return
+
+    for node, update in chunk.items():
+        for message in (update or {}).get("messages", []):
+            if node == "model":
+                for call in message.tool_calls:
+                    yield ("tool_start", call["name"], call["args"])
+            elif isinstance(message, ToolMessage):
+                yield ("tool_end", message.name, message.content)
+
+
+def _remember_exchange(config, user_input, answer):
+    """Ajoute un échange servi par le cache à la mémoire de la conversation"""
+    get_agent().update_state(
+        config,
+        {"messages": [HumanMessage(content=user_input), AIMessage(content=answer)]},
+        as_node="model",
+    )
+
+
+def _tools_used(messages):
+    """Noms des outils appelés pendant le dernier tour"""
+    tools = []
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            break
+        if isinstance(message, ToolMessage):
+            tools.append(message.name)
+    return tools
+
+
+async def _arun_routed(calls, config):
+    """
+    Exécute en parallèle les appels choisis par le routeur. Renvoie les
+    messages à ajouter à la question (appels réussis seulement) et les
+    événements tool_end correspondants.
+    """
+    tools = {t.name: t for t in TOOLS}
+    results = await asyncio.gather(
+        *(tools[call["name"]].ainvoke(call, config) for call in calls), return_exceptions=True
+    )
+    done = [(call, result) for call, result in zip(calls, results) if not isinstance(result, Exception)]
+    events = [
+        ("tool_end", call["name"], f"Erreur : {result}" if isinstance(result, Exception) else result.content)
+        for call, result in zip(calls, results)
+    ]
+    messages = []
+    if done:
+        messages = [AIMessage(content="", tool_calls=[call for call, _ in done]), *(result for _, result in done)]
+    return messages, events
+
+
+def _uses_weather(tools):
+    """Un des outils appelés dépend-il de l'heure (voir WEATHER_TOOLS) ?"""
+    return bool(WEATHER_TOOL_NAMES.intersection(tools))
 
 
-# Initialisation du RAG au démarrage
-initialize_rag()
+def _with_metrics(config):
+    """Config de l'agent avec le callback qui mesure les appels au LLM et aux outils"""
+    return {**config, "callbacks": [*config.get("callbacks", []), metrics.MetricsCallbackHandler()]}
 
 
+def ask_sunny(user_input, config, context=None):
+    """Un tour complet de l'agent (sans flux), avec le cache sémantique des réponses"""
+    with metrics.timed("turn"):
+        cached = answer_cache.lookup(user_input)
+        if cached is not None:
+            _remember_exchange(config, user_input, cached)
+            return cached
+
+        # Même callback de mesure pour les outils lancés par le routeur et pour l'agent
+        metered = _with_metrics(config)
+        messages = [{"role": "user", "content": user_input}]
+        calls = router.route(user_input) if router.ROUTER_ENABLED else []
+        if calls:
+            messages += run_sync(_arun_routed(calls, metered))[0]
+
+        result = get_agent().invoke(
+            {"messages": messages},
+            config=metered,
+            context=context
+        )
+        answer = result['messages'][-1].content
+        answer_cache.store(user_input, answer, weather=_uses_weather(_tools_used(result['messages'])))
+        return answer
+
+
+def stream_sunny(user_input, config, context=None, use_cache=True):
+    """
+    Exécute un tour de l'agent en flux. Produit des événements :
+    ("token", texte) au fil de la génération du LLM,
+    ("tool_start", nom, arguments) et ("tool_end", nom, résultat) autour des outils.
+    Un "tool_start" signifie que le texte déjà reçu n'était pas la réponse finale.
+    Une question déjà posée est servie par le cache en un seul "token"
+    (use_cache=False : toujours interroger l'agent, ex: tests de charge).
+    Le dernier événement est ("trace", détail) : durée de chaque étape du tour.
+    """
+    trace, token = metrics.start_trace()
+    start = time.perf_counter()
+    try:
+        try:
+            yield from _stream_turn(user_input, _with_metrics(config), context, use_cache)
+        except Exception as e:
+            metrics.observe("turn", time.perf_counter() - start, e)
+            raise
+        metrics.observe("turn", time.perf_counter() - start)
+        yield ("trace", metrics.summarize_trace(trace))
+    finally:
+        metrics.end_trace(token)
+
+
+def _stream_turn(user_input, config, context, use_cache):
+    cached = answer_cache.lookup(user_input) if use_cache else None
+    if cached is not None:
+        _remember_exchange(config, user_input, cached)
+        yield ("token", cached)
+        return
+
+    parts, tools = [], []
+    messages = [{"role": "user", "content": user_input}]
+    # Outils évidents lancés tout de suite : le LLM n'a plus qu'à répondre
+    calls = router.route(user_input) if router.ROUTER_ENABLED else []
+    if calls:
+        for call in calls:
+            yield ("tool_start", call["name"], call["args"])
+            tools.append(call["name"])
+        routed, events = run_sync(_arun_routed(calls, config))
+        messages += routed
+        yield from events
+
+    for mode, chunk in get_agent().stream(
+        {"messages": messages},
+        config=config,
+        context=context,
+        stream_mode=["messages", "updates"],
+    ):
+        for event in _stream_events(mode, chunk):
+            _collect(event, parts, tools)
+            yield event
+    if use_cache:
+        answer_cache.store(user_input, "".join(parts), weather=_uses_weather(tools))
+
+
+async def astream_sunny(user_input, config, context=None, use_cache=True):
+    """Version asynchrone de stream_sunny"""
+    trace, token = metrics.start_trace()
+    start = time.perf_counter()
+    try:
+        try:
+            async for event in _astream_turn(user_input, _with_metrics(config), context, use_cache):
+                yield event
+        except Exception as e:
+            metrics.observe("turn", time.perf_counter() - start, e)
+            raise
+        metrics.observe("turn", time.perf_counter() - start)
+        yield ("trace", metrics.summarize_trace(trace))
+    finally:
+        metrics.end_trace(token)
+
+
+async def _astream_turn(user_input, config, context, use_cache):
+    cached = await asyncio.to_thread(answer_cache.lookup, user_input) if use_cache else None
+    if cached is not None:
+        await asyncio.to_thread(_remember_exchange, config, user_input, cached)
+        yield ("token", cached)
+        return
+
+    parts, tools = [], []
+    messages = [{"role": "user", "content": user_input}]
+    calls = await asyncio.to_thread(router.route, user_input) if router.ROUTER_ENABLED else []
+    if calls:
+        for call in calls:
+            yield ("tool_start", call["name"], call["args"])
+            tools.append(call["name"])
+        routed, events = await _arun_routed(calls, config)
+        messages += routed
+        for event in events:
+            yield event
+
+    async for mode, chunk in get_agent().astream(
+        {"messages": messages},
+        config=config,
+        context=context,
+        stream_mode=["messages", "updates"],
+    ):
+        for event in _stream_events(mode, chunk):
+            _collect(event, parts, tools)
+            yield event
+    if use_cache:
+        await asyncio.to_thread(answer_cache.store, user_input, "".join(parts), weather=_uses_weather(tools))
+
+
+def _collect(event, parts, tools):
+    """Garde le texte de la réponse finale et les outils appelés"""
+    if event[0] == "token":
+        parts.append(event[1])
+    elif event[0] == "tool_start":
+        parts.clear()
+        tools.append(event[1])
+
 
 def chat_with_sunny():
     # On garde le thread_id pour la mémoire
@@ -198,16 +691,8 @@ def chat_with_sunny():
                 print(f"Sunny : {random.choice(goodbyes)}")
                 break
 
-        # Appel de l'agent
-        result = agent.invoke(
-            {"messages": [{"role": "user", "content": user_input}]},
-            config=config,
-            context=Context(user_id="1")
-        )
-
-        # Extraction du message de Sunny
-        # On va chercher le contenu du dernier message AI
-        final_response = result['messages'][-1].content
+        # Appel de l'agent (ou réponse du cache)
+        final_response = ask_sunny(user_input, config, context=Context(user_id="1"))
 
         print(f"Sunny : {final_response}\n")
 
@@ -0,0 +1,100 @@
+"""
+Configuration commune des tests : base Chroma, mémoire et caches dans un
+dossier temporaire, API météo sur le serveur de bouchons local
+(bench/stub_apis.py). Faite ici, avant l'import des modules de Sunny, qui lisent
+leur configuration à l'import.
+
+Lancer depuis RAG/ : python -m pytest -q
+"""
+import hashlib
+import os
+import re
+import shutil
+import sys
+import tempfile
+import uuid
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.benchmark import prepare_environment  # noqa: E402
+
+TEST_DIR = tempfile.mkdtemp(prefix="sunny-tests-")
+prepare_environment(TEST_DIR)
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def stub_url():
+    """URL de base du serveur de bouchons partagé par les tests"""
+    return os.environ["SUNNY_NOMINATIM_URL"].rsplit("/search", 1)[0]
+
+
+class HashingEncoder:
+    """
+    Encodeur déterministe pour les tests (sac de mots haché) : même interface
+    que le modèle d'embedding, sans modèle à télécharger. Compte les textes encodés.
+    """
+
+    dimension = 64
+
+    def __init__(self):
+        self.encoded = 0
+
+    def encode(self, texts, convert_to_numpy=True, normalize_embeddings=True, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        self.encoded += len(texts)
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for n, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                vectors[n, int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dimension] += 1
+        if normalize_embeddings:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+        return vectors[0] if single else vectors
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+
+@pytest.fixture
+def encoder(monkeypatch):
+    """Modèle d'embedding remplacé par HashingEncoder pour le test"""
+    import rag
+
+    model = HashingEncoder()
+    monkeypatch.setattr(rag, "get_embedding_model", lambda: model)
+    return model
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    """Collection Chroma neuve pour le test (supprimée ensuite)"""
+    import rag
+    import resources
+
+    client = resources.get_db_client()
+    name = f"test_{uuid.uuid4().hex[:12]}"
+    test_collection = client.create_collection(name=name)
+    monkeypatch.setattr(resources, "get_collection", lambda: test_collection)
+    monkeypatch.setattr(rag, "get_collection", lambda: test_collection)
+    yield test_collection
+    client.delete_collection(name)
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """Corpus vide dans tmp_path/documents, manifeste dans tmp_path : renvoie le dossier"""
+    import rag
+
+    documents = tmp_path / "documents"
+    documents.mkdir()
+    monkeypatch.setattr(rag, "SOURCE_FILES", [])
+    monkeypatch.setattr(rag, "DOCUMENTS_DIR", str(documents))
+    monkeypatch.setattr(rag, "MANIFEST_PATH", str(tmp_path / "manifest.json"))
+    return documents
@@ -0,0 +1,60 @@
+import pytest
+
+import answer_cache
+import sunny_agent
+
+
+@pytest.mark.parametrize("query", [
+    "Où surfer ce week-end entre La Torche et La Palue ?",
+    "Quelles conditions ce matin à La Torche ?",
+    "Quelle combinaison pour cet hiver en Bretagne ?",
+])
+def test_time_expressions_are_cacheable(query):
+    assert answer_cache.is_cacheable(query)
+
+
+@pytest.mark.parametrize("query", [
+    "Et demain à Penhors ?",
+    "Il faut quel niveau pour celui-là ?",
+    "Ça vaut le coup d'y aller ?",
+    "Les conditions sur cette plage demain ?",
+    "Houle ?",
+])
+def test_questions_that_need_the_conversation_are_not_cached(query):
+    assert not answer_cache.is_cacheable(query)
+
+
+@pytest.mark.parametrize("tools, weather", [
+    (["compare_surf_spots"], True),
+    (["search_surf_knowledge", "get_surf_forecast"], True),
+    (["get_surf_conditions"], True),
+    (["search_surf_knowledge"], False),
+    ([], False),
+])
+def test_weather_answers_get_the_short_ttl(tools, weather):
+    assert sunny_agent._uses_weather(tools) is weather
+
+
+def test_every_weather_tool_is_an_agent_tool():
+    assert sunny_agent.WEATHER_TOOL_NAMES == {"get_surf_conditions", "get_surf_forecast", "compare_surf_spots"}
+    assert sunny_agent.WEATHER_TOOL_NAMES <= {t.name for t in sunny_agent.TOOLS}
+
+
+def test_memory_collection():
+    collection = answer_cache.MemoryCollection()
+    collection.upsert(
+        ids=["houle", "vent", "vieux"],
+        documents=["houle", "vent", "vieux"],
+        embeddings=[[1.0, 0.0], [0.0, 2.0], [1.0, 0.1]],
+        metadatas=[{"expires_at": 200}, {"expires_at": 200}, {"expires_at": 50}],
+    )
+
+    result = collection.query(query_embeddings=[[0.9, 0.1]], n_results=1, where={"expires_at": {"$gt": 100}})
+    assert result["ids"] == [["houle"]]
+    assert result["distances"][0][0] == pytest.approx(1 - 0.9 / (0.82 ** 0.5))
+
+    expired = collection.get(where={"expires_at": {"$lte": 100}}, include=[])["ids"]
+    assert expired == ["vieux"]
+    collection.delete(ids=expired)
+    assert collection.count() == 2
+    assert collection.query(query_embeddings=[[1.0, 0.0]], where={"expires_at": {"$gt": 300}})["ids"] == [[]]
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import sys
+
+import pytest
+
+import batch
+import weather
+
+
+def write_lines(path, records, torn=None):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+        if torn is not None:
+            f.write(torn)
+
+
+RESULTS = [
+    {"id": "1", "answer": "ok", "error": None},
+    {"id": "2", "answer": None, "error": "RateLimitError: 429"},
+    {"id": "3", "answer": None, "error": "TimeoutError: "},
+    # Réessayée et réussie : la dernière ligne d'un id fait foi
+    {"id": "3", "answer": "ok", "error": None},
+]
+
+
+def test_load_done_truncates_torn_line(tmp_path):
+    output = tmp_path / "results.jsonl"
+    write_lines(output, RESULTS, torn='{"id": "4", "answer": "coup')
+
+    assert batch.load_done(output) == {"1", "2", "3"}
+    # Ligne incomplète supprimée : les prochains résultats s'ajoutent sur une ligne propre
+    assert output.read_text(encoding="utf-8").endswith("\n")
+    assert len(output.read_text(encoding="utf-8").splitlines()) == len(RESULTS)
+
+
+def test_load_done_retry_failed(tmp_path):
+    output = tmp_path / "results.jsonl"
+    write_lines(output, RESULTS)
+
+    assert batch.load_done(output, retry_failed=True) == {"1", "3"}
+
+
+def test_load_done_without_output(tmp_path):
+    assert batch.load_done(tmp_path / "absent.jsonl") == set()
+
+
+def test_read_items(tmp_path):
+    path = tmp_path / "questions.jsonl"
+    write_lines(path, [
+        {"request_id": "a", "title": "Quelle  combinaison\nen hiver ?"},
+        {"query": "Conditions à La Torche ?"},
+        {"request_id": "a", "title": "doublon"},
+        {"id": "vide"},
+    ])
+
+    assert batch.read_items(path) == [
+        {"id": "a", "question": "Quelle combinaison en hiver ?"},
+        {"id": "2", "question": "Conditions à La Torche ?"},
+    ]
+
+
+@pytest.mark.parametrize("retry_failed, expected", [(False, ["4"]), (True, ["2", "4"])])
+def test_main_resumes_from_output(tmp_path, monkeypatch, retry_failed, expected):
+    questions = tmp_path / "questions.jsonl"
+    write_lines(questions, [{"id": str(n), "query": f"question {n}"} for n in range(1, 5)])
+    output = tmp_path / "results.jsonl"
+    write_lines(output, RESULTS, torn='{"id": "4"')
+    todo = []
+
+    async def fake_run_batch(items, *args):
+        todo.extend(item["id"] for item in items)
+        return []
+
+    monkeypatch.setattr(batch, "run_batch", fake_run_batch)
+    argv = ["batch.py", str(questions), "--output", str(output)] + (["--retry-failed"] if retry_failed else [])
+    monkeypatch.setattr(sys, "argv", argv)
+    batch.main()
+
+    assert todo == expected
+
+
+def test_token_bucket_waits_are_charged_to_the_item():
+    async def run():
+        bucket = batch.TokenBucket(600)  # 10 par seconde
+        bucket.tokens = 0
+
+        async def item():
+            stats = {"rate_wait_s": 0.0}
+            batch._item_stats.set(stats)
+            await bucket.acquire()
+            return stats["rate_wait_s"]
+
+        return await asyncio.gather(item(), item(), item())
+
+    waits = asyncio.run(run())
+
+    # Servis dans l'ordre d'arrivée, chacun attend son tour
+    assert waits == pytest.approx([0.1, 0.2, 0.3], abs=0.02)
+
+
+def test_request_limiters_are_scoped_to_their_context(stub_url):
+    calls = []
+
+    async def limiter():
+        calls.append(batch._item_stats.get())
+
+    async def fetch(lat):
+        batch._item_stats.set({"item": lat})
+        return await weather.afetch_marine_data(lat, -3.0, "offline")
+
+    async def run():
+        with weather.request_limiters({weather.STORMGLASS_URL: limiter}):
+            await asyncio.gather(fetch(46.1), fetch(46.2))
+        # Hors du bloc : plus de limiteur
+        await weather.afetch_marine_data(46.3, -3.0, "offline")
+
+    asyncio.run(run())
+    # Appels synchrones (boucle HTTP de fond) : le contexte suit run_sync
+    with weather.request_limiters({weather.STORMGLASS_URL: limiter}):
+        weather.fetch_marine_data(46.4, -3.0, "offline")
+
+    assert sorted(call["item"] for call in calls[:2]) == [46.1, 46.2]
+    assert len(calls) == 3 and calls[2] is None
@@ -0,0 +1,149 @@
+import asyncio
+import time
+
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+
+import checkpointer
+from checkpointer import SQLiteCheckpointer
+
+
+@pytest.fixture
+def saver(tmp_path):
+    return SQLiteCheckpointer(tmp_path / "memory.db", max_checkpoints=3, max_threads=2, thread_ttl=3600)
+
+
+def put(saver, thread_id, step, parent=None):
+    """Écrit un checkpoint à la suite de `parent` (config renvoyée par put) ; renvoie sa config"""
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    if parent is not None:
+        config["configurable"]["checkpoint_id"] = parent["configurable"]["checkpoint_id"]
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"step": step}
+    return saver.put(config, checkpoint, {"source": "loop", "step": step}, {})
+
+
+def thread_config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def test_put_get_round_trip(saver):
+    first = put(saver, "a", 0)
+    second = put(saver, "a", 1, parent=first)
+    saver.put_writes(second, [("messages", "bonjour")], task_id="task-1")
+
+    latest = saver.get_tuple(thread_config("a"))
+    assert latest.config == second
+    assert latest.checkpoint["channel_values"] == {"step": 1}
+    assert latest.metadata["step"] == 1
+    assert latest.parent_config == first
+    assert latest.pending_writes == [("task-1", "messages", "bonjour")]
+
+    # Checkpoint précis demandé par son id
+    assert saver.get_tuple(first).checkpoint["channel_values"] == {"step": 0}
+    assert saver.get_tuple(thread_config("inconnu")) is None
+
+
+def test_survives_reopening(tmp_path):
+    path = tmp_path / "memory.db"
+    put(SQLiteCheckpointer(path), "a", 0)
+
+    latest = SQLiteCheckpointer(path).get_tuple(thread_config("a"))
+
+    assert latest.checkpoint["channel_values"] == {"step": 0}
+
+
+def test_list(saver):
+    configs = []
+    for step in range(3):
+        configs.append(put(saver, "a", step, parent=configs[-1] if configs else None))
+    put(saver, "b", 0)
+
+    assert [item.metadata["step"] for item in saver.list(thread_config("a"))] == [2, 1, 0]
+    assert [item.metadata["step"] for item in saver.list(thread_config("a"), limit=2)] == [2, 1]
+    assert [item.metadata["step"] for item in saver.list(thread_config("a"), before=configs[2])] == [1, 0]
+    assert [item.config for item in saver.list(thread_config("a"), filter={"step": 1})] == [configs[1]]
+    assert len(list(saver.list(None))) == 4
+
+
+def test_prune_keeps_latest_checkpoints(saver):
+    config = None
+    for step in range(5):
+        config = put(saver, "a", step, parent=config)
+        saver.put_writes(config, [("messages", step)], task_id="task")
+
+    assert [item.metadata["step"] for item in saver.list(thread_config("a"))] == [4, 3, 2]
+    # Les écritures des checkpoints supprimés partent avec eux
+    writes, = saver.conn.execute("SELECT COUNT(*) FROM writes").fetchone()
+    assert writes == 3
+
+
+def test_evict_least_recently_used_threads(saver, monkeypatch):
+    monkeypatch.setattr(checkpointer, "EVICT_EVERY", 1)
+    for thread_id in ("a", "b", "c"):
+        put(saver, thread_id, 0)
+        time.sleep(0.01)
+
+    assert saver.get_tuple(thread_config("a")) is None
+    assert saver.get_tuple(thread_config("c")) is not None
+    assert saver.stats() == {"threads": 2, "checkpoints": 2}
+
+
+def test_evict_expired_threads(saver, monkeypatch):
+    monkeypatch.setattr(checkpointer, "EVICT_EVERY", 1)
+    put(saver, "a", 0)
+    saver.conn.execute("UPDATE threads SET last_used = ? WHERE thread_id = 'a'", (time.time() - 7200,))
+
+    put(saver, "b", 0)
+
+    assert saver.get_tuple(thread_config("a")) is None
+    assert saver.stats() == {"threads": 1, "checkpoints": 1}
+
+
+def test_delete_thread(saver):
+    config = put(saver, "a", 0)
+    saver.put_writes(config, [("messages", "bonjour")], task_id="task")
+    put(saver, "b", 0)
+
+    saver.delete_thread("a")
+
+    assert saver.get_tuple(thread_config("a")) is None
+    assert saver.stats() == {"threads": 1, "checkpoints": 1}
+
+
+def test_async_methods_run_off_the_loop(saver, monkeypatch):
+    put_sync = saver.put
+
+    def slow_put(*args):
+        time.sleep(0.2)
+        return put_sync(*args)
+
+    monkeypatch.setattr(saver, "put", slow_put)
+    checkpoint = empty_checkpoint()
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        config = await saver.aput(thread_config("a"), checkpoint, {"step": 0}, {})
+        await saver.aput_writes(config, [("messages", "bonjour")], task_id="task")
+        task.cancel()
+        latest = await saver.aget_tuple(thread_config("a"))
+        items = [item async for item in saver.alist(thread_config("a"))]
+        await saver.adelete_thread("a")
+        return ticks, latest, items
+
+    ticks, latest, items = asyncio.run(run())
+
+    # La boucle a continué de tourner pendant l'écriture
+    assert ticks >= 5
+    assert latest.checkpoint["id"] == checkpoint["id"]
+    assert latest.pending_writes == [("task", "messages", "bonjour")]
+    assert [item.config for item in items] == [latest.config]
+    assert saver.get_tuple(thread_config("a")) is None
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def empty_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, "_counters", {})
+    monkeypatch.setattr(metrics, "_histograms", {})
+    monkeypatch.setattr(metrics, "_stats_sources", {})
+    monkeypatch.setattr(metrics, "_gauges", set())
+
+
+def test_render_prometheus_types_and_suffixes():
+    metrics.count("llm_tokens", 12, kind="prompt")
+    metrics.count("llm_tokens", 3, kind="completion")
+    metrics.register_stats("store", lambda: {"hits": 2, "entries": 5}, gauges=("entries",))
+    metrics.observe("chroma_query", 0.02)
+
+    lines = metrics.render_prometheus().splitlines()
+
+    start = lines.index("# HELP sunny_store_entries store entries")
+    assert lines[start:start + 4] == [
+        "# HELP sunny_store_entries store entries",
+        "# TYPE sunny_store_entries gauge",
+        "sunny_store_entries 5",
+        "# HELP sunny_store_hits_total store hits",
+    ]
+    # Une seule paire HELP/TYPE par métrique, même avec plusieurs séries
+    assert lines.count("# TYPE sunny_llm_tokens_total counter") == 1
+    assert 'sunny_llm_tokens_total{kind="completion"} 3' in lines
+    assert 'sunny_llm_tokens_total{kind="prompt"} 12' in lines
+    assert "# TYPE sunny_stage_seconds histogram" in lines
+    assert 'sunny_stage_seconds_bucket{stage="chroma_query",le="0.025"} 1' in lines
+    assert 'sunny_stage_seconds_count{stage="chroma_query"} 1' in lines
+
+
+def test_render_prometheus_escapes_label_values():
+    metrics.count("errors", stage='tool:"météo"\\\nbis', error="ValueError")
+
+    assert (
+        'sunny_errors_total{error="ValueError",stage="tool:\\"météo\\"\\\\\\nbis"} 1'
+        in metrics.render_prometheus().splitlines()
+    )
+
+
+def test_trace_is_reset_after_the_turn():
+    trace, token = metrics.start_trace()
+    metrics.observe("chroma_query", 0.01)
+    metrics.end_trace(token)
+    # Hors du tour : plus rien n'est ajouté au détail
+    metrics.observe("chroma_query", 0.01)
+
+    assert [stage for stage, *_ in trace] == ["chroma_query"]
+    assert metrics._current_trace.get() is None
+
+
+def test_nested_traces_restore_the_outer_one():
+    async def run():
+        outer, outer_token = metrics.start_trace()
+        inner, inner_token = metrics.start_trace()
+        metrics.observe("inner", 0.01)
+        metrics.end_trace(inner_token)
+        metrics.observe("outer", 0.01)
+        metrics.end_trace(outer_token)
+        return outer, inner
+
+    outer, inner = asyncio.run(run())
+
+    assert [stage for stage, *_ in inner] == ["inner"]
+    assert [stage for stage, *_ in outer] == ["outer"]
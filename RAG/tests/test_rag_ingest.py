@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+
+import rag
+
+
+def paragraphs(topic, n):
+    """Texte de `n` paragraphes d'environ 300 caractères (plusieurs chunks dès n >= 3)"""
+    return "\n\n".join(
+        f"{topic} paragraphe {i} : " + " ".join(f"{topic}{i}mot{j}" for j in range(30)) for i in range(n)
+    ) + "\n"
+
+
+def indexed_ids(collection):
+    return set(collection.get(include=[])["ids"])
+
+
+def manifest_ids():
+    return {i for entry in rag.load_manifest().values() for i in entry["chunks"]}
+
+
+def test_incremental_ingest(corpus, encoder, collection):
+    (corpus / "combinaisons.txt").write_text(paragraphs("neoprene", 2), encoding="utf-8")
+    spots = corpus / "spots.txt"
+    spots.write_text(paragraphs("houle", 6), encoding="utf-8")
+
+    rag.initialize_rag()
+    manifest = rag.load_manifest()
+    assert set(manifest) == {(corpus / "combinaisons.txt").as_posix(), spots.as_posix()}
+    assert indexed_ids(collection) == manifest_ids()
+    assert encoder.encoded == collection.count()
+    old_spots_ids = manifest[spots.as_posix()]["chunks"]
+    assert len(old_spots_ids) >= 3
+
+    # Rien de changé : aucun embedding recalculé
+    encoded = encoder.encoded
+    rag.initialize_rag()
+    assert encoder.encoded == encoded
+
+    # Date changée, contenu identique : manifeste mis à jour, rien de recalculé
+    stat = spots.stat()
+    os.utime(spots, (stat.st_atime, stat.st_mtime + 10))
+    rag.initialize_rag()
+    assert encoder.encoded == encoded
+    assert rag.load_manifest()[spots.as_posix()]["mtime"] == stat.st_mtime + 10
+
+    # Dernier paragraphe modifié : seuls les chunks nouveaux sont embeddés, les périmés supprimés
+    text = spots.read_text(encoding="utf-8")
+    spots.write_text(text.replace("houle paragraphe 5", "houle paragraphe modifié"), encoding="utf-8")
+    rag.initialize_rag()
+    new_spots_ids = rag.load_manifest()[spots.as_posix()]["chunks"]
+    added = set(new_spots_ids) - set(old_spots_ids)
+    assert added and set(new_spots_ids) & set(old_spots_ids)
+    assert encoder.encoded == encoded + len(added)
+    assert indexed_ids(collection) == manifest_ids()
+    assert not indexed_ids(collection) & (set(old_spots_ids) - set(new_spots_ids))
+
+    # Fichier supprimé : ses chunks quittent la base et le manifeste
+    (corpus / "combinaisons.txt").unlink()
+    rag.initialize_rag()
+    assert set(rag.load_manifest()) == {spots.as_posix()}
+    assert indexed_ids(collection) == set(new_spots_ids)
+
+
+def test_orphans_swept_without_manifest(corpus, encoder, collection):
+    (corpus / "combinaisons.txt").write_text(paragraphs("neoprene", 2), encoding="utf-8")
+    # Chunk d'une ancienne version de la base (ids chunk_{i}, pas de manifeste)
+    collection.add(ids=["chunk_0"], documents=["ancien chunk"], embeddings=[np.ones(encoder.dimension).tolist()])
+
+    rag.initialize_rag()
+
+    assert "chunk_0" not in indexed_ids(collection)
+    assert indexed_ids(collection) == manifest_ids()
+
+
+def test_outdated_index_version_is_rebuilt(corpus, encoder, collection, monkeypatch):
+    (corpus / "combinaisons.txt").write_text(paragraphs("neoprene", 2), encoding="utf-8")
+    rag.initialize_rag()
+    encoded = encoder.encoded
+
+    monkeypatch.setattr(rag, "INDEX_VERSION", rag.INDEX_VERSION + 1)
+    rag.initialize_rag()
+
+    # Même contenu, découpage d'une autre version : tout est ré-embeddé
+    assert encoder.encoded == 2 * encoded
+    assert all(entry["version"] == rag.INDEX_VERSION for entry in rag.load_manifest().values())
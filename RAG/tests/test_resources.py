@@ -0,0 +1,29 @@
+import pytest
+
+from resources import atomic_write
+
+
+def test_atomic_write_replaces_file(tmp_path):
+    path = tmp_path / "sous-dossier" / "manifest.json"
+
+    with atomic_write(path, "w") as f:
+        f.write("{}")
+    with atomic_write(path, "w") as f:
+        f.write('{"version": 2}')
+
+    assert path.read_text(encoding="utf-8") == '{"version": 2}'
+    assert [p.name for p in path.parent.iterdir()] == ["manifest.json"]
+
+
+def test_atomic_write_keeps_old_file_on_error(tmp_path):
+    path = tmp_path / "index.snapshot"
+    path.write_bytes(b"ancien")
+
+    with pytest.raises(RuntimeError):
+        with atomic_write(path) as f:
+            f.write(b"nouveau, incomplet")
+            raise RuntimeError("écriture interrompue")
+
+    assert path.read_bytes() == b"ancien"
+    # Pas de fichier temporaire laissé derrière
+    assert [p.name for p in tmp_path.iterdir()] == ["index.snapshot"]
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+import snapshot
+from snapshot import Snapshot, build_snapshot, read_header
+
+
+# Remplissage : chaque paragraphe fait ~250 caractères, chaque fichier plusieurs chunks
+FILLER = "Conseils des moniteurs de l'école, à relire avant chaque session en Bretagne. " * 2
+
+
+@pytest.fixture
+def built(corpus, encoder, collection, tmp_path):
+    """Snapshot construit à partir d'un petit corpus de deux fichiers : (snapshot, chemins des sources)"""
+    sources = {
+        "combinaisons": corpus / "combinaisons.txt",
+        "spots": corpus / "spots.txt",
+    }
+    sources["combinaisons"].write_text("\n\n".join(
+        f"Combinaison {thickness} mm quand l'eau est à {temperature} degrés. " + FILLER
+        for thickness, temperature in (("5/4", 9), ("4/3", 11), ("4/3", 13), ("3/2", 16), ("2/2", 18))
+    ), encoding="utf-8")
+    sources["spots"].write_text("\n\n".join(
+        f"{spot} : {description}. " + FILLER
+        for spot, description in (
+            ("La Torche", "beach break exposé à la houle d'ouest"),
+            ("Le Petit Minou", "reef break à marée montante"),
+            ("Pors Carn", "beach break pour débuter à marée basse"),
+            ("La Palue", "beach break puissant, courants forts"),
+            ("Dossen", "beach break abrité par vent d'ouest"),
+        )
+    ), encoding="utf-8")
+    path = tmp_path / "index.snapshot"
+    build_snapshot(path)
+    return Snapshot(path), {name: p.as_posix() for name, p in sources.items()}
+
+
+def test_round_trip(built, collection):
+    index, _ = built
+    original = collection.get(include=["documents", "metadatas", "embeddings"])
+
+    assert index.count() == collection.count()
+    assert sorted(index.ids) == sorted(original["ids"])
+    result = index.get(ids=original["ids"], include=("documents", "metadatas", "embeddings"))
+    assert result["ids"] == original["ids"]
+    assert result["documents"] == original["documents"]
+    assert result["metadatas"] == original["metadatas"]
+    # Embeddings stockés en float16
+    np.testing.assert_allclose(result["embeddings"], np.asarray(original["embeddings"]), atol=1e-3)
+
+
+def test_query_with_where_filter(built, collection, encoder):
+    index, sources = built
+    query = encoder.encode(["beach break pour débuter à marée basse"])
+    where = {"source": sources["spots"]}
+
+    result = index.query(query, n_results=10, where=where, include=("documents", "metadatas"))
+    expected = collection.query(query_embeddings=query.tolist(), n_results=10, where=where)
+
+    assert len(result["ids"][0]) > 1
+    assert set(result["ids"][0]) == set(expected["ids"][0])
+    assert result["ids"][0][0] == expected["ids"][0][0]
+    assert all(metadata["source"] == sources["spots"] for metadata in result["metadatas"][0])
+    # Distances cosinus croissantes
+    assert result["distances"][0] == sorted(result["distances"][0])
+
+
+def test_query_with_compound_filters(built, encoder):
+    index, sources = built
+    query = encoder.encode(["eau à 12 degrés"])
+
+    excluded = index.query(query, where={"source": {"$ne": sources["spots"]}})
+    assert excluded["ids"][0] and all(
+        metadata["source"] == sources["combinaisons"] for metadata in excluded["metadatas"][0]
+    )
+
+    nothing = index.query(query, where={"$and": [{"source": sources["spots"]}, {"kind": "spot"}]})
+    assert nothing["ids"] == [[]]
+
+
+def test_manifest_and_bm25_index_travel_with_snapshot(built):
+    index, sources = built
+    header = read_header(index.path)
+
+    assert set(header["manifest"]) == set(sources.values())
+    assert sorted(index.bm25_index().to_dict()["ids"]) == sorted(index.ids)
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "index.snapshot"
+    path.write_bytes(b"not a snapshot")
+
+    with pytest.raises(ValueError):
+        read_header(path)
+
+
+def test_rejects_other_embedding_model(built, monkeypatch):
+    index, _ = built
+    monkeypatch.setattr(snapshot, "EMBEDDING_MODEL_NAME", "autre-modele")
+
+    with pytest.raises(ValueError):
+        Snapshot(index.path)
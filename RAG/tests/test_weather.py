@@ -0,0 +1,184 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+import weather
+from bench.stub_apis import start_in_thread
+
+
+def requests_served(base_url):
+    """Nombre de requêtes reçues par un serveur de bouchons"""
+    return httpx.get(f"{base_url}/stats").json()["requests"]
+
+
+def delta(before):
+    """Compteurs de weather.stats qui ont bougé depuis `before`"""
+    after = weather.cache_stats()
+    return {name: after[name] - before[name] for name in weather.stats if after[name] != before[name]}
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    with weather._marine_lock:
+        weather._marine_cache.clear()
+    with weather._geocode_lock:
+        weather._geocode_cache.clear()
+
+
+@pytest.fixture
+def stormglass_stub(monkeypatch):
+    """Serveur de bouchons dédié pour StormGlass, réglable par test ; renvoie son URL de base"""
+    def start(**kwargs):
+        base_url = start_in_thread(**kwargs)
+        monkeypatch.setattr(weather, "STORMGLASS_URL", f"{base_url}/v2/weather/point")
+        return base_url
+    return start
+
+
+def test_geocode_cache_hit(stub_url):
+    before, served = weather.cache_stats(), requests_served(stub_url)
+
+    first = asyncio.run(weather.ageocode("Rennes"))
+    second = asyncio.run(weather.ageocode("  rennes "))
+
+    assert first == second and first is not None
+    assert delta(before) == {"geocode_misses": 1, "geocode_hits": 1}
+    assert requests_served(stub_url) == served + 1
+    # Cache écrit sur le disque
+    assert "rennes" in json.loads(Path(weather.GEOCODE_CACHE_PATH).read_text(encoding="utf-8"))
+
+
+def test_geocode_unknown_place_is_cached(stub_url):
+    before, served = weather.cache_stats(), requests_served(stub_url)
+
+    assert asyncio.run(weather.ageocode("nulle part")) is None
+    assert asyncio.run(weather.ageocode("nulle part")) is None
+
+    assert delta(before) == {"geocode_misses": 1, "geocode_hits": 1}
+    assert requests_served(stub_url) == served + 1
+
+
+def test_geocode_known_spot_skips_network(stub_url):
+    before, served = weather.cache_stats(), requests_served(stub_url)
+
+    assert asyncio.run(weather.ageocode("La Torche")) == (47.8375, -4.3497)
+
+    assert delta(before) == {"gazetteer_hits": 1}
+    assert requests_served(stub_url) == served
+
+
+def test_marine_cache_hit(stub_url):
+    before, served = weather.cache_stats(), requests_served(stub_url)
+
+    first = asyncio.run(weather.afetch_marine_data(47.8375, -4.3497, "offline"))
+    # Mêmes coordonnées une fois arrondies : même entrée du cache
+    second = weather.fetch_marine_data(47.8412, -4.3511, "offline")
+
+    assert first["hours"] and second == first
+    assert delta(before) == {"marine_misses": 1, "marine_hits": 1}
+    assert requests_served(stub_url) == served + 1
+
+
+def test_concurrent_identical_calls_are_coalesced(stub_url):
+    before, served = weather.cache_stats(), requests_served(stub_url)
+
+    async def fetch_all():
+        return await asyncio.gather(*(weather.afetch_marine_data(48.0, -4.5, "offline") for _ in range(5)))
+
+    results = asyncio.run(fetch_all())
+
+    assert all(result == results[0] for result in results)
+    assert delta(before) == {"marine_misses": 5, "coalesced": 4}
+    assert requests_served(stub_url) == served + 1
+
+
+def test_retry_then_success_on_503(monkeypatch, stormglass_stub):
+    base_url = stormglass_stub(fail_every=2)
+    monkeypatch.setattr(weather, "BACKOFF_BASE", 0.01)
+    before = weather.cache_stats()
+
+    # 1re requête servie, 2e en 503, 3e (nouvelle tentative) servie
+    asyncio.run(weather.afetch_marine_data(47.0, -3.0, "offline"))
+    data = asyncio.run(weather.afetch_marine_data(47.5, -3.5, "offline"))
+
+    assert data["hours"]
+    assert delta(before) == {"marine_misses": 2, "retries": 1}
+    assert requests_served(base_url) == 3
+
+
+def test_retry_after_is_honoured(monkeypatch, stormglass_stub):
+    stormglass_stub(fail_every=2, retry_after=1)
+    # Sans Retry-After, la nouvelle tentative serait immédiate
+    monkeypatch.setattr(weather, "BACKOFF_BASE", 0.0)
+    asyncio.run(weather.afetch_marine_data(47.0, -3.0, "offline"))
+
+    start = time.perf_counter()
+    data = asyncio.run(weather.afetch_marine_data(47.5, -3.5, "offline"))
+
+    assert data["hours"]
+    assert time.perf_counter() - start >= 1.0
+
+
+def test_timeout_raises_after_max_retries(monkeypatch, stormglass_stub):
+    base_url = stormglass_stub(latency=1.0)
+    monkeypatch.setattr(weather, "HTTP_TIMEOUT", httpx.Timeout(0.1))
+    monkeypatch.setattr(weather, "BACKOFF_BASE", 0.0)
+    monkeypatch.setattr(weather, "MAX_RETRIES", 2)
+    before = weather.cache_stats()
+
+    with pytest.raises(httpx.TimeoutException):
+        asyncio.run(weather.afetch_marine_data(47.0, -3.0, "offline"))
+
+    assert delta(before) == {"marine_misses": 1, "retries": 2}
+    assert requests_served(base_url) == 3
+    # Rien en cache après un échec
+    assert len(weather._marine_cache) == 0
+
+
+def test_http_error_raises(stub_url):
+    # Sans clé API, StormGlass répond 403 : erreur, pas de JSON d'erreur pris pour des données
+    with pytest.raises(httpx.HTTPStatusError) as error:
+        asyncio.run(weather.afetch_marine_data(47.0, -3.0, ""))
+
+    assert error.value.response.status_code == 403
+    assert len(weather._marine_cache) == 0
+
+
+def test_503_raises_after_max_retries(monkeypatch, stormglass_stub):
+    base_url = stormglass_stub(fail_every=1)
+    monkeypatch.setattr(weather, "BACKOFF_BASE", 0.0)
+    monkeypatch.setattr(weather, "MAX_RETRIES", 2)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(weather.afetch_marine_data(47.0, -3.0, "offline"))
+
+    assert requests_served(base_url) == 3
+
+
+def test_geocode_rejects_unexpected_payload(monkeypatch):
+    async def error_payload(*args, **kwargs):
+        return {"error": "Unable to geocode"}
+
+    monkeypatch.setattr(weather, "_get_json", error_payload)
+
+    with pytest.raises(ValueError):
+        asyncio.run(weather.ageocode("Quelque part"))
+    assert "quelque part" not in weather._geocode_cache
+
+
+def test_aclose_closes_the_loop_client(stub_url):
+    async def run():
+        await weather.afetch_marine_data(47.0, -3.0, "offline")
+        client = weather._state().client
+        await weather.aclose()
+        # Client suivant créé à la demande
+        await weather.afetch_marine_data(47.2, -3.0, "offline")
+        return client, weather._state().client
+
+    closed, current = asyncio.run(run())
+
+    assert closed.is_closed and not current.is_closed
@@ -0,0 +1,318 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+import weakref
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import httpx
+from cachetools import TTLCache
+
+import metrics
+from gazetteer import get_gazetteer
+from resources import atomic_write
+
+
+# Cache de géocodage (les coordonnées d'un lieu ne changent pas) : persisté sur disque
+GEOCODE_CACHE_PATH = os.getenv("SUNNY_GEOCODE_CACHE", "./geocode_cache.json")
+# Cache des données marines : durée de vie et nombre d'entrées maximum (LRU)
+MARINE_CACHE_TTL = 3600
+MARINE_CACHE_SIZE = 512
+# Précision des coordonnées dans la clé du cache (2 décimales ~ 1 km)
+COORD_PRECISION = 2
+
+# URLs surchargeables (ex: serveur de bouchons local, voir bench/stub_apis.py)
+NOMINATIM_URL = os.getenv("SUNNY_NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+STORMGLASS_URL = os.getenv("SUNNY_STORMGLASS_URL", "https://api.stormglass.io/v2/weather/point")
+STORMGLASS_PARAMS = "waveHeight,waterTemperature,windSpeed,gust,swellHeight,swellPeriod"
+HEADERS = {'User-Agent': 'MonAgentSurf/1.0'}
+
+# Client HTTP : pool de connexions, timeouts et nouvelles tentatives
+HTTP_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Requêtes simultanées maximum par hôte (Nominatim interdit les requêtes parallèles)
+HOST_CONCURRENCY = {urlsplit(NOMINATIM_URL).netloc: 1}
+DEFAULT_HOST_CONCURRENCY = 4
+# Coroutines à attendre avant chaque requête vers une URL (ex: quotas StormGlass de
+# batch.py) : {url: coroutine}, propres au contexte qui les a définis (request_limiters)
+_request_limiters = contextvars.ContextVar("sunny_request_limiters", default=None)
+# Nom de l'étape mesurée pour chaque API (voir metrics.py)
+HTTP_STAGES = {NOMINATIM_URL: "geocode_http", STORMGLASS_URL: "stormglass_http"}
+
+
+# Compteurs de hits / misses des caches
+stats = {
+    "gazetteer_hits": 0,
+    "geocode_hits": 0,
+    "geocode_misses": 0,
+    "marine_hits": 0,
+    "marine_misses": 0,
+    "coalesced": 0,
+    "retries": 0,
+}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        stats[name] += 1
+
+
+def cache_stats():
+    """Copie des compteurs des caches météo"""
+    with _stats_lock:
+        return dict(stats, marine_entries=len(_marine_cache))
+
+
+metrics.register_stats("weather", cache_stats, gauges=("marine_entries",))
+
+
+def _load_geocode_cache():
+    try:
+        return json.loads(Path(GEOCODE_CACHE_PATH).read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+_geocode_cache = _load_geocode_cache()
+_geocode_lock = threading.Lock()
+_marine_cache = TTLCache(maxsize=MARINE_CACHE_SIZE, ttl=MARINE_CACHE_TTL)
+_marine_lock = threading.Lock()
+# Une seule écriture du fichier à la fois (la dernière écrite est la plus complète)
+_geocode_save_lock = threading.Lock()
+
+
+def _save_geocode_cache():
+    """Écrit le cache de géocodage (bloquant : à appeler hors de la boucle asyncio)"""
+    with _geocode_save_lock:
+        # Copie prise sous le verrou d'écriture : la dernière écriture est toujours la plus complète
+        with _geocode_lock:
+            entries = dict(_geocode_cache)
+        with atomic_write(GEOCODE_CACHE_PATH, "w") as f:
+            json.dump(entries, f, ensure_ascii=False)
+
+
+class _LoopState:
+    """Client HTTP, sémaphores et requêtes en cours propres à une boucle asyncio"""
+
+    def __init__(self):
+        self.client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            limits=HTTP_LIMITS,
+            headers=HEADERS,
+        )
+        self.host_semaphores = {}
+        self.inflight = {}
+
+    def semaphore(self, host):
+        if host not in self.host_semaphores:
+            limit = HOST_CONCURRENCY.get(host, DEFAULT_HOST_CONCURRENCY)
+            self.host_semaphores[host] = asyncio.Semaphore(limit)
+        return self.host_semaphores[host]
+
+
+# Un client httpx est lié à la boucle qui l'utilise : un état par boucle
+_loop_states = weakref.WeakKeyDictionary()
+
+
+def _state():
+    loop = asyncio.get_running_loop()
+    state = _loop_states.get(loop)
+    if state is None:
+        state = _loop_states[loop] = _LoopState()
+    return state
+
+
+async def _get_json(url, params=None, headers=None):
+    """
+    GET JSON via le client partagé, avec limite de concurrence par hôte
+    et nouvelles tentatives (backoff exponentiel avec jitter) sur les
+    erreurs réseau, les timeouts, les 429 et les 5xx.
+    """
+    state = _state()
+    host = urlsplit(url).netloc
+    semaphore = state.semaphore(host)
+
+    for attempt in range(MAX_RETRIES + 1):
+        limiter = (_request_limiters.get() or {}).get(url)
+        if limiter is not None:
+            await limiter()
+        try:
+            async with semaphore:
+                with metrics.timed(HTTP_STAGES.get(url, "http")):
+                    response = await state.client.get(url, params=params, headers=headers)
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                # Erreur HTTP (4xx, 5xx après les tentatives) : exception, les outils renvoient leur message d'erreur
+                response.raise_for_status()
+                return response.json()
+            retry_after = response.headers.get("Retry-After", "")
+            delay = float(retry_after) if retry_after.isdigit() else None
+        except httpx.TransportError:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = None
+
+        _count("retries")
+        if delay is None:
+            delay = BACKOFF_BASE * 2 ** attempt * random.uniform(0.5, 1.5)
+        await asyncio.sleep(delay)
+
+
+async def _single_flight(key, fetch):
+    """
+    Regroupe les appels concurrents identiques : pour une même clé,
+    un seul appel est exécuté et tous les demandeurs reçoivent son résultat.
+    """
+    inflight = _state().inflight
+    task = inflight.get(key)
+    if task is not None:
+        _count("coalesced")
+        return await asyncio.shield(task)
+
+    task = asyncio.ensure_future(fetch())
+    inflight[key] = task
+    try:
+        return await asyncio.shield(task)
+    finally:
+        if task.done():
+            inflight.pop(key, None)
+        else:
+            task.add_done_callback(lambda _: inflight.pop(key, None))
+
+
+def _normalize_location(location):
+    return " ".join(location.lower().split())
+
+
+async def ageocode(location):
+    """
+    Coordonnées (lat, lon) d'un lieu : spot connu du gazetteer local (sans
+    réseau), sinon Nominatim, ou None si introuvable. Le résultat de
+    Nominatim (y compris "introuvable") est mis en cache sans expiration.
+    """
+    coords = get_gazetteer().coordinates(location)
+    if coords is not None:
+        _count("gazetteer_hits")
+        return coords
+
+    key = _normalize_location(location)
+    with _geocode_lock:
+        if key in _geocode_cache:
+            _count("geocode_hits")
+            cached = _geocode_cache[key]
+            return tuple(cached) if cached else None
+    _count("geocode_misses")
+
+    async def fetch():
+        geo_res = await _get_json(
+            NOMINATIM_URL,
+            params={"q": location, "format": "json", "limit": 1, "countrycodes": "fr"},
+        )
+        # Nominatim renvoie une liste de résultats (vide si le lieu est inconnu)
+        if not isinstance(geo_res, list):
+            raise ValueError(f"Réponse inattendue de Nominatim : {str(geo_res)[:200]}")
+        coords = (float(geo_res[0]["lat"]), float(geo_res[0]["lon"])) if geo_res else None
+        with _geocode_lock:
+            _geocode_cache[key] = coords
+        # Écriture du fichier dans un thread : la boucle continue de servir les autres requêtes
+        await asyncio.to_thread(_save_geocode_cache)
+        return coords
+
+    return await _single_flight(("geocode", key), fetch)
+
+
+async def afetch_marine_data(lat, lon, api_key):
+    """
+    Réponse StormGlass pour un point. Mise en cache par coordonnées arrondies
+    et heure de prévision, avec une durée de vie de MARINE_CACHE_TTL.
+    """
+    lat, lon = round(lat, COORD_PRECISION), round(lon, COORD_PRECISION)
+    key = (lat, lon, int(time.time() // 3600))
+    with _marine_lock:
+        cached = _marine_cache.get(key)
+    if cached is not None:
+        _count("marine_hits")
+        return cached
+    _count("marine_misses")
+
+    async def fetch():
+        data = await _get_json(
+            STORMGLASS_URL,
+            params={"lat": lat, "lng": lon, "params": STORMGLASS_PARAMS},
+            headers={'Authorization': api_key},
+        )
+        # On ne met en cache que les réponses exploitables (pas les erreurs de quota)
+        if data.get("hours"):
+            with _marine_lock:
+                _marine_cache[key] = data
+        return data
+
+    return await _single_flight(("marine", key), fetch)
+
+
+# Boucle asyncio de fond pour les appelants synchrones : tous partagent
+# le même pool de connexions et les mêmes requêtes en cours
+_background_loop = None
+_background_lock = threading.Lock()
+
+
+def _get_background_loop():
+    global _background_loop
+    with _background_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_background_loop.run_forever,
+                name="weather-http",
+                daemon=True,
+            ).start()
+    return _background_loop
+
+
+async def aclose():
+    """Ferme le client HTTP de la boucle courante (avant d'arrêter la boucle)"""
+    state = _loop_states.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state.client.aclose()
+
+
+def close():
+    """Ferme le client HTTP de la boucle de fond des appelants synchrones (fin du processus)"""
+    if _background_loop is not None:
+        run_sync(aclose())
+
+
+@contextmanager
+def request_limiters(limiters):
+    """
+    Limiteurs {url: coroutine} attendus avant chaque requête HTTP, dans ce
+    contexte seulement : les tâches et les run_sync lancés depuis en héritent.
+    """
+    token = _request_limiters.set(limiters)
+    try:
+        yield
+    finally:
+        _request_limiters.reset(token)
+
+
+def run_sync(coro):
+    """Exécute une coroutine sur la boucle de fond et attend son résultat"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_background_loop()).result()
+
+
+def geocode(location):
+    """Version synchrone de ageocode"""
+    return run_sync(ageocode(location))
+
+
+def fetch_marine_data(lat, lon, api_key):
+    """Version synchrone de afetch_marine_data"""
+    return run_sync(afetch_marine_data(lat, lon, api_key))